@@ -1,16 +1,37 @@
 import os
 import sys
+import json
+import hashlib
+import multiprocessing
 import openpyxl
+from concurrent.futures import ProcessPoolExecutor
 
 # Define o caminho para a raiz do projeto de forma robusta
 # Este script está em app_sheets/tools/, então '..' leva a app_sheets, e '..' novamente leva ao project_root
 current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.abspath(os.path.join(current_dir, '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+# Cache de workbooks compartilhado com a GUI: quando as ações rodam dentro dela, os arquivos já abertos
+# pelas ferramentas não são relidos e os arquivos gravados aqui ficam disponíveis sem nova leitura.
+from ui.tools.workbook_cache import get_workbook, save_workbook, workbook_lock, invalidate_workbook
 
 USER_SHEETS_DIR = os.path.join(project_root, "user_sheets")
 APP_SHEETS_DIR = os.path.join(project_root, "app_sheets")
 DB_EXCEL_PATH = os.path.join(USER_SHEETS_DIR, "db.xlsx")
 
+# Abaixo desta quantidade de arquivos, ler tudo no próprio processo é mais rápido que iniciar os workers
+# (usado apenas quando --jobs não é informado)
+PARALLEL_SCAN_MIN_FILES = 8
+
+# Manifesto da última varredura: tamanho, data de modificação, hash e cabeçalhos de cada arquivo.
+# Permite reler apenas os arquivos novos ou alterados e pular a gravação da db_db quando nada mudou.
+SCAN_MANIFEST_PATH = os.path.join(USER_SHEETS_DIR, "db_scan_manifest.json")
+SCAN_MANIFEST_VERSION = 1
+
+DB_DB_HEADERS = ["Arquivo (Caminho)", "Nome da Coluna (Cabeçalho)", "pagina_arquivo", "descr_variavel"]
+
 # Planilhas específicas que têm um comportamento diferente na detecção de headers
 CONFIG_SHEETS_MAP = {
     os.path.join(APP_SHEETS_DIR, "users.xlsx"): "users",
@@ -22,33 +43,67 @@ CONFIG_SHEETS_MAP = {
     os.path.join(USER_SHEETS_DIR, "engenharia.xlsx"): "Estrutura",
 }
 
-def get_db_db_data():
+
+class MetadataResult:
+    """
+    Resultado de uma ação de metadados (update_db_schema, validate, create_or_update_sheets).
+    As mensagens são guardadas na ordem em que foram emitidas e também repassadas a 'log'
+    (print na linha de comando; o mini-console ou a janela do validador na GUI).
+    """
+    def __init__(self, action, log=print):
+        self.action = action
+        self.success = True
+        self.messages = [] # Todas as mensagens, com o mesmo texto exibido pela linha de comando
+        self.errors = [] # Erros e inconsistências (tornam 'success' False)
+        self.warnings = []
+        self.stats = {} # Contadores da ação (ex: arquivos relidos, planilhas atualizadas)
+        self._log = log
+
+    def info(self, message):
+        self.messages.append(message)
+        if self._log is not None:
+            self._log(message)
+
+    def warning(self, message):
+        self.warnings.append(message)
+        self.info(message)
+
+    def error(self, message):
+        self.success = False
+        self.errors.append(message)
+        self.info(message)
+
+
+def get_db_db_data(log=print):
     """Carrega os dados atuais da planilha 'db_db' em db.xlsx."""
     db_db_data = []
     if not os.path.exists(DB_EXCEL_PATH):
-        print(f"Aviso: O arquivo db.xlsx não foi encontrado em {DB_EXCEL_PATH}. Ele será criado.")
+        log(f"Aviso: O arquivo db.xlsx não foi encontrado em {DB_EXCEL_PATH}. Ele será criado.")
         return []
 
     try:
-        wb = openpyxl.load_workbook(DB_EXCEL_PATH)
+        # Somente leitura: as linhas são percorridas uma única vez, em sequência
+        wb = openpyxl.load_workbook(DB_EXCEL_PATH, read_only=True)
         if "db_db" not in wb.sheetnames:
-            print("Aviso: A planilha 'db_db' não foi encontrada em db.xlsx.")
+            log("Aviso: A planilha 'db_db' não foi encontrada em db.xlsx.")
+            wb.close()
             return []
         
-        sheet = wb["db_db"]
-        if sheet.max_row < 1:
+        rows = list(wb["db_db"].iter_rows(values_only=True))
+        wb.close()
+        if not rows:
             return [] # Planilha vazia
 
-        headers = [cell.value for cell in sheet[1]]
-        required_headers = ["Arquivo (Caminho)", "Nome da Coluna (Cabeçalho)", "pagina_arquivo", "descr_variavel"]
+        headers = list(rows[0])
+        required_headers = DB_DB_HEADERS
         if not all(h in headers for h in required_headers):
-            print(f"Aviso: Cabeçalhos incompletos na planilha 'db_db'. Esperado: {required_headers}")
+            log(f"Aviso: Cabeçalhos incompletos na planilha 'db_db'. Esperado: {required_headers}")
             return []
 
         header_map = {h: idx for idx, h in enumerate(headers)}
 
-        for row_idx in range(2, sheet.max_row + 1):
-            row_values = [cell.value for cell in sheet[row_idx]]
+        for row_idx, row_values in enumerate(rows[1:], start=2):
+            row_values = list(row_values)
             if all(v is None for v in row_values):
                 continue
             
@@ -65,21 +120,21 @@ def get_db_db_data():
                     "descr_variavel": str(description)
                 })
             else:
-                print(f"Aviso: Linha malformada ou incompleta na db_db (linha {row_idx}): {row_values}. Ignorando.")
+                log(f"Aviso: Linha malformada ou incompleta na db_db (linha {row_idx}): {row_values}. Ignorando.")
 
     except Exception as e:
-        print(f"Erro ao carregar db.xlsx: {e}")
+        log(f"Erro ao carregar db.xlsx: {e}")
     return db_db_data
 
 
-def save_db_db_data(data):
-    """Salva os dados atualizados na planilha 'db_db' em db.xlsx."""
+def save_db_db_data(data, log=print):
+    """Recria db.xlsx apenas com a planilha 'db_db' e os dados informados. Retorna True se o arquivo foi salvo."""
     try:
         wb = openpyxl.Workbook()
         sheet = wb.active
         sheet.title = "db_db"
 
-        headers = ["Arquivo (Caminho)", "Nome da Coluna (Cabeçalho)", "pagina_arquivo", "descr_variavel"]
+        headers = DB_DB_HEADERS
         sheet.append(headers)
 
         for row in data:
@@ -96,123 +151,409 @@ def save_db_db_data(data):
         elif "Sheet" in wb.sheetnames and len(wb.sheetnames) == 1 and wb["Sheet"] == sheet:
             pass
 
-        wb.save(DB_EXCEL_PATH)
-        print(f"db.xlsx atualizado com {len(data)} entradas na db_db.")
+        save_workbook(wb, DB_EXCEL_PATH)
+        log(f"db.xlsx atualizado com {len(data)} entradas na db_db.")
+        return True
     except Exception as e:
-        print(f"Erro ao salvar db.xlsx: {e}")
+        log(f"Erro ao salvar db.xlsx: {e}")
+        return False
+
+
+def _db_db_key(row):
+    """Chave de uma linha da db_db: (arquivo, planilha, cabeçalho)."""
+    return (row[0], row[2], row[1])
+
+
+def update_db_db_rows(data, log=print):
+    """
+    Atualiza a planilha 'db_db' no lugar, casando as linhas por (arquivo, planilha, cabeçalho) e não pela
+    posição: um cabeçalho novo ou removido em um arquivo não desloca as linhas dos demais. Só são escritas
+    as linhas cujo conteúdo mudou e as novas (que ocupam primeiro as posições das linhas removidas e,
+    depois, o final da planilha); as linhas removidas que sobrarem são apagadas em blocos contíguos.
+    As demais planilhas de db.xlsx são preservadas.
+    Se db.xlsx ou a db_db não existirem (ou tiverem outro cabeçalho), recria o arquivo com save_db_db_data().
+    db.xlsx é obtido pelo cache de workbooks compartilhado. Retorna True se a db_db ficou atualizada.
+    """
+    if not os.path.exists(DB_EXCEL_PATH):
+        return save_db_db_data(data, log)
+    with workbook_lock(DB_EXCEL_PATH):
+        try:
+            wb = get_workbook(DB_EXCEL_PATH)
+            if "db_db" not in wb.sheetnames:
+                return save_db_db_data(data, log)
+            sheet = wb["db_db"]
+            rows = list(sheet.iter_rows(values_only=True))
+            if not rows or list(rows[0][:len(DB_DB_HEADERS)]) != DB_DB_HEADERS:
+                return save_db_db_data(data, log)
+
+            # Linhas atuais por chave (número da linha no Excel); chaves repetidas ficam em fila
+            existing_by_key = {}
+            existing_rows = {}
+            for excel_row, row in enumerate(rows[1:], start=2):
+                row = tuple(row[:len(DB_DB_HEADERS)]) + (None,) * (len(DB_DB_HEADERS) - len(row))
+                existing_rows[excel_row] = row
+                existing_by_key.setdefault(_db_db_key(row), []).append(excel_row)
+
+            def write_row(excel_row, new_row):
+                for col_idx, value in enumerate(new_row, start=1):
+                    sheet.cell(row=excel_row, column=col_idx).value = value
+
+            kept_rows = set()
+            added = []
+            changed_rows = 0
+            for entry in data:
+                new_row = tuple(entry.get(h, "") for h in DB_DB_HEADERS)
+                candidates = existing_by_key.get(_db_db_key(new_row))
+                if not candidates:
+                    added.append(new_row)
+                    continue
+                excel_row = candidates.pop(0)
+                kept_rows.add(excel_row)
+                if existing_rows[excel_row] != new_row: # Ex: descrição alterada
+                    write_row(excel_row, new_row)
+                    changed_rows += 1
+
+            # Linhas novas reaproveitam as posições das removidas; o que sobrar vai para o final
+            free_rows = [excel_row for excel_row in existing_rows if excel_row not in kept_rows]
+            next_row = len(rows) + 1
+            for new_row in added:
+                if free_rows:
+                    write_row(free_rows.pop(0), new_row)
+                else:
+                    write_row(next_row, new_row)
+                    next_row += 1
+                changed_rows += 1
+
+            # Apaga as linhas removidas restantes em blocos contíguos, de baixo para cima
+            removed_rows = len(free_rows)
+            while free_rows:
+                end = free_rows.pop()
+                start = end
+                while free_rows and free_rows[-1] == start - 1:
+                    start = free_rows.pop()
+                sheet.delete_rows(start, end - start + 1)
+
+            if changed_rows or removed_rows:
+                save_workbook(wb, DB_EXCEL_PATH)
+            log(f"db.xlsx atualizado: {changed_rows} linha(s) escrita(s) e {removed_rows} removida(s) na db_db ({len(data)} entradas).")
+            return True
+        except Exception as e:
+            invalidate_workbook(DB_EXCEL_PATH) # Descarta alterações parciais feitas no workbook compartilhado
+            log(f"Erro ao atualizar db.xlsx: {e}")
+            return False
+
+
+def read_first_row_headers(sheet):
+    """Lê apenas a primeira linha de uma planilha (sem percorrer as demais) e descarta as células vazias."""
+    for row in sheet.iter_rows(min_row=1, max_row=1, values_only=True):
+        return [h for h in row if h is not None]
+    return []
+
+
+def read_workbook_headers(file_path):
+    """
+    Abre o arquivo uma única vez, em modo somente leitura, e retorna os cabeçalhos (primeira linha)
+    de todas as planilhas, sem carregar o restante das células.
+    Retorna ({nome_da_planilha: [cabeçalhos]}, nome_da_planilha_ativa), na ordem das planilhas no arquivo.
+    """
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        headers_by_sheet = {}
+        for sheet_name in wb.sheetnames:
+            sheet = wb[sheet_name]
+            # Chartsheets não têm células
+            headers_by_sheet[sheet_name] = read_first_row_headers(sheet) if hasattr(sheet, "iter_rows") else []
+        active_title = wb.active.title if wb.active is not None else None
+        return headers_by_sheet, active_title
+    finally:
+        wb.close() # Modo somente leitura mantém o arquivo aberto até o fechamento
 
 
-def get_excel_headers(file_path, sheet_name=None):
+def get_excel_headers(file_path, sheet_name=None, log=print):
     """
     Retorna os cabeçalhos da primeira linha de uma planilha Excel específica.
     Se sheet_name for None, tenta a primeira planilha ou a planilha principal mapeada.
+    Avisos e erros vão para 'log' (ex: MetadataResult.warning/error ou o console da GUI).
     """
-    headers = []
     try:
-        wb = openpyxl.load_workbook(file_path, data_only=True)
-        
-        if sheet_name and sheet_name in wb.sheetnames:
-            sheet = wb[sheet_name]
-        elif file_path in CONFIG_SHEETS_MAP and CONFIG_SHEETS_MAP[file_path] in wb.sheetnames:
-            sheet = wb[CONFIG_SHEETS_MAP[file_path]]
+        headers_by_sheet, active_title = read_workbook_headers(file_path)
+
+        if sheet_name and sheet_name in headers_by_sheet:
+            title = sheet_name
+        elif file_path in CONFIG_SHEETS_MAP and CONFIG_SHEETS_MAP[file_path] in headers_by_sheet:
+            title = CONFIG_SHEETS_MAP[file_path]
         else:
-            sheet = wb.active
+            title = active_title
             if sheet_name:
-                print(f"Aviso: Planilha '{sheet_name}' não encontrada em {os.path.basename(file_path)}. Usando a planilha ativa: {sheet.title}")
-
+                log(f"Aviso: Planilha '{sheet_name}' não encontrada em {os.path.basename(file_path)}. Usando a planilha ativa: {title}")
 
-        if sheet.max_row >= 1:
-            headers = [cell.value for cell in sheet[1]]
-            headers = [h for h in headers if h is not None]
-        return headers, sheet.title
+        return headers_by_sheet.get(title, []), title
     except FileNotFoundError:
-        print(f"Aviso: Arquivo Excel não encontrado: {file_path}")
+        log(f"Aviso: Arquivo Excel não encontrado: {file_path}")
     except Exception as e:
-        print(f"Erro ao ler cabeçalhos de {file_path} (planilha: {sheet_name or 'ativa'}): {e}")
+        log(f"Erro ao ler cabeçalhos de {file_path} (planilha: {sheet_name or 'ativa'}): {e}")
     return [], None
 
 
-def update_db_schema():
+def list_workbook_files():
+    """
+    Lista os arquivos .xlsx de user_sheets e app_sheets que fazem parte do esquema (exceto db.xlsx e temporários '~$').
+    A ordem é fixa (pastas e arquivos em ordem alfabética), para que a db_db gerada seja sempre a mesma.
+    """
+    file_paths = []
+    for base_dir in [USER_SHEETS_DIR, APP_SHEETS_DIR]:
+        for root, dirs, files in os.walk(base_dir):
+            dirs.sort()
+            for file_name in sorted(files):
+                if file_name.endswith(".xlsx") and not file_name.startswith('~$'):
+                    file_path = os.path.join(root, file_name)
+                    if file_path != DB_EXCEL_PATH:
+                        file_paths.append(file_path)
+    return file_paths
+
+
+def scan_workbook(file_path):
+    """
+    Lê os cabeçalhos de um arquivo. Executada nos processos do pool (por isso é uma função de módulo).
+    Retorna (file_path, {planilha: [cabeçalhos]} ou None, mensagem de erro ou None).
+    """
+    try:
+        headers_by_sheet, _ = read_workbook_headers(file_path)
+        return file_path, headers_by_sheet, None
+    except Exception as e:
+        return file_path, None, str(e)
+
+
+def scan_workbooks(file_paths, jobs=None):
+    """
+    Lê os cabeçalhos de todos os arquivos, distribuindo-os entre 'jobs' processos (padrão: número de núcleos).
+    A leitura do XML é limitada pela CPU, então processos (e não threads) são usados.
+    Os resultados são retornados na mesma ordem de 'file_paths', independentemente de qual processo terminar antes.
+    """
+    if not file_paths:
+        return []
+    if jobs is None:
+        if len(file_paths) < PARALLEL_SCAN_MIN_FILES:
+            jobs = 1
+        else:
+            jobs = os.cpu_count() or 1
+    jobs = max(1, min(jobs, len(file_paths)))
+
+    if jobs == 1:
+        return [scan_workbook(file_path) for file_path in file_paths]
+
+    # Lotes pequenos equilibram a carga entre os processos sem pagar a comunicação arquivo a arquivo
+    chunksize = max(1, len(file_paths) // (jobs * 4))
+    # Sempre 'spawn' (o padrão do Windows), também no Linux: dentro da GUI esta função roda em uma thread do
+    # IOService, e um fork de um processo com várias threads (Qt) pode herdar locks travados. Os processos só
+    # executam scan_workbook, que depende apenas do openpyxl; o módulo principal (ex: client/gui.py) é
+    # reimportado por eles, mas cria janelas apenas sob 'if __name__ == "__main__"'.
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return list(executor.map(scan_workbook, file_paths, chunksize=chunksize))
+
+
+def file_stamp(file_path):
+    """(tamanho, mtime em ns) do arquivo, ou None se ele não existir."""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def file_hash(file_path):
+    """SHA-1 do conteúdo do arquivo."""
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_scan_manifest():
+    """Carrega o manifesto da última varredura (vazio se não existir, estiver corrompido ou for de outra versão)."""
+    try:
+        with open(SCAN_MANIFEST_PATH, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {"version": SCAN_MANIFEST_VERSION, "files": {}}
+    if not isinstance(manifest, dict) or manifest.get("version") != SCAN_MANIFEST_VERSION:
+        return {"version": SCAN_MANIFEST_VERSION, "files": {}}
+    manifest.setdefault("files", {})
+    return manifest
+
+
+def save_scan_manifest(manifest, log=print):
+    """Grava o manifesto de forma atômica (arquivo temporário + rename)."""
+    temp_path = SCAN_MANIFEST_PATH + ".tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(temp_path, SCAN_MANIFEST_PATH)
+    except (OSError, TypeError, ValueError) as e:
+        log(f"Aviso: Não foi possível gravar o manifesto de varredura {SCAN_MANIFEST_PATH}: {e}")
+
+
+def collect_workbook_headers(jobs=None, incremental=True):
+    """
+    Retorna os cabeçalhos de todos os arquivos do esquema, como scan_workbooks(), relendo apenas os
+    arquivos novos ou alterados desde a última varredura (comparando tamanho e mtime e, se só o mtime
+    mudou, o hash do conteúdo). Com 'incremental' False, todos os arquivos são relidos.
+    Retorna (resultados, manifesto atualizado, quantidade de arquivos relidos); o manifesto não é gravado aqui.
+    """
+    old_manifest = load_scan_manifest() if incremental else {"version": SCAN_MANIFEST_VERSION, "files": {}}
+    old_files = old_manifest["files"]
+    new_files = {}
+    cached_results = {}
+    to_scan = []
+
+    file_paths = list_workbook_files()
+    for file_path in file_paths:
+        relative_path = os.path.relpath(file_path, project_root).replace('\\', '/')
+        stamp = file_stamp(file_path)
+        entry = old_files.get(relative_path)
+        if stamp is not None and entry is not None:
+            size, mtime_ns = stamp
+            unchanged = entry["size"] == size and entry["mtime_ns"] == mtime_ns
+            if not unchanged and entry["size"] == size:
+                # Só o mtime mudou (ex: arquivo copiado ou salvo sem alterações): confere o conteúdo
+                unchanged = entry["sha1"] == file_hash(file_path)
+            if unchanged:
+                new_files[relative_path] = dict(entry, size=size, mtime_ns=mtime_ns)
+                cached_results[file_path] = entry["sheets"]
+                continue
+        to_scan.append(file_path)
+
+    scanned_results = {}
+    for file_path, headers_by_sheet, error in scan_workbooks(to_scan, jobs):
+        scanned_results[file_path] = (headers_by_sheet, error)
+        stamp = file_stamp(file_path)
+        if error is not None or stamp is None:
+            continue # Arquivos com erro não entram no manifesto e são relidos na próxima vez
+        try:
+            json.dumps(headers_by_sheet)
+        except TypeError:
+            continue # Cabeçalhos não representáveis em JSON (ex: datas): o arquivo é sempre relido
+        relative_path = os.path.relpath(file_path, project_root).replace('\\', '/')
+        new_files[relative_path] = {
+            "size": stamp[0],
+            "mtime_ns": stamp[1],
+            "sha1": file_hash(file_path),
+            "sheets": headers_by_sheet,
+        }
+
+    # Mesma ordem de list_workbook_files(), estejam os cabeçalhos no manifesto ou relidos
+    results = []
+    for file_path in file_paths:
+        if file_path in cached_results:
+            results.append((file_path, cached_results[file_path], None))
+        else:
+            headers_by_sheet, error = scanned_results[file_path]
+            results.append((file_path, headers_by_sheet, error))
+
+    manifest = dict(old_manifest, files=new_files)
+    return results, manifest, len(to_scan)
+
+
+def describe_header(relative_path, sheet_name, header):
+    """Descrição registrada na db_db para um cabeçalho."""
+    file_name = os.path.basename(relative_path)
+    if relative_path == "user_sheets/engenharia.xlsx" and sheet_name == "Estrutura":
+        if header == "part_number": return "Número da Peça (ID Único do Item)"
+        elif header == "part_description": return "Descrição Detalhada da Peça"
+        elif header == "parent_part_number": return "Número da Peça Pai (para BOM)"
+        elif header == "unidade_padrao_parent_part": return "Unidade Padrão da Peça Pai"
+        elif header == "concat_child_part_pn_list_comma": return "Lista de Peças Filhas (concatenadas por vírgula)"
+        elif header == "materia_prima_unidade": return "Unidade da Matéria-Prima"
+        elif header == "materia_prima_quantidade": return "Quantidade da Matéria-Prima"
+        elif header == "part_type": return "Tipo da Peça (ex: item, purchased_part)"
+    elif relative_path == "app_sheets/tools.xlsx" and sheet_name == "tools":
+        if header == "mod_id": return "ID único do módulo/ferramenta"
+        elif header == "mod_name": return "Nome de exibição da ferramenta"
+        elif header == "mod_description": return "Descrição da ferramenta"
+        elif header == "module_path": return "Caminho do módulo Python para importação dinâmica"
+        elif header == "class_name": return "Nome da classe da ferramenta dentro do módulo Python" # Adicionado
+        elif header == "MOD_WORK_TABLE": return "Nome da planilha de trabalho principal associada a esta ferramenta (se houver)"
+        elif header == "MOD_WORK_TABLE_PATH": return "Caminho relativo da planilha de trabalho (se houver)"
+        elif header == "mod_comment_old": return "Comentários antigos sobre a ferramenta"
+        elif header == "mod_comment_new": return "Novos comentários sobre a ferramenta"
+    # Adicione mais casos para outras planilhas específicas se quiser descrições personalizadas
+    return f"Cabeçalho da planilha '{sheet_name}' no arquivo '{file_name}'"
+
+
+def update_db_schema(jobs=None, incremental=True, log=print, check_cancelled=None):
     """
     Atualiza a planilha 'db_db' em db.xlsx com os cabeçalhos reais
     de todas as outras planilhas do projeto.
+    Os arquivos são lidos em paralelo por 'jobs' processos (padrão: número de núcleos).
+    Com 'incremental' (padrão), apenas os arquivos novos ou alterados desde a última varredura são relidos,
+    a db_db é atualizada no lugar e, se nada mudou, db.xlsx nem é aberto.
+    'check_cancelled' (opcional) é chamado antes da gravação e pode interromper a ação com uma exceção.
+    Retorna um MetadataResult (stats: files, rescanned, entries, db_updated).
     """
-    print("\nIniciando sincronização da planilha 'db_db' com os arquivos reais...")
+    result = MetadataResult("update_db_schema", log)
+    result.info("\nIniciando sincronização da planilha 'db_db' com os arquivos reais...")
     new_db_db_data = []
 
-    dirs_to_scan = [USER_SHEETS_DIR, APP_SHEETS_DIR]
+    results, manifest, rescanned_count = collect_workbook_headers(jobs, incremental)
+    for file_path, headers_by_sheet, error in results:
+        relative_path = os.path.relpath(file_path, project_root).replace('\\', '/')
+        if error is not None:
+            result.warning(f"Erro ao processar arquivo {relative_path}: {error}")
+            continue
+
+        for sheet_name, headers in headers_by_sheet.items():
+            if headers:
+                for header in headers:
+                    new_db_db_data.append({
+                        "Arquivo (Caminho)": relative_path,
+                        "Nome da Coluna (Cabeçalho)": header,
+                        "pagina_arquivo": sheet_name,
+                        "descr_variavel": describe_header(relative_path, sheet_name, header)
+                    })
+            else:
+                result.warning(f"Aviso: Planilha '{sheet_name}' em '{relative_path}' está vazia ou sem cabeçalhos. Ignorando para db_db.")
+
+    result.info(f"{rescanned_count} de {len(results)} arquivo(s) relido(s).")
+    result.stats.update(files=len(results), rescanned=rescanned_count, entries=len(new_db_db_data), db_updated=False)
+    if check_cancelled is not None:
+        check_cancelled()
+
+    # A db_db só precisa ser tocada se o conteúdo gerado mudou ou se db.xlsx foi alterado por fora
+    rows_hash = hashlib.sha1(json.dumps(new_db_db_data, default=str).encode("utf-8")).hexdigest()
+    last_sync = manifest.get("db_db") or {}
+    db_stamp = file_stamp(DB_EXCEL_PATH)
+    if incremental and db_stamp is not None and last_sync.get("rows_hash") == rows_hash \
+            and [last_sync.get("size"), last_sync.get("mtime_ns")] == list(db_stamp):
+        result.info("Nenhuma alteração nos cabeçalhos desde a última sincronização. db.xlsx não foi modificado.")
+    else:
+        if update_db_db_rows(new_db_db_data, result.info):
+            result.stats["db_updated"] = True
+        else:
+            result.error("A planilha 'db_db' não pôde ser atualizada.")
+        db_stamp = file_stamp(DB_EXCEL_PATH)
 
-    for base_dir in dirs_to_scan:
-        for root, _, files in os.walk(base_dir):
-            for file_name in files:
-                if file_name.endswith(".xlsx") and not file_name.startswith('~$'):
-                    file_path = os.path.join(root, file_name)
-                    if file_path == DB_EXCEL_PATH:
-                        continue
-
-                    relative_path = os.path.relpath(file_path, project_root).replace('\\', '/')
-                    
-                    try:
-                        wb = openpyxl.load_workbook(file_path, data_only=True)
-                        for sheet_name in wb.sheetnames:
-                            sheet = wb[sheet_name]
-                            if sheet.max_row >= 1: 
-                                headers = [cell.value for cell in sheet[1]]
-                                headers = [h for h in headers if h is not None] 
-                                
-                                if headers:
-                                    for header in headers:
-                                        description = ""
-                                        if relative_path == "user_sheets/engenharia.xlsx" and sheet_name == "Estrutura":
-                                            if header == "part_number": description = "Número da Peça (ID Único do Item)"
-                                            elif header == "part_description": description = "Descrição Detalhada da Peça"
-                                            elif header == "parent_part_number": description = "Número da Peça Pai (para BOM)"
-                                            elif header == "unidade_padrao_parent_part": description = "Unidade Padrão da Peça Pai"
-                                            elif header == "concat_child_part_pn_list_comma": description = "Lista de Peças Filhas (concatenadas por vírgula)"
-                                            elif header == "materia_prima_unidade": description = "Unidade da Matéria-Prima"
-                                            elif header == "materia_prima_quantidade": description = "Quantidade da Matéria-Prima"
-                                            elif header == "part_type": description = "Tipo da Peça (ex: item, purchased_part)"
-                                            else: description = f"Cabeçalho da planilha '{sheet_name}' no arquivo '{os.path.basename(file_path)}'"
-                                        elif relative_path == "app_sheets/tools.xlsx" and sheet_name == "tools":
-                                            if header == "mod_id": description = "ID único do módulo/ferramenta"
-                                            elif header == "mod_name": description = "Nome de exibição da ferramenta"
-                                            elif header == "mod_description": description = "Descrição da ferramenta"
-                                            elif header == "module_path": description = "Caminho do módulo Python para importação dinâmica"
-                                            elif header == "class_name": description = "Nome da classe da ferramenta dentro do módulo Python" # Adicionado
-                                            elif header == "MOD_WORK_TABLE": description = "Nome da planilha de trabalho principal associada a esta ferramenta (se houver)"
-                                            elif header == "MOD_WORK_TABLE_PATH": description = "Caminho relativo da planilha de trabalho (se houver)"
-                                            elif header == "mod_comment_old": description = "Comentários antigos sobre a ferramenta"
-                                            elif header == "mod_comment_new": description = "Novos comentários sobre a ferramenta"
-                                            else: description = f"Cabeçalho da planilha '{sheet_name}' no arquivo '{os.path.basename(file_path)}'"
-                                        # Adicione mais elifs para outras planilhas específicas se quiser descrições personalizadas
-                                        else:
-                                            description = f"Cabeçalho da planilha '{sheet_name}' no arquivo '{os.path.basename(file_path)}'"
-
-                                        new_db_db_data.append({
-                                            "Arquivo (Caminho)": relative_path,
-                                            "Nome da Coluna (Cabeçalho)": header,
-                                            "pagina_arquivo": sheet_name,
-                                            "descr_variavel": description
-                                        })
-                            else:
-                                print(f"Aviso: Planilha '{sheet_name}' em '{relative_path}' está vazia ou sem cabeçalhos. Ignorando para db_db.")
-                    except Exception as e:
-                        print(f"Erro ao processar arquivo {relative_path}: {e}")
-    
-    save_db_db_data(new_db_db_data)
-    print("Sincronização da planilha 'db_db' concluída.")
+    if db_stamp is not None and result.success:
+        manifest["db_db"] = {"rows_hash": rows_hash, "size": db_stamp[0], "mtime_ns": db_stamp[1]}
+    save_scan_manifest(manifest, result.info)
+    result.info("Sincronização da planilha 'db_db' concluída.")
+    return result
 
 
-def validate_db_consistency():
+def validate_db_consistency(jobs=None, log=print, check_cancelled=None):
     """
     Compara a estrutura atual das planilhas com o que está em 'db_db'.
+    Os arquivos são lidos em paralelo por 'jobs' processos (padrão: número de núcleos).
+    Retorna um MetadataResult: 'success' é False se a db_db não pôde ser carregada ou se há
+    inconsistências (listadas em 'errors'); planilhas não registradas na db_db ficam em 'warnings'.
     """
-    print("\nIniciando validação de consistência...")
-    db_db_schema = get_db_db_data()
+    result = MetadataResult("validate", log)
+    result.info("\nIniciando validação de consistência...")
+    db_db_schema = get_db_db_data(result.info)
     
     if not db_db_schema:
-        print("Erro: A db_db está vazia ou não pôde ser carregada. Por favor, execute 'Sincronizar pagina db_db com planilhas das pastas' primeiro.")
-        sys.exit(1) # Sair com erro se db_db não estiver pronta
+        result.error("Erro: A db_db está vazia ou não pôde ser carregada. Por favor, execute 'Sincronizar pagina db_db com planilhas das pastas' primeiro.")
+        return result
 
     expected_headers = {}
     for entry in db_db_schema:
@@ -225,172 +566,182 @@ def validate_db_consistency():
             expected_headers[key] = []
         expected_headers[key].append(header_name)
 
-    all_consistent = True
-    dirs_to_scan = [USER_SHEETS_DIR, APP_SHEETS_DIR]
-
-    for base_dir in dirs_to_scan:
-        for root, _, files in os.walk(base_dir):
-            for file_name in files:
-                if file_name.endswith(".xlsx") and not file_name.startswith('~$'):
-                    file_path = os.path.join(root, file_name)
-                    if file_path == DB_EXCEL_PATH:
-                        continue
-                    
-                    relative_path = os.path.relpath(file_path, project_root).replace('\\', '/')
-
-                    try:
-                        wb = openpyxl.load_workbook(file_path, data_only=True)
-                        for sheet_name in wb.sheetnames:
-                            current_headers, _ = get_excel_headers(file_path, sheet_name)
-                            
-                            key = (relative_path, sheet_name)
-
-                            if key in expected_headers:
-                                missing_headers = [h for h in expected_headers[key] if h not in current_headers]
-                                extra_headers = [h for h in current_headers if h not in expected_headers[key]]
-
-                                if missing_headers:
-                                    print(f"Inconsistência em '{relative_path}' (planilha '{sheet_name}'): Faltam cabeçalhos: {', '.join(missing_headers)}")
-                                    all_consistent = False
-                                if extra_headers:
-                                    print(f"Inconsistência em '{relative_path}' (planilha '{sheet_name}'): Cabeçalhos extras: {', '.join(extra_headers)}")
-                                    all_consistent = False
-                                # Verifica se a planilha está vazia mas a db_db espera cabeçalhos
-                                if not current_headers and expected_headers[key]:
-                                    print(f"Inconsistência em '{relative_path}' (planilha '{sheet_name}'): Planilha vazia, mas cabeçalhos esperados na db_db.")
-                                    all_consistent = False
-
-                            elif current_headers: 
-                                print(f"Aviso: Planilha '{sheet_name}' em '{relative_path}' existe com cabeçalhos, mas NÃO está registrada na db_db. Considere adicionar.")
-                            else: 
-                                pass 
-
-                    except Exception as e:
-                        print(f"Erro ao validar '{relative_path}' (planilha '{sheet_name}'): {e}")
-                        all_consistent = False
-
-    if all_consistent:
-        print("Todas as planilhas estão consistentes com a db_db. Nenhuma diferença encontrada.")
-        sys.exit(0) # Sair com sucesso
+    if check_cancelled is not None:
+        check_cancelled()
+
+    # A leitura dos arquivos (a parte cara) é feita pelo pool, apenas para os arquivos alterados desde
+    # a última varredura; a comparação é feita, em ordem, neste processo
+    results, manifest, rescanned_count = collect_workbook_headers(jobs)
+    save_scan_manifest(manifest, result.info)
+    result.stats.update(files=len(results), rescanned=rescanned_count)
+    for file_path, headers_by_sheet, error in results:
+        relative_path = os.path.relpath(file_path, project_root).replace('\\', '/')
+        if error is not None:
+            result.error(f"Erro ao validar '{relative_path}': {error}")
+            continue
+
+        for sheet_name, current_headers in headers_by_sheet.items():
+            key = (relative_path, sheet_name)
+
+            if key in expected_headers:
+                missing_headers = [h for h in expected_headers[key] if h not in current_headers]
+                extra_headers = [h for h in current_headers if h not in expected_headers[key]]
+
+                if missing_headers:
+                    result.error(f"Inconsistência em '{relative_path}' (planilha '{sheet_name}'): Faltam cabeçalhos: {', '.join(missing_headers)}")
+                if extra_headers:
+                    result.error(f"Inconsistência em '{relative_path}' (planilha '{sheet_name}'): Cabeçalhos extras: {', '.join(extra_headers)}")
+                # Verifica se a planilha está vazia mas a db_db espera cabeçalhos
+                if not current_headers and expected_headers[key]:
+                    result.error(f"Inconsistência em '{relative_path}' (planilha '{sheet_name}'): Planilha vazia, mas cabeçalhos esperados na db_db.")
+
+            elif current_headers: 
+                result.warning(f"Aviso: Planilha '{sheet_name}' em '{relative_path}' existe com cabeçalhos, mas NÃO está registrada na db_db. Considere adicionar.")
+
+    if result.success:
+        result.info("Todas as planilhas estão consistentes com a db_db. Nenhuma diferença encontrada.")
     else:
-        print("\nValidação concluída com inconsistências. Por favor, revise os erros acima.")
-        sys.exit(1) # Sair com erro
+        result.info("\nValidação concluída com inconsistências. Por favor, revise os erros acima.")
+    return result
 
 
-def create_or_update_sheets():
+def create_or_update_sheets(log=print, check_cancelled=None):
     """
     Cria novas planilhas ou atualiza as existentes com os cabeçalhos definidos na 'db_db'.
     Preserva dados existentes a partir da segunda linha.
+    Cada arquivo é obtido pelo cache de workbooks compartilhado e salvo uma única vez, com todas as suas planilhas.
+    'check_cancelled' (opcional) é chamado entre um arquivo e outro.
+    Retorna um MetadataResult (stats: files, sheets); arquivos que falharam ficam em 'errors'.
     """
-    print("\nIniciando criação/atualização de planilhas...")
-    db_db_schema = get_db_db_data()
+    result = MetadataResult("create_or_update_sheets", log)
+    result.info("\nIniciando criação/atualização de planilhas...")
+    db_db_schema = get_db_db_data(result.info)
 
     if not db_db_schema:
-        print("Erro: A db_db está vazia ou não pôde ser carregada. Por favor, execute 'Sincronizar pagina db_db com planilhas das pastas' primeiro.")
-        sys.exit(1) # Sair com erro
+        result.error("Erro: A db_db está vazia ou não pôde ser carregada. Por favor, execute 'Sincronizar pagina db_db com planilhas das pastas' primeiro.")
+        return result
 
+    # Arquivo -> {planilha: cabeçalhos}, na ordem da db_db
     expected_sheet_headers = {}
     for entry in db_db_schema:
         file_path = os.path.join(project_root, entry["Arquivo (Caminho)"])
         sheet_name = entry["pagina_arquivo"]
         header_name = entry["Nome da Coluna (Cabeçalho)"]
-        
-        key = (file_path, sheet_name)
-        if key not in expected_sheet_headers:
-            expected_sheet_headers[key] = []
-        expected_sheet_headers[key].append(header_name)
+        expected_sheet_headers.setdefault(file_path, {}).setdefault(sheet_name, []).append(header_name)
+
+    updated_files = 0
+    updated_sheets = 0
+    for file_path, sheets in expected_sheet_headers.items():
+        if check_cancelled is not None:
+            check_cancelled()
+        sheet_name = None
+        with workbook_lock(file_path):
+            try:
+                if os.path.exists(file_path):
+                    wb = get_workbook(file_path)
+                else:
+                    wb = openpyxl.Workbook()
+                    if "Sheet" in wb.sheetnames:
+                        wb.remove(wb["Sheet"])
+                    result.info(f"Criando novo arquivo: {os.path.basename(file_path)}")
+
+                for sheet_name, headers_to_set in sheets.items():
+                    if sheet_name in wb.sheetnames:
+                        sheet = wb[sheet_name]
+                        result.info(f"Atualizando planilha existente: '{sheet_name}' em {os.path.basename(file_path)}")
+                    else:
+                        sheet = wb.create_sheet(sheet_name)
+                        result.info(f"Criando nova planilha: '{sheet_name}' em {os.path.basename(file_path)}")
+
+                    current_data = []
+                    if sheet.max_row > 1:
+                        for row_values in sheet.iter_rows(min_row=2, values_only=True):
+                            if not all(v is None for v in row_values):
+                                current_data.append(list(row_values))
+
+                    sheet.delete_rows(1, sheet.max_row)
+                    sheet.append(headers_to_set)
+
+                    # A db_db define a estrutura final: os dados existentes são mantidos pela POSIÇÃO da coluna,
+                    # truncados ou preenchidos com None conforme a quantidade de cabeçalhos.
+                    for row_data in current_data:
+                        appended_row = row_data[:len(headers_to_set)]
+                        while len(appended_row) < len(headers_to_set):
+                            appended_row.append(None)
+                        sheet.append(appended_row)
+                    updated_sheets += 1
+
+                save_workbook(wb, file_path)
+                updated_files += 1
+
+            except Exception as e:
+                invalidate_workbook(file_path) # Descarta alterações parciais feitas no workbook compartilhado
+                result.error(f"Erro ao criar/atualizar '{os.path.basename(file_path)}' (planilha '{sheet_name}'): {e}")
     
-    for (file_path, sheet_name), headers_to_set in expected_sheet_headers.items():
-        try:
-            wb = None
-            if os.path.exists(file_path):
-                wb = openpyxl.load_workbook(file_path)
-            else:
-                wb = openpyxl.Workbook()
-                if "Sheet" in wb.sheetnames:
-                    wb.remove(wb["Sheet"])
-                print(f"Criando novo arquivo: {os.path.basename(file_path)}")
-
-            sheet = None
-            if sheet_name in wb.sheetnames:
-                sheet = wb[sheet_name]
-                print(f"Atualizando planilha existente: '{sheet_name}' em {os.path.basename(file_path)}")
-            else:
-                sheet = wb.create_sheet(sheet_name)
-                print(f"Criando nova planilha: '{sheet_name}' em {os.path.basename(file_path)}")
-
-            current_data = []
-            if sheet.max_row > 1: 
-                for row_idx in range(2, sheet.max_row + 1):
-                    row_values = [cell.value for cell in sheet[row_idx]]
-                    if not all(v is None for v in row_values):
-                        current_data.append(row_values)
-            
-            sheet.delete_rows(1, sheet.max_row)
-
-            sheet.append(headers_to_set)
-
-            for row_data in current_data:
-                new_row = [""] * len(headers_to_set)
-                
-                # Re-le os cabeçalhos da planilha antes de escrever (se ela tiver sido modificada por outra aba)
-                # Ou, para ser mais seguro, mapeie os dados existentes baseados na POSIÇÃO da linha que foi lida
-                # e não no cabeçalho, a menos que você queira remapear colunas com base no NOME.
-                # Para esta função, o mais seguro é assumir que a ordem dos dados originais
-                # deve ser preservada se não houver um mapeamento de nome de coluna.
-                # No entanto, a `db_db` define a ORDEM. Então, vamos mapear pela ordem da db_db.
-                
-                # Para evitar erros de "index out of range" se a linha lida for mais curta que o número de cabeçalhos
-                # na db_db, vamos preencher com valores padrão.
-                
-                # Isso é um ponto complexo: se a `db_db` mudou a ORDEM ou REMOVEU cabeçalhos,
-                # a correspondência de dados por índice pode levar a erros lógicos.
-                # A melhor prática para preservar dados com mudanças de schema é:
-                # 1. Carregar dados existentes MANTENDO O MAPA DE HEADERS ORIGINAIS
-                # 2. Criar uma nova linha vazia com os NOVOS HEADERS da db_db
-                # 3. Preencher a nova linha, mapeando os dados antigos para os novos headers PELO NOME.
-                
-                # Vamos refatorar esta parte para ser mais robusta no remapeamento dos dados.
-                
-                # Antes de deletar as linhas, vamos extrair os dados e seus cabeçalhos originais
-                # Esta parte foi movida para fora do loop principal, ou seja, na inicialização
-                # da função, você carrega os dados e os headers atuais ANTES DE APAGAR TUDO.
-                
-                # Como current_data já foi coletado antes de limpar a planilha,
-                # e current_headers_at_read não é mais usado após o clear.
-                # Precisamos de uma forma de saber o cabeçalho original da linha que está sendo 'preserved'.
-                # A abordagem mais segura é que a db_db defina a estrutura final, e se dados antigos
-                # não se encaixam, eles são descartados ou ficam vazios.
-
-                # Simplified approach: just append as they were read, assuming headers_to_set
-                # defines the final required structure and any non-matching data is ignored.
-                # If there are fewer elements in row_data than headers_to_set, it will be padded.
-                # If there are more, extra elements will be ignored.
-                appended_row = row_data[:len(headers_to_set)] # Trunca ou preenche com base nos headers
-                while len(appended_row) < len(headers_to_set):
-                    appended_row.append(None) # Preenche com None se faltar
-                sheet.append(appended_row)
-
-            wb.save(file_path)
+    result.stats.update(files=updated_files, sheets=updated_sheets)
+    result.info("Criação/Atualização de planilhas concluída.")
+    return result
 
-        except Exception as e:
-            print(f"Erro ao criar/atualizar '{os.path.basename(file_path)}' (planilha '{sheet_name}'): {e}")
-    
-    print("Criação/Atualização de planilhas concluída.")
+
+# Ações disponíveis pela linha de comando e para run_metadata_action()
+METADATA_ACTIONS = {
+    "update_db_schema": update_db_schema,
+    "validate": validate_db_consistency,
+    "create_or_update_sheets": create_or_update_sheets,
+}
+
+
+def run_metadata_action(job, action, **options):
+    """
+    Job do IOService: executa uma ação de METADATA_ACTIONS no próprio processo (sem iniciar outro
+    interpretador) e retorna o MetadataResult. Cada mensagem é enviada por job.report_progress(-1, mensagem)
+    e o cancelamento é verificado nos pontos seguros da ação.
+    As ações que varrem os arquivos usam o pool de processos (spawn) também dentro da GUI.
+    """
+    return METADATA_ACTIONS[action](log=lambda message: job.report_progress(-1, message),
+                                    check_cancelled=job.check_cancelled, **options)
+
+
+def parse_jobs_option(args):
+    """
+    Extrai a opção '--jobs N' (ou '--jobs=N') da lista de argumentos.
+    Retorna (jobs ou None, argumentos restantes). Lança ValueError se N não for um inteiro positivo.
+    """
+    jobs = None
+    remaining = []
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg == "--jobs" or arg.startswith("--jobs="):
+            value = arg.split("=", 1)[1] if "=" in arg else (args.pop(0) if args else "")
+            if not value.isdigit() or int(value) < 1:
+                raise ValueError(f"Valor inválido para --jobs: '{value}'. Use um inteiro positivo.")
+            jobs = int(value)
+        else:
+            remaining.append(arg)
+    return jobs, remaining
 
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        action = sys.argv[1]
+    try:
+        jobs, cli_args = parse_jobs_option(sys.argv[1:])
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    if len(cli_args) > 0:
+        action = cli_args[0]
         if action == "update_db_schema":
-            update_db_schema()
+            # '--full' ignora o manifesto e relê todos os arquivos
+            result = update_db_schema(jobs, incremental="--full" not in cli_args[1:])
         elif action == "validate":
-            validate_db_consistency()
+            result = validate_db_consistency(jobs)
         elif action == "create_or_update_sheets":
-            create_or_update_sheets()
+            result = create_or_update_sheets()
         else:
             print(f"Ação desconhecida: {action}")
             sys.exit(1) # Sair com erro para ações desconhecidas
+        sys.exit(0 if result.success else 1)
     else:
-        print("Uso: python update_user_sheets_metadata.py [update_db_schema|validate|create_or_update_sheets]")
+        print("Uso: python update_user_sheets_metadata.py [update_db_schema [--full]|validate|create_or_update_sheets] [--jobs N]")
         sys.exit(1) # Sair com erro se nenhuma ação for fornecida
@@ -0,0 +1,449 @@
+import argparse
+import os
+import sqlite3
+import threading
+from contextlib import closing
+
+import openpyxl
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_SHEETS_DIR = os.path.join(project_root, "app_sheets")
+USER_SHEETS_DIR = os.path.join(project_root, "user_sheets")
+
+# Banco de usuários/papéis compartilhado pela GUI, pelo servidor web e pelo cliente FastAPI.
+# users.xlsx/access.xlsx continuam editáveis: são reimportados sempre que mudam em disco, mas só as
+# células alteradas desde a importação anterior sobrescrevem o banco (ver AuthStore.sync_from_excel).
+AUTH_DB_PATH = os.path.join(APP_SHEETS_DIR, "auth.sqlite3")
+USERS_EXCEL_PATH = os.path.join(APP_SHEETS_DIR, "users.xlsx")
+ACCESS_EXCEL_PATH = os.path.join(APP_SHEETS_DIR, "access.xlsx")
+# Planilha 'users' onde o servidor web gravava os cadastros antes do banco (migrada para ele)
+LEGACY_DB_EXCEL_PATH = os.path.join(USER_SHEETS_DIR, "db.xlsx")
+
+DEFAULT_ROLE = "user"
+# Tempo máximo (segundos) que uma conexão espera por outra que está gravando
+BUSY_TIMEOUT_SECONDS = 10
+
+# Dados de perfil editados pela ferramenta de configurações do usuário
+PROFILE_FIELDS = ["full_name", "email", "phone", "department"]
+USER_COLUMNS = ["id", "username", "password_hash", "role"] + PROFILE_FIELDS
+USERS_HEADERS = USER_COLUMNS
+ACCESS_HEADERS = ["role", "allowed_tools"]
+
+# 'username' UNIQUE e 'role' PRIMARY KEY criam índices B-tree: buscas e checagem de duplicidade em O(log n)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL UNIQUE,
+    password_hash TEXT NOT NULL,
+    role TEXT NOT NULL DEFAULT 'user',
+    full_name TEXT,
+    email TEXT,
+    phone TEXT,
+    department TEXT
+);
+CREATE TABLE IF NOT EXISTS roles (
+    role TEXT PRIMARY KEY,
+    allowed_tools TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS excel_imports (
+    source TEXT NOT NULL,
+    record_key TEXT NOT NULL,
+    field TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (source, record_key, field)
+);
+"""
+
+# Planilhas importadas automaticamente quando o tamanho/mtime muda: (chave em 'meta', arquivo, planilha).
+# users.xlsx/access.xlsx atualizam os registros de mesmo nome (só as colunas cujo valor na planilha mudou
+# desde a importação anterior, guardada em 'excel_imports'); o db.xlsx antigo só acrescenta usuários novos.
+EXCEL_SOURCES = [
+    ("users_xlsx", USERS_EXCEL_PATH, "users"),
+    ("access_xlsx", ACCESS_EXCEL_PATH, "access"),
+    ("legacy_db_users", LEGACY_DB_EXCEL_PATH, "users"),
+]
+
+_USER_SELECT = f"SELECT {', '.join(USER_COLUMNS)} FROM users"
+
+
+def parse_allowed_tools(allowed_tools):
+    """'all' -> "all"; 'a, b' -> ['a', 'b'] (mesmo formato lido de access.xlsx)."""
+    allowed_tools = "" if allowed_tools is None else str(allowed_tools)
+    if allowed_tools.strip().lower() == "all":
+        return "all"
+    return [tool_id.strip() for tool_id in allowed_tools.split(",") if tool_id.strip()]
+
+
+def _source_stamp(file_path):
+    """'tamanho:mtime_ns' do arquivo (gravado em 'meta'), ou None se ele não existir."""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _record_id(conn, record, username):
+    """Id do registro da planilha, se for um inteiro ainda livre (ou já deste usuário); senão None (gerado pelo banco)."""
+    user_id = record.get("id")
+    # Ids vindos do Excel podem ser float (1.0)
+    if isinstance(user_id, float) and user_id.is_integer():
+        user_id = int(user_id)
+    if not isinstance(user_id, int) or conn.execute(
+            "SELECT 1 FROM users WHERE id = ? AND username != ?", (user_id, username)).fetchone():
+        return None
+    return user_id
+
+
+def _profile_values(record):
+    """Campos de perfil presentes na planilha (colunas ausentes não apagam o que já está no banco)."""
+    return {field: (None if record[field] is None else str(record[field])) for field in PROFILE_FIELDS if field in record}
+
+
+def _bump_roles_revision(conn):
+    """Incrementa, na transação de 'conn', o contador 'roles_revision' de 'meta' (ver AuthStore.roles_revision)."""
+    conn.execute("INSERT INTO meta (key, value) VALUES ('roles_revision', 1) "
+                 "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+
+
+def _changed_fields(conn, source, record_key, values):
+    """
+    Campos de 'values' cujo valor na planilha 'source' mudou desde a importação anterior do registro
+    (todos, se 'source' for None: importação explícita). Os valores alterados ficam gravados em
+    'excel_imports' para a próxima comparação.
+    """
+    if source is None:
+        return dict(values)
+    previous = dict(conn.execute("SELECT field, value FROM excel_imports WHERE source = ? AND record_key = ?",
+                                 (source, record_key)).fetchall())
+    changed = {field: value for field, value in values.items() if field not in previous or previous[field] != value}
+    conn.executemany("INSERT INTO excel_imports (source, record_key, field, value) VALUES (?, ?, ?, ?) "
+                     "ON CONFLICT(source, record_key, field) DO UPDATE SET value = excluded.value",
+                     [(source, record_key, field, value) for field, value in changed.items()])
+    return changed
+
+
+def _upsert_sql(table, key_column, columns, changed):
+    """INSERT de 'columns' que, se o registro já existir, atualiza só as colunas de 'changed'."""
+    on_conflict = f"DO UPDATE SET {', '.join(f'{column} = excluded.{column}' for column in changed)}" if changed else "DO NOTHING"
+    return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT({key_column}) {on_conflict}")
+
+
+def _read_records(file_path, sheet_name):
+    """Linhas não vazias de uma planilha como dicionários {cabeçalho: valor} (modo somente leitura)."""
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        if sheet_name not in wb.sheetnames:
+            raise KeyError(f"A planilha '{sheet_name}' não foi encontrada em '{os.path.basename(file_path)}'.")
+        rows = wb[sheet_name].iter_rows(values_only=True)
+        headers = list(next(rows, None) or ())
+        records = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            records.append({header: value for header, value in zip(headers, row) if header is not None})
+        return records
+    finally:
+        wb.close()
+
+
+def _save_new_workbook(file_path, sheet_name, headers, rows):
+    """Grava um workbook de uma planilha de forma atômica (arquivo temporário + rename)."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = sheet_name
+    ws.append(headers)
+    for row in rows:
+        ws.append(list(row))
+    temp_path = file_path + ".tmp"
+    wb.save(temp_path)
+    os.replace(temp_path, file_path)
+
+
+class AuthStore:
+    """
+    Usuários e permissões de papéis em SQLite.
+    Cada operação abre sua própria conexão, então o objeto pode ser usado por várias threads
+    (requests do Flask, jobs da GUI) e por processos diferentes ao mesmo tempo: o SQLite serializa
+    as gravações, e a restrição UNIQUE de 'username' garante que um registro concorrente com o
+    mesmo nome falhe em vez de duplicar ou sobrescrever o usuário.
+    """
+    def __init__(self, path=AUTH_DB_PATH):
+        self.path = path
+        self._synced_stamps = {} # chave de EXCEL_SOURCES -> carimbo já verificado por este processo
+        self._sync_lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def initialize(self):
+        """Cria as tabelas, se ainda não existirem, e acrescenta as colunas de perfil a bancos antigos."""
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(SCHEMA)
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(users)")}
+            for field in PROFILE_FIELDS:
+                if field not in existing:
+                    conn.execute(f"ALTER TABLE users ADD COLUMN {field} TEXT")
+
+    # --- Usuários ---
+
+    def get_user(self, username):
+        """Usuário {'id', 'username', 'password_hash', 'role', campos de perfil} ou None (busca pelo índice de 'username')."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(f"{_USER_SELECT} WHERE username = ?", (username,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def get_users(self):
+        """Todos os usuários, {username: usuário}."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(f"{_USER_SELECT} ORDER BY id").fetchall()
+        return {row["username"]: dict(row) for row in rows}
+
+    def add_user(self, username, password_hash, role=DEFAULT_ROLE):
+        """
+        Insere um usuário em uma transação e retorna seu id.
+        Lança ValueError se o nome de usuário já existir (inclusive se outro processo acabou de registrá-lo).
+        """
+        try:
+            with closing(self._connect()) as conn, conn:
+                cursor = conn.execute("INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
+                                      (username, password_hash, role or DEFAULT_ROLE))
+                return cursor.lastrowid
+        except sqlite3.IntegrityError:
+            raise ValueError("Nome de usuário já existe.")
+
+    def update_profile(self, username, **profile):
+        """
+        Atualiza os campos de perfil (PROFILE_FIELDS) do usuário.
+        Retorna False se o usuário não existir; lança ValueError para campos desconhecidos.
+        """
+        unknown = [field for field in profile if field not in PROFILE_FIELDS]
+        if unknown:
+            raise ValueError(f"Campo(s) de perfil desconhecido(s): {', '.join(unknown)}")
+        if not profile:
+            return self.get_user(username) is not None
+        assignments = ", ".join(f"{field} = ?" for field in profile)
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(f"UPDATE users SET {assignments} WHERE username = ?", (*profile.values(), username))
+            return cursor.rowcount > 0
+
+    # --- Papéis ---
+
+    def get_role_permissions(self):
+        """Permissões por papel: {papel: [ids das ferramentas]} ou {papel: "all"}."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT role, allowed_tools FROM roles ORDER BY role").fetchall()
+        return {row["role"]: parse_allowed_tools(row["allowed_tools"]) for row in rows}
+
+    def set_role_permissions(self, role, allowed_tools):
+        """Cria ou atualiza um papel. 'allowed_tools': "all", lista de ids ou texto separado por vírgulas."""
+        if isinstance(allowed_tools, (list, tuple)):
+            allowed_tools = ",".join(allowed_tools)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("INSERT INTO roles (role, allowed_tools) VALUES (?, ?) "
+                         "ON CONFLICT(role) DO UPDATE SET allowed_tools = excluded.allowed_tools",
+                         (role, str(allowed_tools or "")))
+            _bump_roles_revision(conn)
+
+    def roles_revision(self):
+        """
+        Contador incrementado na mesma transação de toda alteração de papéis (por qualquer processo).
+        Quem guarda as permissões em memória compara este valor para saber se precisa relê-las.
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'roles_revision'").fetchone()
+        return int(row["value"]) if row is not None else 0
+
+    # --- Importação/Exportação Excel ---
+
+    def import_from_excel(self, users_path=None, access_path=None, users_sheet="users", access_sheet="access", replace=False):
+        """
+        Importa usuários e/ou papéis das planilhas (mesmos cabeçalhos de users.xlsx e access.xlsx).
+        Importação explícita: usuários e papéis existentes recebem todos os valores das planilhas; com 'replace', os que não estão nas planilhas
+        são removidos. Tudo acontece em uma única transação: uma planilha inválida não deixa o banco
+        pela metade. Retorna (usuários importados, papéis importados).
+        """
+        users = _read_records(users_path, users_sheet) if users_path else None
+        roles = _read_records(access_path, access_sheet) if access_path else None
+
+        imported_users = imported_roles = 0
+        with closing(self._connect()) as conn, conn:
+            if users is not None:
+                if replace:
+                    conn.execute("DELETE FROM users")
+                imported_users = self._import_users(conn, users)
+            if roles is not None:
+                if replace:
+                    conn.execute("DELETE FROM roles")
+                imported_roles = self._import_roles(conn, roles)
+                _bump_roles_revision(conn)
+        return imported_users, imported_roles
+
+    def _import_users(self, conn, records, source=None):
+        """
+        Insere os usuários novos das planilhas e atualiza (senha, papel e perfil) os existentes.
+        Com 'source' (importação automática), um usuário existente só recebe as colunas cujo valor mudou
+        na planilha desde a importação anterior: uma cópia antiga do arquivo não desfaz alterações feitas
+        depois no banco. Retorna quantos foram inseridos ou atualizados.
+        """
+        imported = 0
+        for record in records:
+            username, password_hash = record.get("username"), record.get("password_hash")
+            if username is None or password_hash is None:
+                print(f"Aviso: Ignorando usuário sem 'username' ou 'password_hash': {record}")
+                continue
+            username = str(username)
+            values = {"password_hash": str(password_hash), "role": str(record.get("role") or DEFAULT_ROLE),
+                      **_profile_values(record)}
+            changed = _changed_fields(conn, source, username, values)
+            cursor = conn.execute(_upsert_sql("users", "username", ["id", "username", *values], changed),
+                                  (_record_id(conn, record, username), username, *values.values()))
+            imported += cursor.rowcount > 0
+        return imported
+
+    def _import_legacy_users(self, conn, records):
+        """
+        Migra os usuários da antiga planilha 'users' do db.xlsx: nomes novos são inseridos; para nomes que
+        já existem no banco, senha e papel do db.xlsx são rejeitados (o banco prevalece) e só os campos de
+        perfil ainda vazios são preenchidos. Retorna quantos usuários foram inseridos.
+        """
+        inserted = 0
+        for record in records:
+            username, password_hash = record.get("username"), record.get("password_hash")
+            if username is None or password_hash is None:
+                continue
+            username = str(username)
+            profile = _profile_values(record)
+            if conn.execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone():
+                print(f"Aviso: Usuário '{username}' do db.xlsx já existe no banco de autenticação; senha e papel do db.xlsx ignorados.")
+                if profile:
+                    fills = ", ".join(f"{field} = COALESCE(NULLIF({field}, ''), ?)" for field in profile)
+                    conn.execute(f"UPDATE users SET {fills} WHERE username = ?", (*profile.values(), username))
+                continue
+            columns = ["id", "username", "password_hash", "role", *profile]
+            conn.execute(f"INSERT INTO users ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                         (_record_id(conn, record, username), username, str(password_hash),
+                          str(record.get("role") or DEFAULT_ROLE), *profile.values()))
+            inserted += 1
+        return inserted
+
+    def _import_roles(self, conn, records, source=None):
+        """Insere ou atualiza os papéis das planilhas ('source': como em _import_users). Retorna quantos foram importados."""
+        imported = 0
+        for record in records:
+            role = record.get("role")
+            if role is None:
+                continue
+            values = {"allowed_tools": str(record.get("allowed_tools") or "")}
+            changed = _changed_fields(conn, source, str(role), values)
+            cursor = conn.execute(_upsert_sql("roles", "role", ["role", *values], changed), (str(role), *values.values()))
+            imported += cursor.rowcount > 0
+        return imported
+
+    def sync_from_excel(self, sources=EXCEL_SOURCES):
+        """
+        Reimporta as planilhas de 'sources' cujo tamanho/mtime mudou desde a última importação.
+        Registros existentes só recebem as células que mudaram desde a importação anterior, então salvar
+        de novo uma cópia antiga da planilha não sobrescreve o que foi alterado depois no banco.
+        O carimbo importado fica na tabela 'meta' (compartilhada pelos processos) e em memória, então
+        quando nada mudou o custo é um os.stat por arquivo. Uma planilha que falhar (ex: salva pela metade)
+        é tentada de novo quando o arquivo mudar outra vez.
+        """
+        with self._sync_lock:
+            pending = []
+            for key, file_path, sheet_name in sources:
+                stamp = _source_stamp(file_path)
+                if stamp is not None and self._synced_stamps.get(key) != stamp:
+                    pending.append((key, file_path, sheet_name, stamp))
+            if not pending:
+                return
+            with closing(self._connect()) as conn:
+                imported_stamps = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+            for key, file_path, sheet_name, stamp in pending:
+                if imported_stamps.get(key) != stamp:
+                    try:
+                        self._import_source(key, file_path, sheet_name, stamp)
+                    except Exception as e:
+                        print(f"Aviso: Não foi possível importar a planilha '{sheet_name}' de {os.path.basename(file_path)}: {e}")
+                self._synced_stamps[key] = stamp
+
+    def _import_source(self, key, file_path, sheet_name, stamp):
+        try:
+            records = _read_records(file_path, sheet_name)
+        except KeyError:
+            records = [] # Planilha ausente (ex: db.xlsx sem a antiga planilha 'users'): nada a importar
+        with closing(self._connect()) as conn, conn:
+            if key == "access_xlsx":
+                count = self._import_roles(conn, records, source=key)
+                if count:
+                    _bump_roles_revision(conn)
+            elif key == "legacy_db_users":
+                count = self._import_legacy_users(conn, records)
+            else:
+                count = self._import_users(conn, records, source=key)
+            conn.execute("INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                         (key, stamp))
+        if count:
+            print(f"Banco de autenticação: {count} registro(s) importado(s) de {os.path.basename(file_path)} (planilha '{sheet_name}').")
+
+    def export_to_excel(self, users_path=USERS_EXCEL_PATH, access_path=ACCESS_EXCEL_PATH):
+        """Grava os usuários e papéis do banco em users.xlsx/access.xlsx (planilhas 'users' e 'access')."""
+        with closing(self._connect()) as conn:
+            users = conn.execute(f"{_USER_SELECT} ORDER BY id").fetchall()
+            roles = conn.execute("SELECT role, allowed_tools FROM roles ORDER BY role").fetchall()
+        if users_path:
+            _save_new_workbook(users_path, "users", USERS_HEADERS, users)
+        if access_path:
+            _save_new_workbook(access_path, "access", ACCESS_HEADERS, roles)
+        return len(users), len(roles)
+
+
+_auth_store = None
+_auth_store_lock = threading.Lock()
+
+
+def get_auth_store():
+    """
+    Retorna o AuthStore do processo, criando o banco na primeira chamada.
+    A cada chamada, reimporta users.xlsx, access.xlsx e a antiga planilha 'users' do db.xlsx se algum
+    deles mudou em disco (ver AuthStore.sync_from_excel), então edições nas planilhas valem sem reiniciar.
+    """
+    global _auth_store
+    with _auth_store_lock:
+        if _auth_store is None:
+            store = AuthStore()
+            store.initialize()
+            _auth_store = store
+    _auth_store.sync_from_excel()
+    return _auth_store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa/exporta usuários e papéis do banco de autenticação (auth.sqlite3).")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("--users", default=USERS_EXCEL_PATH, help="Arquivo com a planilha de usuários (padrão: app_sheets/users.xlsx)")
+    parser.add_argument("--users-sheet", default="users")
+    parser.add_argument("--access", default=ACCESS_EXCEL_PATH, help="Arquivo com a planilha de papéis (padrão: app_sheets/access.xlsx)")
+    parser.add_argument("--access-sheet", default="access")
+    parser.add_argument("--no-users", action="store_true", help="Não importa/exporta usuários")
+    parser.add_argument("--no-access", action="store_true", help="Não importa/exporta papéis")
+    parser.add_argument("--replace", action="store_true", help="Na importação, remove do banco o que não está nas planilhas")
+    args = parser.parse_args()
+
+    auth_store = AuthStore()
+    auth_store.initialize()
+    users_file = None if args.no_users else args.users
+    access_file = None if args.no_access else args.access
+    if args.action == "import":
+        count_users, count_roles = auth_store.import_from_excel(users_file, access_file, args.users_sheet, args.access_sheet, replace=args.replace)
+        print(f"Importados {count_users} usuário(s) e {count_roles} papel(éis) para {auth_store.path}.")
+    else:
+        count_users, count_roles = auth_store.export_to_excel(users_file, access_file)
+        print(f"Exportados {count_users} usuário(s) e {count_roles} papel(éis) de {auth_store.path}.")
@@ -0,0 +1,232 @@
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import openpyxl
+
+# Planilhas mantidas em memória (colunares) pelo SheetQueryCache
+DEFAULT_MAX_CACHED_SHEETS = 8
+# Resultados de consultas (filtro + ordenação -> ids das linhas) guardados por planilha
+MAX_CACHED_QUERIES = 32
+
+FILTER_RE = re.compile(r"^(.+?)(==|!=|>=|<=|~|>|<)(.*)$")
+FILTER_OPERATORS = ("==", "!=", ">=", "<=", "~", ">", "<")
+
+
+def normalize_text(value):
+    """Texto para comparação: minúsculo e sem acentos ('Ação' -> 'acao'). None vira ""."""
+    if value is None:
+        return ""
+    text = str(value).lower()
+    if text.isascii():
+        return text
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def _file_stamp(file_path):
+    stat = os.stat(file_path)
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def _number(value):
+    """Valor numérico para comparação, ou None se não for um número."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(str(value).replace(",", "."))
+    except (TypeError, ValueError):
+        return None
+
+
+def _sort_key(value):
+    """Chave de ordenação para colunas com tipos misturados: números, depois textos; vazios por último."""
+    if value is None or value == "":
+        return (2, 0, "")
+    number = _number(value) if isinstance(value, (int, float)) else None
+    if number is not None:
+        return (0, number, "")
+    return (1, 0, normalize_text(value))
+
+
+def parse_filter(expression, headers):
+    """
+    Converte 'coluna<op>valor' em (índice da coluna, operador, valor). Operadores: == != >= <= > < e ~ (contém,
+    sem diferenciar maiúsculas/acentos). Lança ValueError se a expressão ou a coluna forem inválidas.
+    """
+    match = FILTER_RE.match(expression)
+    if not match:
+        raise ValueError(f"Filtro inválido: '{expression}'. Use coluna<op>valor com {', '.join(FILTER_OPERATORS)}.")
+    column, operator, value = match.group(1).strip(), match.group(2), match.group(3).strip()
+    if column not in headers:
+        raise ValueError(f"Coluna desconhecida no filtro: '{column}'.")
+    return headers.index(column), operator, value
+
+
+def parse_sort(expression, headers):
+    """Converte 'col1,-col2' em [(índice, decrescente)]. Lança ValueError para colunas desconhecidas."""
+    sort = []
+    for part in (p.strip() for p in expression.split(",")):
+        if not part:
+            continue
+        descending = part.startswith("-")
+        column = part.lstrip("+-")
+        if column not in headers:
+            raise ValueError(f"Coluna desconhecida na ordenação: '{column}'.")
+        sort.append((headers.index(column), descending))
+    return sort
+
+
+def _matcher(operator, expected):
+    """Função valor -> bool de um filtro. Comparações usam números quando valor e filtro são numéricos."""
+    expected_number = _number(expected)
+    expected_text = normalize_text(expected)
+    if operator == "~":
+        return lambda value: value is not None and expected_text in normalize_text(value)
+
+    def compare(value):
+        if value is None or value == "":
+            return operator == "!=" if expected_text else operator == "=="
+        value_number = _number(value) if expected_number is not None else None
+        if value_number is not None:
+            left, right = value_number, expected_number
+        else:
+            left, right = normalize_text(value), expected_text
+        if operator == "==":
+            return left == right
+        if operator == "!=":
+            return left != right
+        if operator == ">=":
+            return left >= right
+        if operator == "<=":
+            return left <= right
+        if operator == ">":
+            return left > right
+        return left < right
+    return compare
+
+
+class ColumnarSheet:
+    """
+    Cópia em memória de uma planilha, por colunas (uma lista de valores por cabeçalho).
+    Imutável depois de lida: consultas concorrentes não precisam de lock, exceto no cache de resultados.
+    Cada combinação de filtros + ordenação é calculada uma vez e guardada (ids das linhas), então
+    as páginas seguintes da mesma consulta são só fatias dessa lista.
+    """
+    def __init__(self, headers, columns, stamp):
+        self.headers = headers
+        self.columns = columns
+        self.row_count = len(columns[0]) if columns else 0
+        self.stamp = stamp
+        self._queries = OrderedDict()
+        self._queries_lock = threading.Lock()
+
+    @classmethod
+    def read(cls, file_path, sheet_name):
+        """Lê a planilha em modo somente leitura. Lança KeyError se ela não existir."""
+        stamp = _file_stamp(file_path)
+        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            if sheet_name not in wb.sheetnames:
+                raise KeyError(f"A planilha '{sheet_name}' não foi encontrada em '{os.path.basename(file_path)}'.")
+            rows = wb[sheet_name].iter_rows(values_only=True)
+            first_row = next(rows, None) or ()
+            headers = []
+            positions = []
+            for position, header in enumerate(first_row):
+                if header is not None and str(header) not in headers:
+                    headers.append(str(header))
+                    positions.append(position)
+            columns = [[] for _ in headers]
+            for row in rows:
+                if all(value is None for value in row):
+                    continue
+                for column, position in zip(columns, positions):
+                    column.append(row[position] if position < len(row) else None)
+        finally:
+            wb.close()
+        return cls(headers, columns, stamp)
+
+    def select(self, filters=(), sort=()):
+        """Ids das linhas que passam em todos os filtros, na ordem pedida (resultado guardado em cache)."""
+        key = (tuple(filters), tuple(sort))
+        with self._queries_lock:
+            cached = self._queries.get(key)
+            if cached is not None:
+                self._queries.move_to_end(key)
+                return cached
+
+        row_ids = range(self.row_count)
+        for column_index, operator, value in filters:
+            column = self.columns[column_index]
+            matches = _matcher(operator, value)
+            row_ids = [row_id for row_id in row_ids if matches(column[row_id])]
+        row_ids = list(row_ids)
+        # Ordenações estáveis, da última chave para a primeira
+        for column_index, descending in reversed(sort):
+            column = self.columns[column_index]
+            if descending:
+                # Vazios continuam por último também na ordem decrescente
+                filled = [row_id for row_id in row_ids if column[row_id] not in (None, "")]
+                empty = [row_id for row_id in row_ids if column[row_id] in (None, "")]
+                filled.sort(key=lambda row_id: _sort_key(column[row_id]), reverse=True)
+                row_ids = filled + empty
+            else:
+                row_ids.sort(key=lambda row_id: _sort_key(column[row_id]))
+
+        with self._queries_lock:
+            self._queries[key] = row_ids
+            while len(self._queries) > MAX_CACHED_QUERIES:
+                self._queries.popitem(last=False)
+        return row_ids
+
+    def records(self, row_ids, column_indexes):
+        """Gera um dicionário {cabeçalho: valor} por linha, só com as colunas pedidas."""
+        selected = [(self.headers[index], self.columns[index]) for index in column_indexes]
+        for row_id in row_ids:
+            yield {header: column[row_id] for header, column in selected}
+
+
+class SheetQueryCache:
+    """
+    Planilhas colunares compartilhadas pelos requests: cada uma é lida com o openpyxl só quando
+    o arquivo muda (tamanho/mtime); as menos usadas são descartadas acima de 'max_sheets'.
+    """
+    def __init__(self, max_sheets=DEFAULT_MAX_CACHED_SHEETS):
+        self.max_sheets = max_sheets
+        self._sheets = OrderedDict() # (caminho, planilha) -> ColumnarSheet
+        self._lock = threading.Lock()
+        self._build_locks = {} # (caminho, planilha) -> Lock, só enquanto a planilha está sendo lida
+
+    def get(self, file_path, sheet_name):
+        """Retorna a ColumnarSheet atual da planilha (relida se o arquivo mudou)."""
+        key = (os.path.abspath(file_path), sheet_name)
+        stamp = _file_stamp(file_path)
+        with self._lock:
+            sheet = self._sheets.get(key)
+            if sheet is not None and sheet.stamp == stamp:
+                self._sheets.move_to_end(key)
+                return sheet
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+        with build_lock: # Uma única leitura por planilha, mesmo com vários requests simultâneos
+            try:
+                with self._lock:
+                    sheet = self._sheets.get(key)
+                if sheet is None or sheet.stamp != _file_stamp(file_path):
+                    sheet = ColumnarSheet.read(file_path, sheet_name)
+                    with self._lock:
+                        self._sheets[key] = sheet
+                        self._sheets.move_to_end(key)
+                        while len(self._sheets) > self.max_sheets:
+                            self._sheets.popitem(last=False)
+                return sheet
+            finally:
+                # O lock de leitura é descartado ao fim (com sucesso ou erro, ex: planilha inexistente),
+                # então nomes de planilha arbitrários não fazem o dicionário crescer indefinidamente
+                with self._lock:
+                    if self._build_locks.get(key) is build_lock:
+                        del self._build_locks[key]
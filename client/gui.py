@@ -1,11 +1,6 @@
 import sys
 import os
 import bcrypt
-import openpyxl
-import json
-import subprocess
-import threading 
-import importlib 
 
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QToolBar, QAction, QTabWidget, QMenu, QToolButton,
@@ -14,7 +9,7 @@ from PyQt5.QtWidgets import (
     QGraphicsScene, QGraphicsRectItem, QGraphicsLineItem, QDialog, QListWidget, QListWidgetItem, QTableWidget, QTableWidgetItem, QHeaderView, QInputDialog, QComboBox, QGraphicsTextItem,
     QTextEdit 
 )
-from PyQt5.QtCore import Qt, QPointF, QFileInfo
+from PyQt5.QtCore import Qt, QPointF, QFileInfo, QTimer
 from PyQt5.QtGui import QBrush, QPen, QColor, QFont 
 
 # --- Correção para ModuleNotFoundError: No module named 'ui' ---
@@ -24,29 +19,18 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 # --- Importar Módulos das Ferramentas ---
-# Agora importamos SearchBarWidget e MiniConsoleWidget
-from ui.tools.product_data import ProductDataTool
-from ui.tools.bom_manager import BomManagerTool
-from ui.tools.configurador import ConfiguradorTool
-from ui.tools.colaboradores import ColaboradoresTool
-from ui.tools.items import ItemsTool
-from ui.tools.manufacturing import ManufacturingTool
-from ui.tools.pcp import PcpTool
-from ui.tools.estoque import EstoqueTool
-from ui.tools.financeiro import FinanceiroTool 
-from ui.tools.pedidos import PedidosTool
-from ui.tools.manutencao import ManutencaoTool
-from ui.tools.engenharia_data import EngenhariaDataTool 
-from ui.tools.excel_viewer_tool import ExcelViewerTool 
-from ui.tools.structure_view_tool import StructureViewTool
-from ui.tools.rpi_tool import RpiTool 
-from ui.tools.engenharia_workflow_tool import EngenhariaWorkflowTool 
-from ui.tools.user_settings_tool import UserSettingsTool
-from app_sheets.tools.tools_line_generator import ToolsLineGeneratorTool 
+# As classes das ferramentas são carregadas na primeira abertura, a partir do registro em tools.xlsx
+# (module_path + class_name), e pré-carregadas em segundo plano depois que a janela principal aparece.
+from ui.tools.tool_loader import load_tool_class, prewarm_tool_modules
 
 # NOVAS IMPORTAÇÕES DE WIDGETS MODULARIZADOS
-from ui.tools.search_bar import SearchBarWidget 
+from ui.tools.search_bar import SearchBarWidget, WORKSPACE_DESCRIPTION_ROLE, GLOBAL_SEARCH_PREFIX
+from ui.tools.global_search import list_directory_entries
 from ui.tools.mini_console import MiniConsoleWidget
+from ui.tools.io_worker import IOStatusBar
+from ui.tools.workbook_cache import get_workbook
+from ui.tools.config_snapshot import get_config_snapshot
+from backend.auth_store import get_auth_store, AUTH_DB_PATH
 
 # --- Configuração dos Caminhos dos Arquivos ---
 USER_SHEETS_DIR = os.path.join(project_root, "user_sheets")
@@ -80,6 +64,9 @@ SHEET_VALIDATOR_SCRIPT_PATH = os.path.join(APP_SHEETS_DIR, "tools", "sheet_valid
 CREATE_ENGENHARIA_SCRIPT_PATH = os.path.join(APP_SHEETS_DIR, "tools", "create_engenharia_xlsx.py")
 TOOLS_LINE_GENERATOR_SCRIPT_PATH = os.path.join(APP_SHEETS_DIR, "tools", "tools_line_generator.py") 
 
+# Ferramenta usada para abrir arquivos da árvore (module_path, class_name), fora do menu de ferramentas
+EXCEL_VIEWER_TOOL = ("ui.tools.excel_viewer_tool", "ExcelViewerTool")
+
 # Lista de arquivos protegidos (atualizada com os novos módulos)
 PROTECTED_FILES = [
     os.path.basename(COLABORADORES_EXCEL_PATH),
@@ -103,6 +90,7 @@ PROTECTED_FILES = [
     os.path.basename(MAIN_EXCEL_PATH), 
     os.path.basename(MODULES_EXCEL_PATH), 
     os.path.basename(PERMISSIONS_EXCEL_PATH), 
+    os.path.basename(AUTH_DB_PATH),
     
     os.path.basename(UPDATE_METADATA_SCRIPT_PATH),
     os.path.basename(SHEET_VALIDATOR_SCRIPT_PATH), 
@@ -123,109 +111,13 @@ os.makedirs(os.path.join(project_root, 'ui', 'tools'), exist_ok=True) # Garante
 
 
 # === FUNÇÕES AUXILIARES DE PLANILHA ===
-def load_users_from_excel_util():
-    """Carrega dados de usuário do arquivo users.xlsx (agora em app_sheets)."""
-    users = {}
-    try:
-        if not os.path.exists(USERS_EXCEL_PATH):
-            QMessageBox.critical(None, "Arquivo Não Encontrado", f"O arquivo de usuários não foi encontrado: {USERS_EXCEL_PATH}")
-            return {}
-
-        wb = openpyxl.load_workbook(USERS_EXCEL_PATH)
-        users_sheet = wb["users"] 
-        
-        headers = [cell.value for cell in users_sheet[1]] if users_sheet.max_row >= 1 else []
-        header_map = {h: idx for idx, h in enumerate(headers)}
-
-        required_headers = ["id", "username", "password_hash", "role"]
-        if not all(h in header_map for h in required_headers):
-            QMessageBox.warning(None, "Cabeçalhos Ausentes", 
-                                f"A planilha 'users' em {USERS_EXCEL_PATH} não possui todos os cabeçalhos esperados. "
-                                f"Esperado: {', '.join(required_headers)}")
-            return {}
-
-        for row_idx in range(2, users_sheet.max_row + 1):
-            row_values = [cell.value for cell in users_sheet[row_idx]]
-            
-            if all(v is None for v in row_values):
-                continue
-
-            user_id = row_values[header_map["id"]] if "id" in header_map and header_map["id"] < len(row_values) else None
-            username = row_values[header_map["username"]] if "username" in header_map and header_map["username"] < len(row_values) else None
-            password_hash = row_values[header_map["password_hash"]] if "password_hash" in header_map and header_map["password_hash"] < len(row_values) else None
-            role = row_values[header_map["role"]] if "role" in header_map and header_map["role"] < len(row_values) else None
-
-            if username is not None and password_hash is not None:
-                users[str(username)] = { 
-                    "id": user_id,
-                    "username": str(username),
-                    "password_hash": str(password_hash),
-                    "role": str(role) if role is not None else "user"
-                }
-            else:
-                print(f"Aviso: Ignorando linha malformada na planilha 'users' (linha {row_idx}): {row_values}")
-
-    except KeyError:
-        QMessageBox.critical(None, "Erro de Planilha", f"A planilha 'users' não foi encontrada em {USERS_EXCEL_PATH}. Por favor, certifique-se de que o nome da planilha seja 'users'.")
-        return {}
-    except Exception as e:
-        QMessageBox.critical(None, "Erro de Carregamento", f"Erro ao carregar usuários: {e}")
-        return {}
-    return users
-
-
 def register_user(username, password, role="user"):
-    """Registra um novo usuário no arquivo users.xlsx (agora em app_sheets)."""
-    try:
-        wb = openpyxl.load_workbook(USERS_EXCEL_PATH)
-        sheet = wb["users"]
-        
-        headers = [cell.value for cell in sheet[1]] if sheet.max_row >= 1 else []
-        header_map = {h: idx for idx, h in enumerate(headers)}
-
-        required_headers = ["id", "username", "password_hash", "role"]
-        if not all(h in header_map for h in required_headers):
-            for h in required_headers:
-                if h not in header_map:
-                    headers.append(h)
-            sheet.insert_rows(1) 
-            for col_idx, h in enumerate(headers):
-                sheet.cell(row=1, column=col_idx + 1).value = h
-            header_map = {h: idx for idx, h in enumerate(headers)} 
-
-        next_id = 1
-        existing_ids = set()
-        for row_idx in range(2, sheet.max_row + 1):
-            row_values = [cell.value for cell in sheet[row_idx]]
-            current_id = row_values[header_map["id"]] if "id" in header_map and header_map["id"] < len(row_values) else None
-            current_username = row_values[header_map["username"]] if "username" in header_map and header_map["username"] < len(row_values) else None
-
-            if all(v is None for v in row_values):
-                continue
-
-            if current_id is not None:
-                existing_ids.add(current_id)
-            if current_username == username:
-                raise ValueError("Nome de usuário já existe.")
-        while next_id in existing_ids:
-            next_id += 1
-
-        password_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
-        
-        new_row_data = [""] * len(headers)
-        new_row_data[header_map["id"]] = next_id
-        new_row_data[header_map["username"]] = username
-        new_row_data[header_map["password_hash"]] = password_hash
-        new_row_data[header_map["role"]] = role
-        
-        sheet.append(new_row_data)
-        wb.save(USERS_EXCEL_PATH)
-    except FileNotFoundError:
-        QMessageBox.critical(None, "Arquivo Não Encontrado", f"O arquivo de usuários não foi encontrado em: {USERS_EXCEL_PATH}. Não é possível registrar o usuário.")
-    except KeyError:
-        QMessageBox.critical(None, "Erro de Planilha", f"A planilha 'users' não foi encontrada em {USERS_EXCEL_PATH}. Não é possível registrar o usuário.")
-    except Exception as e:
-        QMessageBox.critical(None, "Erro", f"Ocorreu um erro durante o registro: {e}")
+    """
+    Registra um novo usuário no banco de autenticação (auth.sqlite3).
+    Lança ValueError se o nome de usuário já existir.
+    """
+    password_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    return get_auth_store().add_user(username, password_hash, role)
 
 
 def load_tools_from_excel_util():
@@ -239,7 +131,7 @@ def load_tools_from_excel_util():
             QMessageBox.critical(None, "Arquivo Não Encontrado", f"O arquivo de ferramentas não foi encontrado: {TOOLS_EXCEL_PATH}. Por favor, certifique-se de que ele exista.")
             return {}
 
-        wb = openpyxl.load_workbook(TOOLS_EXCEL_PATH)
+        wb = get_workbook(TOOLS_EXCEL_PATH)
         sheet = wb["tools"] 
         
         headers = [cell.value for cell in sheet[1]] if sheet.max_row >= 1 else []
@@ -288,54 +180,10 @@ def load_tools_from_excel_util():
     return tools
 
 
-def load_role_permissions_util():
-    """Carrega permissões de papel do arquivo access.xlsx (agora em app_sheets)."""
-    perms = {}
-    try:
-        if not os.path.exists(ACCESS_EXCEL_PATH):
-            QMessageBox.critical(None, "Arquivo Não Encontrado", f"O arquivo de permissões não foi encontrado: {ACCESS_EXCEL_PATH}")
-            return {}
-
-        wb = openpyxl.load_workbook(ACCESS_EXCEL_PATH)
-        sheet = wb["access"] 
-        
-        headers = [cell.value for cell in sheet[1]] if sheet.max_row >= 1 else []
-        header_map = {h: idx for idx, h in enumerate(headers)}
-
-        required_headers = ["role", "allowed_tools"]
-        if not all(h in header_map for h in required_headers):
-            QMessageBox.warning(None, "Cabeçalhos Ausentes", 
-                                f"A planilha 'access' em {ACCESS_EXCEL_PATH} não possui todos os cabeçalhos esperados. "
-                                f"Esperado: {', '.join(required_headers)}")
-            return {}
-
-        for row_idx in range(2, sheet.max_row + 1):
-            row_values = [cell.value for cell in sheet[row_idx]]
-            
-            if all(v is None for v in row_values):
-                continue
-
-            role_name = row_values[header_map["role"]] if "role" in header_map and header_map["role"] < len(row_values) and row_values[header_map["role"]] is not None else None
-            allowed_tools_str = row_values[header_map["allowed_tools"]] if "allowed_tools" in header_map and header_map["allowed_tools"] < len(row_values) and row_values[header_map["allowed_tools"]] is not None else ""
-
-            if role_name:
-                perms[str(role_name)] = [s.strip() for s in allowed_tools_str.split(',')] if allowed_tools_str.strip().lower() != "all" else "all"
-            else:
-                print(f"Aviso: Ignorando linha malformada na planilha 'access' (linha {row_idx}): {row_values}")
-        return perms
-    except KeyError:
-        QMessageBox.critical(None, "Erro de Planilha", f"A planilha 'access' não foi encontrada em {ACCESS_EXCEL_PATH}. Por favor, certifique-se de que o nome da planilha seja 'access'.")
-        return {}
-    except Exception as e:
-        QMessageBox.critical(None, "Erro de Carregamento", f"Erro ao carregar permissões: {e}")
-        return {}
-    return perms
-
-
 def load_workspace_items_from_excel_util():
     """
     Carrega os itens do espaço de trabalho da planilha 'Estrutura' em engenharia.xlsx.
-    Mapeia 'part_number' para 'name' e 'part_type' para 'type'.
+    Mapeia 'part_number' para 'name', 'part_type' para 'type' e 'part_description' (opcional) para 'description'.
     """
     workspace_items = []
     try:
@@ -345,7 +193,7 @@ def load_workspace_items_from_excel_util():
                                 "Por favor, crie-o com uma planilha 'Estrutura' e as colunas 'part_number' e 'part_type'.")
             return []
 
-        wb = openpyxl.load_workbook(ENGENHARIA_EXCEL_PATH) 
+        wb = get_workbook(ENGENHARIA_EXCEL_PATH) 
         sheet_name = "Estrutura" 
         if sheet_name not in wb.sheetnames:
             QMessageBox.warning(None, "Planilha Ausente", 
@@ -373,9 +221,11 @@ def load_workspace_items_from_excel_util():
 
             part_number = row_values[header_map["part_number"]] if "part_number" in header_map and header_map["part_number"] < len(row_values) else None
             part_type = row_values[header_map["part_type"]] if "part_type" in header_map and header_map["part_type"] < len(row_values) else None
+            part_description = row_values[header_map["part_description"]] if "part_description" in header_map and header_map["part_description"] < len(row_values) else None
 
             if part_number is not None and part_type is not None:
-                workspace_items.append({"name": str(part_number), "type": str(part_type)})
+                workspace_items.append({"name": str(part_number), "type": str(part_type),
+                                        "description": "" if part_description is None else str(part_description)})
             else:
                 print(f"Aviso: Ignorando linha malformada na planilha '{sheet_name}' (linha {row_idx}): {row_values}")
 
@@ -395,7 +245,6 @@ class LoginWindow(QWidget):
         super().__init__()
         self.setWindowTitle("5revolution Login")
         self.setGeometry(400, 200, 300, 180) 
-        self.users = load_users_from_excel_util() 
 
         self._init_ui()
 
@@ -436,7 +285,7 @@ class LoginWindow(QWidget):
             QMessageBox.warning(self, "Falha no Login", "Nome de usuário e senha não podem estar vazios.")
             return
 
-        user = self.users.get(uname)
+        user = get_auth_store().get_user(uname) # Reimporta users.xlsx antes, se ele mudou
 
         if not user or not bcrypt.checkpw(pwd.encode(), user["password_hash"].encode()):
             QMessageBox.warning(self, "Falha no Login", "Nome de usuário ou senha inválidos.")
@@ -458,7 +307,6 @@ class LoginWindow(QWidget):
         try:
             register_user(uname, pwd)
             QMessageBox.information(self, "Registrado", f"Usuário '{uname}' registrado com sucesso com o papel 'user'.")
-            self.users = load_users_from_excel_util() 
             self.username_input.clear()
             self.password_input.clear()
         except ValueError as ve:
@@ -472,13 +320,12 @@ class LoginWindow(QWidget):
 class DbHeadersUpdaterTool(QWidget):
     """
     Ferramenta GUI para executar e exibir o resultado do validador de planilhas.
-    Permite que o usuário visualize a saída do script 'sheet_validator_simple.py'
-    diretamente na interface.
+    A validação de 'update_user_sheets_metadata.py' roda no próprio processo, em uma thread do IOService,
+    e sua saída é exibida diretamente na interface.
     """
     def __init__(self, refresh_callback=None): 
         super().__init__()
         self.setWindowTitle("Validador de Consistência de Planilhas")
-        self.script_path = SHEET_VALIDATOR_SCRIPT_PATH # Caminho para o script externo do validador
         self.refresh_callback = refresh_callback 
         self._init_ui()
 
@@ -487,7 +334,7 @@ class DbHeadersUpdaterTool(QWidget):
         layout = QVBoxLayout()
 
         description_label = QLabel(
-            "Esta ferramenta executa o script 'sheet_validator_simple.py', que compara a estrutura real dos "
+            "Esta ferramenta executa a validação de consistência, que compara a estrutura real dos "
             "cabeçalhos de todas as planilhas do sistema com o esquema registrado na 'db_db' em 'db.xlsx'.\n\n"
             "Resultados esperados:\n"
             "- Sucesso: Mensagem indicando que não foram encontradas inconsistências.\n"
@@ -505,51 +352,48 @@ class DbHeadersUpdaterTool(QWidget):
         self.output_text.setPlaceholderText("Aguardando execução da validação... Clique em 'Executar Validação' para iniciar. A saída detalhada do script aparecerá aqui.")
         layout.addWidget(self.output_text)
 
+        # A validação roda em uma thread do IOService: a janela continua respondendo e a validação pode ser cancelada
+        self.io_status = IOStatusBar(self)
+        layout.addWidget(self.io_status)
+
         self.setLayout(layout)
 
     def _run_validation_script(self):
         """
-        Executa o script de validação externa e exibe a saída no QTextEdit.
+        Executa a validação sem bloquear a GUI, exibindo a saída no QTextEdit
+        à medida que ela é produzida.
         """
         self.output_text.clear()
         self.output_text.append("Executando validação... Por favor, aguarde.")
         self.run_button.setEnabled(False) 
+        from app_sheets.tools.update_user_sheets_metadata import run_metadata_action # Importado só quando usado
+        self.io_status.run(run_metadata_action, "validate", message="Validando planilhas...",
+                           on_progress=self._on_validation_output,
+                           on_finished=self._on_validation_finished,
+                           on_failed=self._on_validation_failed,
+                           on_cancelled=self._on_validation_cancelled)
+
+    def _on_validation_output(self, percent, message):
+        self.output_text.append(message.strip())
+
+    def _on_validation_finished(self, result):
+        if result.success:
+            self.output_text.append("\n--- Validação Concluída com Sucesso ---")
+            if self.refresh_callback: 
+                self.refresh_callback()
+        else:
+            self.output_text.append(f"\n--- Validação Concluída com Erros ({len(result.errors)} inconsistência(s)) ---")
+            self.output_text.append("\nPor favor, revise a saída acima para identificar as inconsistências.")
+        self.run_button.setEnabled(True) 
 
-        cmd = [sys.executable, self.script_path, "run"] 
-
-        try:
-            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1)
-            
-            def read_stream(stream, is_stderr=False):
-                for line in stream:
-                    self.output_text.append(f"ERRO: {line.strip()}" if is_stderr else line.strip())
-                    QApplication.processEvents() 
-
-            stdout_thread = threading.Thread(target=read_stream, args=(process.stdout,))
-            stderr_thread = threading.Thread(target=read_stream, args=(process.stderr, True))
-
-            stdout_thread.start()
-            stderr_thread.start()
-
-            stdout_thread.join() 
-            stderr_thread.join()
-
-            process.wait() 
+    def _on_validation_failed(self, error):
+        self.output_text.append(f"ERRO: {error}")
+        self.output_text.append("\n--- Validação Interrompida por um Erro ---")
+        self.run_button.setEnabled(True)
 
-            if process.returncode == 0:
-                self.output_text.append("\n--- Validação Concluída com Sucesso ---")
-                if self.refresh_callback: 
-                    self.refresh_callback()
-            else:
-                self.output_text.append(f"\n--- Validação Concluída com Erros (Código: {process.returncode}) ---")
-                self.output_text.append("\nPor favor, revise a saída acima para identificar as inconsistências.")
-                
-        except FileNotFoundError:
-            self.output_text.append(f"ERRO: O executável Python ou o script '{os.path.basename(self.script_path)}' não foi encontrado. Verifique o PATH ou o caminho do script.")
-        except Exception as e:
-            self.output_text.append(f"ERRO Inesperado ao executar script: {e}")
-        finally:
-            self.run_button.setEnabled(True) 
+    def _on_validation_cancelled(self):
+        self.output_text.append("\n--- Validação Cancelada ---")
+        self.run_button.setEnabled(True)
 
 
 # === CLASSE PRINCIPAL DA GUI ===
@@ -559,7 +403,6 @@ class TeamcenterStyleGUI(QMainWindow):
         self.user_data = user_data
         self.current_user_role = user_data["role"]
 
-        self.users = {}
         self.access_permissions = {}
         self.available_tools_metadata = {}
         self.workspace_items = []
@@ -569,13 +412,31 @@ class TeamcenterStyleGUI(QMainWindow):
         self.setWindowTitle("5revolution ERP")
         self.setGeometry(100, 100, 1200, 800) 
         self._init_ui()
+        # Depois que a janela for exibida, os módulos das ferramentas são importados em segundo plano
+        QTimer.singleShot(0, self._prewarm_tool_modules)
+
+    def _prewarm_tool_modules(self):
+        """Pré-carrega (em uma thread) os módulos das ferramentas que o usuário pode abrir."""
+        allowed_tools = self.access_permissions.get(self.current_user_role, [])
+        modules = [EXCEL_VIEWER_TOOL]
+        for tool_id, tool_info in self.available_tools_metadata.items():
+            if tool_id == "MOD000018" or not tool_info["path"] or not tool_info["class_name"]:
+                continue # Classe interna do gui.py
+            if allowed_tools == "all" or tool_id in allowed_tools or tool_id == "MOD000019":
+                modules.append((tool_info["path"], tool_info["class_name"]))
+        prewarm_tool_modules(modules)
 
     def _load_all_configuration_data(self):
-        """Carrega todos os dados de configuração dos arquivos Excel."""
-        self.users = load_users_from_excel_util()
-        self.access_permissions = load_role_permissions_util()
-        self.available_tools_metadata = load_tools_from_excel_util()
-        self.workspace_items = load_workspace_items_from_excel_util()
+        """
+        Carrega todos os dados de configuração dos arquivos Excel e as permissões do banco de autenticação.
+        Usa o snapshot compilado (config_snapshot.pickle): só as planilhas alteradas desde a última
+        compilação são relidas com o openpyxl.
+        """
+        self.access_permissions = get_auth_store().get_role_permissions()
+        snapshot = get_config_snapshot()
+        self.available_tools_metadata = snapshot.get("tools", TOOLS_EXCEL_PATH, load_tools_from_excel_util)
+        self.workspace_items = snapshot.get("workspace_items", ENGENHARIA_EXCEL_PATH, load_workspace_items_from_excel_util)
+        snapshot.save()
         print("Dados de configuração carregados/recarregados.")
 
     def _refresh_gui_data(self):
@@ -645,7 +506,7 @@ class TeamcenterStyleGUI(QMainWindow):
             
             create_update_sheets_action = QAction("Criar/Reinicializar/atualizar planilhas", self)
             create_update_sheets_action.setToolTip(
-                "Executa o script 'update_user_sheets_metadata.py' com a ação 'create_or_update_sheets'.\n"
+                "Executa a ação 'create_or_update_sheets' de 'update_user_sheets_metadata.py' (sem bloquear a interface).\n"
                 "Função: Cria novas planilhas ou atualiza as existentes com os cabeçalhos definidos na 'db_db' em 'db.xlsx'.\n"
                 "Importante: Preserva os dados existentes a partir da segunda linha (dados do app), apenas ajustando a estrutura de cabeçalhos e excluindo linhas totalmente vazias abaixo da 2ª linha."
             )
@@ -654,7 +515,7 @@ class TeamcenterStyleGUI(QMainWindow):
 
             sync_db_schema_action = QAction("Sincronizar 'db_db' com Estrutura Real das Planilhas", self)
             sync_db_schema_action.setToolTip(
-                "Executa o script 'update_user_sheets_metadata.py' com a ação 'update_db_schema'.\n"
+                "Executa a ação 'update_db_schema' de 'update_user_sheets_metadata.py' (sem bloquear a interface).\n"
                 "Função: Coleta os cabeçalhos de *todas* as planilhas Excel do projeto (em 'user_sheets' e 'app_sheets', excluindo o próprio 'db.xlsx').\n"
                 "Resultado: Registra essa estrutura real na planilha 'db_db' em 'db.xlsx', servindo como a 'fonte da verdade' para validações futuras."
             )
@@ -663,7 +524,7 @@ class TeamcenterStyleGUI(QMainWindow):
 
             validate_db_consistency_action = QAction("Abrir Validador de Consistência de Planilhas (GUI)", self)
             validate_db_consistency_action.setToolTip(
-                "Abre uma interface gráfica dedicada para executar o 'sheet_validator_simple.py'.\n"
+                "Abre uma interface gráfica dedicada para executar a validação de consistência.\n"
                 "Função: Compara os cabeçalhos de todas as planilhas do projeto com o esquema registrado na 'db_db' em 'db.xlsx'.\n"
                 "Saída: Mostra detalhadamente na interface quais planilhas e cabeçalhos apresentam inconsistências, ou uma mensagem de sucesso."
             )
@@ -686,7 +547,7 @@ class TeamcenterStyleGUI(QMainWindow):
     def _populate_tools_menu(self, menu):
         """
         Popula o menu de ferramentas com base nas permissões do usuário e nos metadados das ferramentas.
-        Utiliza 'allowed_tools' do access.xlsx diretamente.
+        Utiliza 'allowed_tools' dos papéis do banco de autenticação (importados de access.xlsx).
         """
         menu.clear() 
         user_allowed_tools_list = self.access_permissions.get(self.current_user_role, [])
@@ -721,13 +582,11 @@ class TeamcenterStyleGUI(QMainWindow):
         class_name = tool_info["class_name"] 
 
         ToolClass = None # Inicializa ToolClass
-        # Casos especiais que não dependem diretamente de module_path + class_name de tools.xlsx
-        if tool_id == "MOD000019": # ToolsLineGeneratorTool (app_sheets.tools.tools_line_generator)
-            ToolClass = ToolsLineGeneratorTool
-        elif tool_id == "MOD000018": # DbHeadersUpdaterTool (classe interna do gui.py)
+        # Caso especial que não depende de module_path + class_name de tools.xlsx
+        if tool_id == "MOD000018": # DbHeadersUpdaterTool (classe interna do gui.py)
             ToolClass = DbHeadersUpdaterTool
         else:
-            # Importação dinâmica da classe da ferramenta
+            # Importação dinâmica da classe da ferramenta (o módulo é importado só na primeira abertura)
             try:
                 # Adiciona o diretório base ao sys.path temporariamente se não for um módulo de nível superior
                 if module_path.startswith("ui.tools"):
@@ -740,8 +599,7 @@ class TeamcenterStyleGUI(QMainWindow):
                 if base_module_dir not in sys.path:
                     sys.path.insert(0, base_module_dir) # Garante que o diretório base do módulo esteja no sys.path
                     
-                module = importlib.import_module(module_path)
-                ToolClass = getattr(module, class_name)
+                ToolClass = load_tool_class(module_path, class_name)
             except ImportError as e:
                 QMessageBox.critical(self, "Erro de Importação", 
                                      f"Não foi possível importar o módulo '{module_path}' para a ferramenta '{tool_name}'. Verifique 'module_path' em tools.xlsx e a existência do arquivo. Erro: {e}")
@@ -827,6 +685,7 @@ class TeamcenterStyleGUI(QMainWindow):
         self.tree_widget.itemDoubleClicked.connect(self._on_tree_item_double_clicked)
         
         self.search_bar_widget = SearchBarWidget(self.tree_widget)
+        self.search_bar_widget.open_file_requested.connect(self._open_excel_file_in_viewer)
         tree_view_layout.addWidget(self.search_bar_widget)
         tree_view_layout.addWidget(self.tree_widget)
         
@@ -836,7 +695,15 @@ class TeamcenterStyleGUI(QMainWindow):
         self.mini_console_widget = MiniConsoleWidget()
         # Opcional: conectar o sinal de comando para uma função no GUI principal
         self.mini_console_widget.command_entered.connect(self._handle_console_command)
-        left_splitter.addWidget(self.mini_console_widget)
+
+        console_container = QWidget()
+        console_layout = QVBoxLayout(console_container)
+        console_layout.setContentsMargins(0, 0, 0, 0)
+        console_layout.addWidget(self.mini_console_widget)
+        # Ações de metadados (menu Admin) rodam no próprio processo, em uma thread do IOService
+        self.metadata_status = IOStatusBar(console_container)
+        console_layout.addWidget(self.metadata_status)
+        left_splitter.addWidget(console_container)
 
         # Define tamanhos iniciais para o splitter esquerdo (árvore e console)
         # Ex: 70% para a árvore, 30% para o console
@@ -862,6 +729,8 @@ class TeamcenterStyleGUI(QMainWindow):
 
     def _populate_workspace_tree(self):
         """Popula a seção 'Espaço de Trabalho' da árvore lendo de engenharia.xlsx."""
+        # Os itens serão recriados: o índice da busca é remontado a partir dos novos itens
+        self.search_bar_widget.invalidate_index()
         workspace_root_item = None
         for i in range(self.tree_widget.topLevelItemCount()):
             item = self.tree_widget.topLevelItem(i)
@@ -881,6 +750,9 @@ class TeamcenterStyleGUI(QMainWindow):
         for item_data in self.workspace_items: 
             new_item = QTreeWidgetItem(workspace_root_item, [item_data["name"], item_data["type"]])
             new_item.setHidden(False) 
+            if item_data.get("description"):
+                new_item.setData(0, WORKSPACE_DESCRIPTION_ROLE, item_data["description"])
+                new_item.setToolTip(0, item_data["description"])
             
         self._sort_top_level_items()
 
@@ -903,6 +775,8 @@ class TeamcenterStyleGUI(QMainWindow):
 
         self._add_files_to_tree(USER_SHEETS_DIR, user_files_root)
         self._add_files_to_tree(APP_SHEETS_DIR, app_files_root)
+        # Atualiza em segundo plano o índice da busca global (só arquivos novos ou alterados são relidos)
+        self.search_bar_widget.refresh_global_index()
         
         self._sort_top_level_items()
 
@@ -927,19 +801,13 @@ class TeamcenterStyleGUI(QMainWindow):
     def _add_files_to_tree(self, directory, parent_item):
         """Adiciona arquivos .xlsx e subdiretórios de um diretório à árvore."""
         try:
-            for filename in os.listdir(directory):
-                if filename.startswith('~$'): 
-                    continue
-
-                if os.path.basename(directory) == "user_sheets" and filename.lower() == "db.xlsx":
-                    continue
-                
-                file_path = os.path.join(directory, filename)
-                if os.path.isdir(file_path):
+            # Mesma varredura usada pela busca global nas planilhas
+            for filename, file_path, is_dir in list_directory_entries(directory):
+                if is_dir:
                     folder_item = QTreeWidgetItem(parent_item, [filename, "Pasta"])
                     folder_item.setExpanded(True)
                     self._add_files_to_tree(file_path, folder_item) 
-                elif filename.endswith(".xlsx"): 
+                else: 
                     file_info = QFileInfo(file_path)
                     item = QTreeWidgetItem(parent_item, [file_info.fileName(), "Arquivo Excel"])
                     item.setData(0, Qt.UserRole, file_path) 
@@ -966,7 +834,7 @@ class TeamcenterStyleGUI(QMainWindow):
                 return
 
         try:
-            excel_viewer_tool = ExcelViewerTool(file_path=file_path)
+            excel_viewer_tool = load_tool_class(*EXCEL_VIEWER_TOOL)(file_path=file_path)
             self.central_widget.addTab(excel_viewer_tool, tool_name)
             self.central_widget.setCurrentWidget(excel_viewer_tool)
         except Exception as e:
@@ -976,85 +844,75 @@ class TeamcenterStyleGUI(QMainWindow):
     def _handle_console_command(self, command: str):
         """
         Processa comandos recebidos do mini-console.
-        Aqui você pode adicionar lógica para interpretar e executar comandos.
-        Por enquanto, apenas ecoa a entrada.
+        Comandos disponíveis:
+            buscar <termo>  - procura o termo em todas as planilhas de user_sheets e app_sheets
+            ajuda           - lista os comandos
         """
-        self.mini_console_widget.append_output(f"Comando recebido: '{command}' (Lógica de execução a ser implementada)")
-        # Exemplo: Se você quisesse executar código Python diretamente (CUIDADO com segurança!)
-        # try:
-        #     exec(command, globals(), locals())
-        # except Exception as e:
-        #     self.mini_console_widget.append_output(f"Erro ao executar: {e}")
-
-    # --- FUNÇÕES PARA EXECUTAR SCRIPTS EXTERNOS (USADAS PELO MENU ADMIN) ---
-    def _run_external_python_script(self, script_path, action, *args):
+        name, _, argument = command.partition(" ")
+        name = name.lower()
+        argument = argument.strip()
+        if name == "buscar":
+            if not argument:
+                self.mini_console_widget.append_output("Uso: buscar <termo>")
+                return
+            self.mini_console_widget.append_output(f"Buscando '{argument}' em todas as planilhas...")
+            self.search_bar_widget.run_global_search(
+                argument, on_finished=lambda result, term=argument: self._print_global_search_results(term, result))
+        elif name == "ajuda":
+            self.mini_console_widget.append_output("Comandos: buscar <termo> | ajuda")
+        else:
+            self.mini_console_widget.append_output(f"Comando desconhecido: '{name}'. Digite 'ajuda' para ver os comandos.")
+
+    def _print_global_search_results(self, term, result, max_lines=20):
+        """Escreve no mini-console os primeiros resultados de uma busca global."""
+        total, results = result
+        if not total:
+            self.mini_console_widget.append_output(f"Nenhuma célula encontrada para '{term}'.")
+            return
+        self.mini_console_widget.append_output(f"{total} célula(s) encontrada(s) para '{term}':")
+        for found in results[:max_lines]:
+            header = f" [{found['header']}]" if found["header"] else ""
+            self.mini_console_widget.append_output(
+                f"  {found['relative_path']} > {found['sheet']} > linha {found['row']}, coluna {found['column']}{header}: {found['value']}")
+        if total > max_lines:
+            self.mini_console_widget.append_output(f"  ... e mais {total - max_lines}. Use '{GLOBAL_SEARCH_PREFIX} {term}' na barra de busca para ver todas.")
+
+    # --- AÇÕES DE METADADOS (update_user_sheets_metadata.py) EXECUTADAS NO PRÓPRIO PROCESSO ---
+    def _run_metadata_action(self, action):
         """
-        Executa um script Python externo em um processo separado com uma ação específica.
-        Exibe uma caixa de mensagem com o resultado e envia a saída para o mini-console.
+        Executa uma ação de update_user_sheets_metadata.py em uma thread do IOService, sem iniciar outro
+        interpretador: os workbooks já abertos pelas ferramentas são reaproveitados pelo cache compartilhado.
+        As mensagens vão para o mini-console enquanto a ação executa; ao final, exibe uma caixa de mensagem com o resultado.
         """
-        cmd = [sys.executable, script_path, action] + list(args)
-        
-        self.mini_console_widget.append_output(f"Executando script: {os.path.basename(script_path)} {action}...")
-        self.mini_console_widget.append_output("Aguarde a saída...")
-
-        try:
-            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1)
-            
-            def read_stream(stream, is_stderr=False):
-                for line in stream:
-                    output_line = f"ERRO SCRIPT: {line.strip()}" if is_stderr else line.strip()
-                    self.mini_console_widget.append_output(output_line)
-                    QApplication.processEvents() 
-
-            stdout_thread = threading.Thread(target=read_stream, args=(process.stdout,))
-            stderr_thread = threading.Thread(target=read_stream, args=(process.stderr, True))
-
-            stdout_thread.start()
-            stderr_thread.start()
-
-            stdout_thread.join() 
-            stderr_thread.join()
-
-            process.wait() 
-
-            if process.returncode == 0:
-                self.mini_console_widget.append_output(f"\n--- Script '{os.path.basename(script_path)}' Concluído com Sucesso ---")
-                QMessageBox.information(self, "Sucesso na Execução do Script", f"Script '{os.path.basename(script_path)}' executado com sucesso.")
-                self._refresh_gui_data() 
-            else:
-                self.mini_console_widget.append_output(f"\n--- Script '{os.path.basename(script_path)}' Concluído com Erros (Código: {process.returncode}) ---")
-                self.mini_console_widget.append_output("Por favor, revise a saída do console para detalhes.")
-                QMessageBox.critical(self, "Erro na Execução do Script", f"O script '{os.path.basename(script_path)}' retornou um erro. Veja o console para detalhes.")
-                
-        except FileNotFoundError:
-            err_msg = f"ERRO: O executável Python ou o script '{os.path.basename(script_path)}' não foi encontrado. Verifique o PATH ou o caminho do script."
-            self.mini_console_widget.append_output(err_msg)
-            QMessageBox.critical(self, "Erro de Arquivo", err_msg)
-        except subprocess.CalledProcessError as e:
-            err_msg = f"ERRO no Processo para '{os.path.basename(script_path)}':\nstdout: {e.stdout}\nstderr: {e.stderr}"
-            self.mini_console_widget.append_output(err_msg)
-            QMessageBox.critical(self, "Erro no Processo", err_msg)
-        except Exception as e:
-            err_msg = f"ERRO Inesperado ao tentar executar o script '{os.path.basename(script_path)}': {e}"
-            self.mini_console_widget.append_output(err_msg)
-            QMessageBox.critical(self, "Erro Inesperado", err_msg)
-        finally:
-            self.mini_console_widget.append_output("\n--- Execução de script finalizada ---")
+        from app_sheets.tools.update_user_sheets_metadata import run_metadata_action # Importado só quando usado
+        self.mini_console_widget.append_output(f"Executando: {action}...")
+        self.metadata_status.run(run_metadata_action, action, message=f"Executando '{action}'...", replaceable=False,
+                                 on_progress=lambda percent, message: self.mini_console_widget.append_output(message.strip()),
+                                 on_finished=self._on_metadata_action_finished,
+                                 on_failed=lambda error, name=action: self._on_metadata_action_failed(name, error),
+                                 on_cancelled=lambda name=action: self.mini_console_widget.append_output(f"\n--- Ação '{name}' Cancelada ---"))
+
+    def _on_metadata_action_finished(self, result):
+        if result.success:
+            self.mini_console_widget.append_output(f"\n--- Ação '{result.action}' Concluída com Sucesso ---")
+            QMessageBox.information(self, "Sucesso na Execução", f"Ação '{result.action}' executada com sucesso.")
+            self._refresh_gui_data() 
+        else:
+            self.mini_console_widget.append_output(f"\n--- Ação '{result.action}' Concluída com Erros ({len(result.errors)}) ---")
+            self.mini_console_widget.append_output("Por favor, revise a saída do console para detalhes.")
+            QMessageBox.critical(self, "Erro na Execução", f"A ação '{result.action}' retornou erros. Veja o console para detalhes.")
 
+    def _on_metadata_action_failed(self, action, error):
+        self.mini_console_widget.append_output(f"ERRO: {error}")
+        QMessageBox.critical(self, "Erro na Execução", f"A ação '{action}' foi interrompida por um erro: {error}")
 
     def _run_create_or_update_all_sheets(self):
-        """Executa o script para criar/atualizar todas as planilhas definidas no db_db."""
-        if not os.path.exists(UPDATE_METADATA_SCRIPT_PATH): 
-            QMessageBox.critical(self, "Erro", f"O script de atualização de metadados não foi encontrado em: {UPDATE_METADATA_SCRIPT_PATH}")
-            return
-        self._run_external_python_script(UPDATE_METADATA_SCRIPT_PATH, "create_or_update_sheets")
+        """Cria/atualiza todas as planilhas definidas no db_db."""
+        self._run_metadata_action("create_or_update_sheets")
 
     def _run_sync_db_db_schema(self):
-        """Executa o script para sincronizar o schema db_db com os cabeçalhos reais dos arquivos."""
-        if not os.path.exists(UPDATE_METADATA_SCRIPT_PATH):
-            QMessageBox.critical(self, "Erro", f"O script de atualização de metadados não foi encontrado em: {UPDATE_METADATA_SCRIPT_PATH}")
-            return
-        self._run_external_python_script(UPDATE_METADATA_SCRIPT_PATH, "update_db_schema")
+        """Sincroniza o schema db_db com os cabeçalhos reais dos arquivos."""
+        self._run_metadata_action("update_db_schema")
 
     def _run_validate_db_consistency(self):
         """
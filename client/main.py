@@ -8,17 +8,28 @@ import openpyxl
 import bcrypt
 from datetime import datetime, timedelta
 
+import asyncio
+import hashlib
 import os
 import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 # Define o caminho para a raiz do projeto (assumindo main.py está em client/)
 current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from backend.auth_store import get_auth_store, AUTH_DB_PATH, USERS_EXCEL_PATH, ACCESS_EXCEL_PATH
 
 # === Config ===
 SECRET_KEY = "plm_secret" # Mantenha esta chave segura e idealmente em variáveis de ambiente
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
+# Tokens já decodificados mantidos em memória (chave: hash do token)
+TOKEN_CACHE_SIZE = 256
 
 # === Init App ===
 app = FastAPI()
@@ -27,101 +38,146 @@ templates = Jinja2Templates(directory=os.path.join(project_root, "templates"))
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 
 # === In-memory sheet-driven DB ===
-users_db = {}
-modules_db = {} # REVERTIDO: De tools_db para modules_db
-permissions_db = {} # REVERTIDO: De access_db para permissions_db
+# Intervalo (segundos) entre as verificações de alteração das planilhas pelo watcher
+SHEETS_WATCH_INTERVAL_SECONDS = 2.0
+# Intervalo máximo entre novas tentativas enquanto nenhuma leitura completa deu certo
+SHEETS_RETRY_MAX_INTERVAL_SECONDS = 60.0
 
-def load_sheets():
+APP_SHEETS_DIR = os.path.join(project_root, "app_sheets")
+MAIN_EXCEL_PATH = os.path.join(APP_SHEETS_DIR, "main.xlsx")
+
+
+def _file_stamp(file_path):
+    """(tamanho, mtime em ns) do arquivo, ou None se ele não existir."""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+class SheetsSnapshot:
     """
-    Carrega os dados das planilhas para o banco de dados em memória do backend.
-    Agora usa modules.xlsx e permissions.xlsx, conforme main.xlsx.
+    Cópia completa e imutável dos dados do backend (usuários, módulos e permissões).
+    Um reload monta um snapshot novo e o publica trocando uma única referência ('sheets_snapshot'),
+    então cada request vê sempre um conjunto coerente: ou todo o snapshot antigo, ou todo o novo.
+    'sources' guarda o carimbo (tamanho, mtime) de cada planilha lida, usado pelo watcher.
+    A lista de módulos visíveis de cada papel é montada uma vez aqui e descartada junto com o snapshot.
     """
-    global users_db, modules_db, permissions_db
+    def __init__(self, users=None, modules=None, permissions=None, sources=None):
+        self.users = users or {}
+        self.modules = modules or {}
+        self.permissions = permissions or {}
+        self.sources = sources or {}
+        self.visible_modules_by_role = {role: self._build_visible_modules(allowed) for role, allowed in self.permissions.items()}
+
+    def _build_visible_modules(self, allowed_modules):
+        if allowed_modules == "all":
+            return list(self.modules.values())
+        return [self.modules[mid] for mid in allowed_modules if mid in self.modules]
+
+    def visible_modules(self, role):
+        """Módulos visíveis para o papel (lista pré-calculada; não deve ser alterada)."""
+        return self.visible_modules_by_role.get(role, [])
+
+    def current_stamps(self):
+        """Carimbos atuais das planilhas de origem; diferem de 'sources' se alguma mudou desde a leitura."""
+        return {path: _file_stamp(path) for path in self.sources}
+
 
-    # Caminhos relativos à raiz do projeto para consistência
-    APP_SHEETS_DIR = os.path.join(project_root, "app_sheets")
-    MAIN_EXCEL_PATH = os.path.join(APP_SHEETS_DIR, "main.xlsx")
+sheets_snapshot = SheetsSnapshot() # Trocado por inteiro a cada reload; nunca alterado no lugar
+
+# Um único worker: reloads nunca rodam em paralelo e a leitura (openpyxl) fica fora do event loop
+_sheets_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="load-sheets")
+_reload_lock = asyncio.Lock()
+_watch_task = None
+
+
+def _read_sheet(file_path, sheet_name):
+    """Lê (somente leitura) uma planilha e retorna (header_map, [(número da linha, valores)]) sem linhas vazias."""
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = wb[sheet_name]
+        rows = sheet.iter_rows(values_only=True)
+        headers = list(next(rows, None) or ())
+        header_map = {h: idx for idx, h in enumerate(headers)}
+        data = []
+        for row_idx, row_values in enumerate(rows, start=2):
+            if all(v is None for v in row_values): # Ignora linhas completamente vazias
+                continue
+            data.append((row_idx, list(row_values)))
+    finally:
+        wb.close()
+    return header_map, data
+
+
+def _cell(row_values, header_map, header, default=None):
+    idx = header_map.get(header)
+    return row_values[idx] if idx is not None and idx < len(row_values) else default
+
+
+def load_sheets():
+    """
+    Lê as planilhas do backend e retorna um SheetsSnapshot novo (não altera o snapshot em uso).
+    Os usuários vêm do banco de autenticação compartilhado com a GUI e o servidor web (que reimporta
+    users.xlsx quando ele muda); módulos e permissões vêm de modules.xlsx e permissions.xlsx, conforme main.xlsx.
+    Retorna None se a leitura falhar; nesse caso o snapshot atual continua valendo.
+    Executada fora do event loop por reload_sheets().
+    """
+    users_db = {}
+    modules_db = {}
+    permissions_db = {}
+    sources = {MAIN_EXCEL_PATH: _file_stamp(MAIN_EXCEL_PATH)}
+    modules_excel_name = permissions_excel_name = None
 
     try:
         # Carrega o main.xlsx para obter as referências de arquivos
         if not os.path.exists(MAIN_EXCEL_PATH):
             print(f"Erro: Arquivo main.xlsx não encontrado em {MAIN_EXCEL_PATH}")
-            return # Ou levante uma exceção, dependendo da criticidade
+            return None
 
-        wb_main = openpyxl.load_workbook(MAIN_EXCEL_PATH)
-        if "refs" not in wb_main.sheetnames:
+        try:
+            _, refs_rows = _read_sheet(MAIN_EXCEL_PATH, "refs")
+        except KeyError:
             print(f"Erro: Planilha 'refs' não encontrada em {MAIN_EXCEL_PATH}")
-            return
+            return None
 
-        refs_sheet = wb_main["refs"]
         refs = {}
-        for row_idx in range(2, refs_sheet.max_row + 1):
-            row_values = [cell.value for cell in refs_sheet[row_idx]]
+        for row_idx, row_values in refs_rows:
             if len(row_values) >= 2 and row_values[0] is not None and row_values[1] is not None:
                 refs[str(row_values[1])] = str(row_values[0])
             else:
-                if not all(v is None for v in row_values): # Only warn for non-empty malformed rows
-                    print(f"Aviso: Ignorando linha malformada na planilha 'refs' (linha {row_idx}): {row_values}")
-
-
-        # Carrega users.xlsx
-        users_excel_name = refs.get("users")
-        if users_excel_name:
-            wb_users = openpyxl.load_workbook(os.path.join(APP_SHEETS_DIR, users_excel_name))
-            sheet = wb_users["users"]
-            users_db = {}
-            # Assume cabeçalhos na primeira linha
-            headers = [cell.value for cell in sheet[1]] if sheet.max_row >= 1 else []
-            header_map = {h: idx for idx, h in enumerate(headers)}
-            
-            required_user_headers = ["username", "password_hash", "role"]
-            if not all(h in header_map for h in required_user_headers):
-                print(f"Aviso: Cabeçalhos esperados ausentes na planilha 'users' de {users_excel_name}. Esperado: {required_user_headers}")
-
-            for row_idx in range(2, sheet.max_row + 1):
-                row_values = [cell.value for cell in sheet[row_idx]]
-                if all(v is None for v in row_values): # Ignora linhas completamente vazias
-                    continue
-
-                username = row_values[header_map.get("username")] if "username" in header_map and header_map["username"] < len(row_values) else None
-                password_hash = row_values[header_map.get("password_hash")] if "password_hash" in header_map and header_map["password_hash"] < len(row_values) else None
-                role = row_values[header_map.get("role")] if "role" in header_map and header_map["role"] < len(row_values) else "user" # Define 'user' como padrão se a role for None
-
-                if username and password_hash:
-                    users_db[str(username)] = {
-                        "username": str(username),
-                        "password_hash": str(password_hash),
-                        "role": str(role),
-                    }
-                else:
-                    print(f"Aviso: Ignorando linha vazia ou malformada em {users_excel_name} (planilha 'users', linha {row_idx}): {row_values}")
-            print(f"Carregados {len(users_db)} usuários de {users_excel_name}.")
-        else:
-            print("Aviso: 'users' não referenciado em main.xlsx.")
+                print(f"Aviso: Ignorando linha malformada na planilha 'refs' (linha {row_idx}): {row_values}")
+
+        # Carrega os usuários do banco de autenticação. A entrada 'users' de main.xlsx não é mais lida:
+        # users.xlsx (e access.xlsx) são importados pelo próprio banco sempre que mudam, e os carimbos dos
+        # três arquivos entram em 'sources' para que o watcher recarregue após edições ou cadastros.
+        auth_store = get_auth_store()
+        for path in (USERS_EXCEL_PATH, ACCESS_EXCEL_PATH, AUTH_DB_PATH):
+            sources[path] = _file_stamp(path)
+        for username, user in auth_store.get_users().items():
+            users_db[username] = {
+                "username": username,
+                "password_hash": str(user["password_hash"]),
+                "role": str(user["role"] or "user"),
+            }
+        print(f"Carregados {len(users_db)} usuários do banco de autenticação.")
 
         # Carrega modules.xlsx (REVERTIDO)
         modules_excel_name = refs.get("modules") # Referência a 'modules' em main.xlsx
         if modules_excel_name:
-            wb_modules = openpyxl.load_workbook(os.path.join(APP_SHEETS_DIR, modules_excel_name))
-            sheet = wb_modules["modules"] # Assume a planilha 'modules'
-            modules_db = {}
-            # Mapeia cabeçalhos
-            headers = [cell.value for cell in sheet[1]] if sheet.max_row >= 1 else []
-            header_map = {h: idx for idx, h in enumerate(headers)}
-            
+            modules_path = os.path.join(APP_SHEETS_DIR, modules_excel_name)
+            sources[modules_path] = _file_stamp(modules_path)
+            header_map, rows = _read_sheet(modules_path, "modules") # Assume a planilha 'modules'
+
             required_module_headers = ["id", "name", "description"] # Assumindo estes cabeçalhos em modules.xlsx
             if not all(h in header_map for h in required_module_headers):
                 print(f"Aviso: Cabeçalhos esperados ausentes na planilha 'modules' de {modules_excel_name}. Esperado: {required_module_headers}")
-            
-            for row_idx in range(2, sheet.max_row + 1):
-                row_values = [cell.value for cell in sheet[row_idx]]
-
-                if all(v is None for v in row_values): # Ignora linhas completamente vazias
-                    continue
 
-                mod_id = row_values[header_map.get("id")] if "id" in header_map and header_map["id"] < len(row_values) else None
-                mod_name = row_values[header_map.get("name")] if "name" in header_map and header_map["name"] < len(row_values) else None
-                mod_description = row_values[header_map.get("description")] if "description" in header_map and header_map["description"] < len(row_values) else ""
+            for row_idx, row_values in rows:
+                mod_id = _cell(row_values, header_map, "id")
+                mod_name = _cell(row_values, header_map, "name")
+                mod_description = _cell(row_values, header_map, "description", "")
 
                 if mod_id and mod_name:
                     modules_db[str(mod_id)] = {
@@ -138,25 +194,17 @@ def load_sheets():
         # Carrega permissions.xlsx (REVERTIDO)
         permissions_excel_name = refs.get("permissions") # Referência a 'permissions' em main.xlsx
         if permissions_excel_name:
-            wb_perms = openpyxl.load_workbook(os.path.join(APP_SHEETS_DIR, permissions_excel_name))
-            sheet = wb_perms["permissions"] # Assume a planilha 'permissions'
-            permissions_db = {}
-            # Mapeia cabeçalhos
-            headers = [cell.value for cell in sheet[1]] if sheet.max_row >= 1 else []
-            header_map = {h: idx for idx, h in enumerate(headers)}
+            permissions_path = os.path.join(APP_SHEETS_DIR, permissions_excel_name)
+            sources[permissions_path] = _file_stamp(permissions_path)
+            header_map, rows = _read_sheet(permissions_path, "permissions") # Assume a planilha 'permissions'
 
             required_perm_headers = ["role", "allowed_modules"] # Assumindo estes cabeçalhos em permissions.xlsx
             if not all(h in header_map for h in required_perm_headers):
                 print(f"Aviso: Cabeçalhos esperados ausentes na planilha 'permissions' de {permissions_excel_name}. Esperado: {required_perm_headers}")
 
-            for row_idx in range(2, sheet.max_row + 1):
-                row_values = [cell.value for cell in sheet[row_idx]]
-                
-                if all(v is None for v in row_values): # Ignora linhas completamente vazias
-                    continue
-
-                role_name = row_values[header_map.get("role")] if "role" in header_map and header_map["role"] < len(row_values) else None
-                allowed_modules_str = row_values[header_map.get("allowed_modules")] if "allowed_modules" in header_map and header_map["allowed_modules"] < len(row_values) else ""
+            for row_idx, row_values in rows:
+                role_name = _cell(row_values, header_map, "role")
+                allowed_modules_str = _cell(row_values, header_map, "allowed_modules", "")
 
                 if role_name:
                     # Trata "all" ou lista de IDs separados por vírgula
@@ -168,15 +216,64 @@ def load_sheets():
             print("Aviso: 'permissions' não referenciado em main.xlsx.")
 
     except FileNotFoundError as e:
-        print(f"Erro: Um dos arquivos Excel não foi encontrado. Verifique se {MAIN_EXCEL_PATH}, {os.path.join(APP_SHEETS_DIR, users_excel_name or 'users.xlsx')}, {os.path.join(APP_SHEETS_DIR, modules_excel_name or 'modules.xlsx')} e {os.path.join(APP_SHEETS_DIR, permissions_excel_name or 'permissions.xlsx')} existem e estão acessíveis: {e}")
+        print(f"Erro: Um dos arquivos Excel não foi encontrado. Verifique se {MAIN_EXCEL_PATH}, {os.path.join(APP_SHEETS_DIR, modules_excel_name or 'modules.xlsx')} e {os.path.join(APP_SHEETS_DIR, permissions_excel_name or 'permissions.xlsx')} existem e estão acessíveis: {e}")
+        return None
     except KeyError as e:
         print(f"Erro: Planilha ou cabeçalho esperado não encontrado ao carregar. Verifique os nomes das planilhas e cabeçalhos. Detalhes: {e}")
+        return None
     except Exception as e:
         print(f"Erro inesperado ao carregar planilhas: {e}")
+        return None
+
+    return SheetsSnapshot(users_db, modules_db, permissions_db, sources)
+
+
+async def reload_sheets():
+    """
+    Lê as planilhas em uma thread e publica o snapshot novo de uma só vez.
+    Os requests continuam sendo atendidos com o snapshot atual durante a leitura.
+    Retorna True se o snapshot foi trocado.
+    """
+    global sheets_snapshot
+    async with _reload_lock: # Reloads simultâneos (admin + watcher) são serializados
+        new_snapshot = await asyncio.get_running_loop().run_in_executor(_sheets_executor, load_sheets)
+        if new_snapshot is None:
+            return False
+        sheets_snapshot = new_snapshot
+        return True
+
+
+async def watch_sheets(interval=SHEETS_WATCH_INTERVAL_SECONDS):
+    """
+    Verifica periodicamente o tamanho/mtime das planilhas do snapshot e recarrega quando alguma muda.
+    Se o reload falhar (ex: planilha salva pela metade), o snapshot atual é mantido e só se tenta
+    de novo quando os arquivos mudarem outra vez.
+    Enquanto nenhuma leitura tiver dado certo (ex: falha no startup), não há carimbos para comparar:
+    o reload é tentado de novo periodicamente, com intervalo crescente até SHEETS_RETRY_MAX_INTERVAL_SECONDS.
+    """
+    loop = asyncio.get_running_loop()
+    failed_stamps = None
+    retry_delay = interval
+    while True:
+        await asyncio.sleep(interval if sheets_snapshot.sources else retry_delay)
+        try:
+            snapshot = sheets_snapshot
+            if not snapshot.sources:
+                if await reload_sheets():
+                    retry_delay = interval
+                else:
+                    retry_delay = min(retry_delay * 2, SHEETS_RETRY_MAX_INTERVAL_SECONDS)
+                continue
+            stamps = await loop.run_in_executor(None, snapshot.current_stamps)
+            if stamps != snapshot.sources and stamps != failed_stamps:
+                print("Planilhas do backend alteradas; recarregando...")
+                failed_stamps = None if await reload_sheets() else stamps
+        except Exception as e:
+            print(f"Erro ao verificar alterações nas planilhas: {e}")
 
 # === Auth ===
 def authenticate_user(username, password):
-    user = users_db.get(username)
+    user = sheets_snapshot.users.get(username)
     if not user:
         return None
     # Use bcrypt.checkpw para verificar a senha
@@ -190,13 +287,36 @@ def create_token(data: dict):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+# Hash do token -> (username, expiração em epoch). Só guarda tokens válidos; o usuário continua
+# sendo buscado no snapshot atual, então um usuário removido perde o acesso no próximo reload.
+_token_cache = OrderedDict()
+
+
+def decode_token_username(token):
+    """Username ('sub') de um token válido, usando o cache de tokens já verificados. Lança JWTError se inválido."""
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    cached = _token_cache.get(key)
+    if cached is not None:
+        username, expires_at = cached
+        if expires_at is None or time.time() < expires_at:
+            _token_cache.move_to_end(key)
+            return username
+        del _token_cache[key] # Expirado: o jwt.decode abaixo rejeita o token
+
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    username = payload.get("sub")
+    if username is not None:
+        _token_cache[key] = (username, payload.get("exp"))
+        while len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+    return username
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
+        username: str = decode_token_username(token)
         if username is None:
             raise HTTPException(status_code=401, detail="Credenciais inválidas")
-        user = users_db.get(username)
+        user = sheets_snapshot.users.get(username)
         if user is None:
             raise HTTPException(status_code=401, detail="Usuário não encontrado")
         return user
@@ -205,8 +325,16 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
 
 # === Routes ===
 @app.on_event("startup")
-def startup_event():
-    load_sheets()
+async def startup_event():
+    global _watch_task
+    await reload_sheets()
+    _watch_task = asyncio.create_task(watch_sheets())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if _watch_task is not None:
+        _watch_task.cancel()
+    _sheets_executor.shutdown(wait=False)
 
 @app.get("/login", response_class=HTMLResponse)
 def login_page(request: Request, error: str = None):
@@ -224,13 +352,8 @@ async def login_submit(request: Request, username: str = Form(...), password: st
 
 @app.get("/dashboard", response_class=HTMLResponse)
 async def dashboard(request: Request, current_user: dict = Depends(get_current_user)):
-    # Usa modules_db e permissions_db
-    allowed_modules = permissions_db.get(current_user["role"], [])
-    
-    if allowed_modules == "all":
-        visible_modules = list(modules_db.values())
-    else:
-        visible_modules = [modules_db[mid] for mid in allowed_modules if mid in modules_db]
+    # Lista pré-calculada no snapshot atual (refeita apenas quando as planilhas são recarregadas)
+    visible_modules = sheets_snapshot.visible_modules(current_user["role"])
 
     return templates.TemplateResponse("dashboard.html", {
         "request": request,
@@ -247,6 +370,7 @@ async def admin_reload(current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Apenas administradores podem recarregar os dados.")
     
-    load_sheets()
+    if not await reload_sheets():
+        raise HTTPException(status_code=500, detail="Falha ao recarregar as planilhas; os dados anteriores foram mantidos.")
     return RedirectResponse("/dashboard", status_code=302)
 
@@ -0,0 +1,153 @@
+from collections import deque
+
+from ui.tools.cell_types import coerce_value
+
+# Colunas de quantidade da planilha de estrutura, em ordem de prioridade.
+# Em cada linha (filho, pai): quantidade do filho por 'quantidade_parent_part' unidades do pai.
+CHILD_QUANTITY_HEADERS = ("quantidade_child_part", "quantidade", "Quantity")
+PARENT_QUANTITY_HEADERS = ("quantidade_parent_part",)
+# Matéria-prima consumida por unidade do próprio componente da linha
+RAW_MATERIAL_QUANTITY_HEADERS = ("materia_prima_quantidade",)
+RAW_MATERIAL_UNIT_HEADERS = ("materia_prima_unidade",)
+
+
+class BomCycleError(ValueError):
+    """Lançada ao explodir um item cuja estrutura contém um ciclo."""
+    def __init__(self, part_ids):
+        self.part_ids = sorted(part_ids)
+        super().__init__(f"A estrutura contém um ciclo envolvendo: {', '.join(self.part_ids[:20])}")
+
+
+def _first_column(headers, candidates):
+    for name in candidates:
+        if name in headers:
+            return headers.index(name)
+    return -1
+
+
+class BomExplosion:
+    """
+    Motor de explosão de estrutura (BOM) multinível.
+    A partir de um BomIndex, monta uma única vez o grafo pai -> [(filho, quantidade por unidade do pai)]
+    e sua ordem topológica. Cada explosão propaga a demanda de cima para baixo nessa ordem: um item
+    compartilhado por várias submontagens acumula a demanda de todos os pais e é descido uma única vez,
+    em vez de uma vez por caminho. Vários itens de topo (com suas quantidades) são explodidos juntos,
+    numa mesma passada.
+    """
+    def __init__(self, bom_index):
+        self.bom_index = bom_index
+        headers = bom_index.headers
+        child_qty_col = _first_column(headers, CHILD_QUANTITY_HEADERS)
+        parent_qty_col = _first_column(headers, PARENT_QUANTITY_HEADERS)
+        raw_qty_col = _first_column(headers, RAW_MATERIAL_QUANTITY_HEADERS)
+        raw_unit_col = _first_column(headers, RAW_MATERIAL_UNIT_HEADERS)
+        self.warnings = [] # Quantidades inválidas encontradas (tratadas como 1)
+
+        # Grafo: pai -> {filho: quantidade do filho por unidade do pai}; linhas repetidas somam
+        self.links = {}
+        for parent_id, entries in bom_index.children.items():
+            child_quantities = {}
+            for child_id, row in entries:
+                child_qty = self._quantity(row, child_qty_col, child_id, headers)
+                parent_qty = self._quantity(row, parent_qty_col, child_id, headers)
+                per_unit = child_qty / parent_qty if parent_qty else child_qty
+                child_quantities[child_id] = child_quantities.get(child_id, 0.0) + per_unit
+            self.links[parent_id] = list(child_quantities.items()) # Só itens com filhos são chaves
+
+        # Matéria-prima por unidade de cada componente
+        self.raw_materials = {}
+        if raw_qty_col != -1:
+            for part_id, row in bom_index.row_by_id.items():
+                if raw_qty_col < len(row) and row[raw_qty_col] not in (None, ""):
+                    quantity = self._quantity(row, raw_qty_col, part_id, headers)
+                    unit = row[raw_unit_col] if raw_unit_col != -1 and raw_unit_col < len(row) else None
+                    self.raw_materials[part_id] = (quantity, "" if unit is None else str(unit))
+
+        self.topological_order, self.cyclic_parts = self._topological_sort()
+        self._position = {part_id: pos for pos, part_id in enumerate(self.topological_order)}
+
+    def _quantity(self, row, column, part_id, headers):
+        """Quantidade numérica de uma célula; vazia (ou coluna ausente) vale 1."""
+        if column == -1 or column >= len(row) or row[column] in (None, ""):
+            return 1.0
+        try:
+            return coerce_value(row[column], float)
+        except ValueError:
+            self.warnings.append(f"Quantidade inválida em '{headers[column]}' para '{part_id}': '{row[column]}'. Considerado 1.")
+            return 1.0
+
+    def _topological_sort(self):
+        """Ordem topológica (algoritmo de Kahn). Retorna (ordem, itens em ciclos)."""
+        in_degree = {}
+        for parent_id, children in self.links.items():
+            in_degree.setdefault(parent_id, 0)
+            for child_id, _ in children:
+                in_degree[child_id] = in_degree.get(child_id, 0) + 1
+
+        queue = deque(part_id for part_id, degree in in_degree.items() if degree == 0)
+        order = []
+        while queue:
+            part_id = queue.popleft()
+            order.append(part_id)
+            for child_id, _ in self.links.get(part_id, ()):
+                in_degree[child_id] -= 1
+                if in_degree[child_id] == 0:
+                    queue.append(child_id)
+        cyclic_parts = {part_id for part_id, degree in in_degree.items() if degree > 0}
+        return order, cyclic_parts
+
+    def explode(self, part_id, quantity=1):
+        """Explode 'quantity' unidades de um item. Ver explode_batch()."""
+        return self.explode_batch([(part_id, quantity)])
+
+    def explode_batch(self, requests):
+        """
+        Explode vários itens de topo de uma vez. 'requests' é uma lista de (código, quantidade);
+        códigos repetidos somam. Retorna:
+        {
+            "demand": {código: quantidade total de cada item da estrutura, inclusive os de topo},
+            "leaves": {código: quantidade total dos itens sem filhos},
+            "raw_materials": {código: (quantidade total de matéria-prima, unidade)},
+        }
+        Lança BomCycleError se algum item alcançado fizer parte de um ciclo e KeyError se um código não existir.
+        """
+        demand = {}
+        for part_id, quantity in requests:
+            if part_id not in self.links and part_id not in self.bom_index.row_by_id:
+                raise KeyError(f"O item '{part_id}' não existe na estrutura.")
+            demand[part_id] = demand.get(part_id, 0.0) + float(quantity)
+
+        if self.cyclic_parts:
+            reached_cycle = self._reachable(demand) & self.cyclic_parts
+            if reached_cycle:
+                raise BomCycleError(reached_cycle)
+
+        # Propaga na ordem topológica, a partir do primeiro item pedido: cada item é descido uma única vez
+        start = min((self._position.get(part_id, len(self.topological_order)) for part_id in demand), default=0)
+        links = self.links
+        demand_get = demand.get
+        for part_id in self.topological_order[start:]:
+            part_demand = demand_get(part_id)
+            if not part_demand:
+                continue
+            for child_id, per_unit in links.get(part_id, ()):
+                demand[child_id] = demand_get(child_id, 0.0) + part_demand * per_unit
+
+        leaves = {part_id: quantity for part_id, quantity in demand.items() if part_id not in links}
+        raw_materials = {}
+        for part_id, quantity in demand.items():
+            if part_id in self.raw_materials:
+                per_unit, unit = self.raw_materials[part_id]
+                raw_materials[part_id] = (quantity * per_unit, unit)
+        return {"demand": demand, "leaves": leaves, "raw_materials": raw_materials}
+
+    def _reachable(self, part_ids):
+        """Conjunto de itens alcançáveis a partir de 'part_ids' (inclusive)."""
+        seen = set(part_ids)
+        stack = list(part_ids)
+        while stack:
+            for child_id, _ in self.links.get(stack.pop(), ()):
+                if child_id not in seen:
+                    seen.add(child_id)
+                    stack.append(child_id)
+        return seen
@@ -0,0 +1,158 @@
+from ui.tools.io_worker import PROGRESS_INTERVAL_ROWS, read_sheet_data
+
+# Nomes aceitos para as colunas de estrutura, em ordem de prioridade:
+# primeiro os de engenharia.xlsx, depois os nomes genéricos.
+PARENT_ID_HEADERS = ("parent_part_number", "ParentID")
+COMPONENT_ID_HEADERS = ("part_number", "ComponentID")
+
+
+def normalize_part_id(value):
+    """
+    Código de peça como texto, para comparação entre colunas.
+    None vira "" e números inteiros lidos como float pelo openpyxl (ex: 200001.0) viram "200001",
+    para que um pai gravado como número encontre o componente gravado como texto.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def find_structure_columns(headers):
+    """Retorna (coluna do pai, coluna do componente) pelos nomes dos cabeçalhos; -1 se não encontrada."""
+    def first_index(candidates):
+        for name in candidates:
+            if name in headers:
+                return headers.index(name)
+        return -1
+    return first_index(PARENT_ID_HEADERS), first_index(COMPONENT_ID_HEADERS)
+
+
+class BomIndex:
+    """
+    Índice de uma planilha de estrutura (BOM), montado em uma única passada pelas linhas:
+    código do componente -> linha de dados, pai -> filhos e a lista de raízes.
+    Substitui as buscas linha a linha (O(n²)) por consultas em dicionário.
+    """
+    def __init__(self, headers, rows, parent_id_col=None, component_id_col=None, check_cancelled=None):
+        # Colunas vazias no fim da primeira linha não são cabeçalhos
+        headers = list(headers)
+        while headers and headers[-1] is None:
+            headers.pop()
+        self.headers = ["" if h is None else str(h) for h in headers]
+
+        if parent_id_col is None or component_id_col is None:
+            parent_id_col, component_id_col = find_structure_columns(self.headers)
+        self.parent_id_col = parent_id_col
+        self.component_id_col = component_id_col
+
+        self.row_by_id = {} # Código do componente -> primeira linha de dados (tupla de valores)
+        self.children = {} # Código do pai -> [(código do filho, linha de dados), ...] na ordem da planilha
+        self.component_ids = [] # Componentes na ordem em que aparecem
+        self.root_ids = []
+        self.roots_inferred = False # True se não há raízes explícitas (pai vazio) e elas foram deduzidas
+        self.cycles = [] # Preenchido por find_cycles()
+
+        if not self.has_structure_columns():
+            return
+
+        explicit_roots = []
+        explicit_root_set = set()
+        child_ids = set()
+        parent_ids = [] # Pais na ordem em que aparecem
+        parent_set = set()
+
+        for row_number, row in enumerate(rows, start=1):
+            if check_cancelled is not None and row_number % PROGRESS_INTERVAL_ROWS == 0:
+                check_cancelled()
+            row = tuple(row)
+            if len(row) <= max(parent_id_col, component_id_col):
+                continue
+            component_id = normalize_part_id(row[component_id_col])
+            if not component_id:
+                continue
+            parent_id = normalize_part_id(row[parent_id_col])
+
+            if component_id not in self.row_by_id:
+                self.row_by_id[component_id] = row
+                self.component_ids.append(component_id)
+
+            if parent_id:
+                child_ids.add(component_id)
+                self.children.setdefault(parent_id, []).append((component_id, row))
+                if parent_id not in parent_set:
+                    parent_set.add(parent_id)
+                    parent_ids.append(parent_id)
+            elif component_id not in explicit_root_set:
+                # Linha com o pai vazio: o componente é uma raiz da estrutura
+                explicit_root_set.add(component_id)
+                explicit_roots.append(component_id)
+
+        if explicit_roots:
+            # Pais sem linha própria na planilha também são exibidos como raízes (sem dados)
+            self.root_ids = explicit_roots + [parent_id for parent_id in parent_ids
+                                              if parent_id not in self.row_by_id and parent_id not in child_ids]
+        else:
+            # Sem pai vazio explícito: raízes são os pais que não aparecem como filhos de ninguém
+            self.roots_inferred = True
+            self.root_ids = [parent_id for parent_id in parent_ids if parent_id not in child_ids]
+            if not self.root_ids and self.component_ids:
+                self.root_ids = [self.component_ids[0]] # Estrutura sem topo (ex: só ciclos)
+
+    def has_structure_columns(self):
+        return self.parent_id_col != -1 and self.component_id_col != -1
+
+    def row_values(self, part_id):
+        """Linha de dados do componente, ou None se ele só aparece como pai de outros."""
+        return self.row_by_id.get(part_id)
+
+    def child_entries(self, part_id):
+        """Lista de (código do filho, linha de dados) do componente."""
+        return self.children.get(part_id, [])
+
+    def display_values(self, row):
+        """Valores de uma linha como texto, com exatamente uma posição por cabeçalho."""
+        values = ["" if value is None else str(value) for value in row[:len(self.headers)]]
+        values.extend([""] * (len(self.headers) - len(values)))
+        return values
+
+    def find_cycles(self):
+        """
+        Procura ciclos na estrutura (ex: A contém B, que contém A) sem recursão.
+        Retorna uma lista de ciclos, cada um como a lista de códigos do caminho (o primeiro código se repete no fim).
+        """
+        WHITE, GRAY, BLACK = 0, 1, 2
+        color = {}
+        cycles = []
+        for start_id in list(self.children):
+            if color.get(start_id, WHITE) != WHITE:
+                continue
+            color[start_id] = GRAY
+            path = [start_id]
+            stack = [iter(self.child_entries(start_id))]
+            while stack:
+                child = next(stack[-1], None)
+                if child is None:
+                    stack.pop()
+                    color[path.pop()] = BLACK
+                    continue
+                child_id = child[0]
+                state = color.get(child_id, WHITE)
+                if state == GRAY:
+                    cycles.append(path[path.index(child_id):] + [child_id])
+                elif state == WHITE:
+                    color[child_id] = GRAY
+                    path.append(child_id)
+                    stack.append(iter(self.child_entries(child_id)))
+        self.cycles = cycles
+        return cycles
+
+
+def load_bom_index(job, file_path, sheet_name):
+    """Job do IOService: lê a planilha de estrutura pelo cache compartilhado e monta o BomIndex fora da thread da GUI."""
+    data = read_sheet_data(job, file_path, sheet_name, create_missing=False)
+    job.report_progress(-1, "Indexando a estrutura...")
+    index = BomIndex(data["headers"], data["rows"], check_cancelled=job.check_cancelled)
+    index.find_cycles()
+    return index
@@ -0,0 +1,118 @@
+import datetime
+
+# Mapeamento para tipos de dados esperados para validação (cabeçalho da coluna: tipo)
+# Este mapeamento define as REGRAS de validação para colunas COM ESTES NOMES.
+# Se um cabeçalho de coluna não estiver nesta lista, o tipo padrão será str.
+ITEM_COLUMN_TYPES = {
+    "quantidade_movimentada": float,
+    "custo_unitario_movimentacao": float,
+    "data_movimentacao": datetime.date,
+    "validade_lote": datetime.date,
+    "id_movimentacao": int,
+    "id_item": int,
+    "responsavel_movimentacao": int,
+    "saldo_final_deposito": float,
+    "estoque_em_transito": float,
+    "estoque_disponivel_para_venda": float
+}
+
+# Formatos de data aceitos na digitação
+DATE_INPUT_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%Y/%m/%d", "%d-%m-%Y"]
+
+
+def coerce_value(value, col_type, col_name=""):
+    """
+    Converte um valor (normalmente o texto digitado na tabela) para o tipo esperado da coluna.
+    Textos vazios viram None. Lança ValueError se o valor não for válido para o tipo.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str) and not value.strip() and col_type is not str:
+        return None # Permite células numéricas/de data vazias
+
+    if col_type == int:
+        if isinstance(value, bool):
+            return int(value)
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return int(str(value).strip())
+    if col_type == float:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        # Substitui vírgula por ponto para conversão de float
+        return float(str(value).strip().replace(',', '.'))
+    if col_type == datetime.datetime:
+        if isinstance(value, datetime.datetime):
+            return value
+        if isinstance(value, datetime.date):
+            return datetime.datetime.combine(value, datetime.time())
+        date_str = str(value).strip()
+        try:
+            return datetime.datetime.fromisoformat(date_str)
+        except ValueError:
+            pass
+        return datetime.datetime.combine(_parse_date(date_str, col_name, value), datetime.time())
+    if col_type == datetime.date:
+        if isinstance(value, datetime.datetime): # openpyxl lê datas como datetime
+            return value.date()
+        if isinstance(value, datetime.date): # Se já for um objeto de data
+            return value
+        return _parse_date(str(value).strip(), col_name, value)
+    return str(value) # Padrão para string para outros tipos
+
+
+def _parse_date(date_str, col_name, original_value):
+    # Tenta múltiplos formatos de data
+    for fmt in DATE_INPUT_FORMATS:
+        try:
+            return datetime.datetime.strptime(date_str, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Formato de data inválido para '{col_name}': '{original_value}'. Esperado um formato como YYYY-MM-DD ou DD/MM/YYYY.")
+
+
+def value_type(value):
+    """Tipo de célula de um valor lido pelo openpyxl (int, float, datetime.datetime, datetime.date ou str)."""
+    if isinstance(value, bool):
+        return int
+    for col_type in (int, float, datetime.datetime, datetime.date):
+        if isinstance(value, col_type):
+            return col_type
+    return str
+
+
+def infer_column_type(values):
+    """Infere o tipo de uma coluna sem tipo declarado pelo primeiro valor não vazio."""
+    for value in values:
+        if value is not None and value != "":
+            return value_type(value)
+    return str
+
+
+def parse_edited_value(value, col_type):
+    """
+    Converte o texto digitado em uma coluna cujo tipo foi inferido dos valores carregados.
+    Numa coluna numérica, "3,5" é aceito mesmo que os demais valores sejam inteiros.
+    Se o texto não puder ser convertido, ele é mantido como texto (colunas sem tipo declarado não bloqueiam a edição).
+    """
+    if not isinstance(value, str) or col_type is str:
+        return value
+    candidate_types = [int, float] if col_type in (int, float) else [col_type]
+    for candidate in candidate_types:
+        try:
+            return coerce_value(value, candidate)
+        except ValueError:
+            continue
+    return value
+
+
+def to_cell_value(value):
+    """
+    Conversão usada ao gravar: números, booleanos e datas são gravados nativamente pelo openpyxl;
+    vazios viram células vazias e qualquer outro valor vira texto.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float, datetime.date, datetime.time)):
+        return value
+    return str(value)
@@ -1,14 +1,21 @@
 import sys
 import os
 import openpyxl
-from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QTableWidget, QTableWidgetItem, QHBoxLayout, QMessageBox, QHeaderView, QLabel, QComboBox, QInputDialog
-from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QTableView, QHBoxLayout, QMessageBox, QHeaderView, QLabel, QComboBox, QInputDialog
 
 # Definindo caminhos de forma dinâmica a partir da localização do script
 current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(os.path.dirname(current_dir)) # Navega de ui/tools para a raiz do projeto
 user_sheets_dir = os.path.join(project_root, 'user_sheets')
 
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from ui.tools.workbook_cache import get_sheet_names
+from ui.tools.io_worker import IOStatusBar, read_sheet_data, write_sheet_data
+from ui.tools.cell_types import to_cell_value
+from ui.tools.sheet_table_model import SheetTableModel
+
 DEFAULT_DATA_EXCEL_FILENAME = "colaboradores.xlsx"
 DEFAULT_SHEET_NAME = "Colaboradores" # Nome da planilha padrão para dados de colaboradores
 
@@ -47,13 +54,19 @@ class ColaboradoresTool(QWidget):
         header_layout.addWidget(self.refresh_sheets_btn)
         self.layout.addLayout(header_layout)
 
-        self.table = QTableWidget()
-        self.table.setEditTriggers(QTableWidget.DoubleClicked | QTableWidget.AnyKeyPressed)
+        self.table = QTableView()
+        self.table_model = SheetTableModel(self)
+        self.table.setModel(self.table_model)
+        self.table.setEditTriggers(QTableView.DoubleClicked | QTableView.AnyKeyPressed)
         self.table.setAlternatingRowColors(True)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
         self.table.verticalHeader().setSectionResizeMode(QHeaderView.Interactive)
         self.layout.addWidget(self.table)
 
+        # Progresso/cancelamento das leituras e gravações feitas em segundo plano
+        self.io_status = IOStatusBar(self)
+        self.layout.addWidget(self.io_status)
+
         button_layout = QHBoxLayout()
         self.add_row_btn = QPushButton("Adicionar Linha")
         self.add_row_btn.clicked.connect(self._add_empty_row)
@@ -82,13 +95,11 @@ class ColaboradoresTool(QWidget):
                                 f"Ele será criado com a aba padrão '{DEFAULT_SHEET_NAME}' ao salvar. "
                                 "Os cabeçalhos serão definidos ao adicionar e salvar a primeira linha de dados.")
             self.sheet_selector.addItem(DEFAULT_SHEET_NAME)
-            self.table.setRowCount(0)
-            self.table.setColumnCount(0) # Inicia com 0 colunas, aguardando cabeçalhos do arquivo ou do usuário
+            self.table_model.clear() # Inicia com 0 colunas, aguardando cabeçalhos do arquivo ou do usuário
             return
 
         try:
-            wb = openpyxl.load_workbook(self.file_path, read_only=True)
-            sheet_names = wb.sheetnames
+            sheet_names = get_sheet_names(self.file_path)
             
             if not sheet_names:
                 self.sheet_selector.addItem(DEFAULT_SHEET_NAME)
@@ -110,67 +121,50 @@ class ColaboradoresTool(QWidget):
         except Exception as e:
             QMessageBox.critical(self, "Erro ao Listar Planilhas", f"Erro ao listar planilhas em '{os.path.basename(self.file_path)}': {e}")
             self.sheet_selector.addItem(DEFAULT_SHEET_NAME) # Fallback para o nome da sheet se der erro
-            self.table.setRowCount(0)
-            self.table.setColumnCount(0) # Limpa a tabela em caso de erro
+            self.table_model.clear() # Limpa a tabela em caso de erro
 
     def _load_data_from_selected_sheet(self):
-        """Carrega dados da planilha Excel atualmente selecionada para o QTableWidget."""
+        """Carrega (em segundo plano) os dados da planilha Excel atualmente selecionada para o QTableView."""
         current_sheet_name = self.sheet_selector.currentText()
         if not current_sheet_name or not self.file_path or not os.path.exists(self.file_path):
-            self.table.setRowCount(0)
-            self.table.setColumnCount(0)
+            self.table_model.clear()
             return
 
-        try:
-            wb = openpyxl.load_workbook(self.file_path)
-            
-            if current_sheet_name not in wb.sheetnames:
-                QMessageBox.information(self, "Planilha Não Encontrada", 
-                                        f"A planilha '{current_sheet_name}' não foi encontrada em '{os.path.basename(self.file_path)}'. "
-                                        "Criando uma nova. Os cabeçalhos serão definidos ao adicionar e salvar a primeira linha de dados.")
-                ws = wb.create_sheet(current_sheet_name)
-                wb.save(self.file_path) 
-                self._populate_sheet_selector() 
-                return 
+        # A leitura é feita pelo IOService, fora da thread da GUI; o resultado é aplicado em _on_sheet_data_loaded
+        self.io_status.run(read_sheet_data, self.file_path, current_sheet_name,
+                           message=f"Carregando '{current_sheet_name}'...",
+                           on_finished=lambda result, name=current_sheet_name: self._on_sheet_data_loaded(name, result),
+                           on_failed=lambda error, name=current_sheet_name: self._on_sheet_load_failed(name, error))
+
+    def _on_sheet_data_loaded(self, current_sheet_name, result):
+        """Aplica à tabela os dados lidos em segundo plano."""
+        # A planilha não existia no arquivo: foi criada vazia e o seletor é recarregado
+        if result["sheet_created"]:
+            QMessageBox.information(self, "Planilha Não Encontrada", 
+                                    f"A planilha '{current_sheet_name}' não foi encontrada em '{os.path.basename(self.file_path)}'. "
+                                    "Criando uma nova. Os cabeçalhos serão definidos ao adicionar e salvar a primeira linha de dados.")
+            self._populate_sheet_selector()
+            return
 
-            sheet = wb[current_sheet_name]
+        headers = result["headers"]
+        if not headers: 
+            self.table_model.clear()
+            QMessageBox.information(self, "Planilha Vazia", f"A planilha '{current_sheet_name}' está vazia ou não possui cabeçalhos. Adicione uma linha para definir os cabeçalhos.")
+            return
 
-            # Carrega cabeçalhos da primeira linha da planilha
-            headers = [cell.value for cell in sheet[1]] if sheet.max_row > 0 else []
-            
-            if not headers: 
-                self.table.setColumnCount(0)
-                self.table.setRowCount(0)
-                QMessageBox.information(self, "Planilha Vazia", f"A planilha '{current_sheet_name}' está vazia ou não possui cabeçalhos. Adicione uma linha para definir os cabeçalhos.")
-                return
-            
-            self.table.setColumnCount(len(headers))
-            self.table.setHorizontalHeaderLabels(headers)
-
-            data = []
-            for row in sheet.iter_rows(min_row=2):
-                row_values = [cell.value for cell in row]
-                while len(row_values) < len(headers):
-                    row_values.append("")
-                data.append(row_values)
-
-            self.table.setRowCount(len(data))
-            for row_idx, row_data in enumerate(data):
-                for col_idx, cell_value in enumerate(row_data):
-                    item = QTableWidgetItem(str(cell_value) if cell_value is not None else "")
-                    self.table.setItem(row_idx, col_idx, item)
-
-            self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
-            self.table.verticalHeader().setSectionResizeMode(QHeaderView.Interactive)
-            QMessageBox.information(self, "Dados Carregados", f"Dados de '{current_sheet_name}' carregados com sucesso.")
+        # O modelo guarda os valores por coluna; a view só consulta as células visíveis
+        self.table_model.set_sheet_data(headers, result["rows"])
 
-        except Exception as e:
-            QMessageBox.critical(self, "Erro de Carregamento", f"Erro ao carregar dados de colaboradores da aba '{current_sheet_name}': {e}")
-            self.table.setRowCount(0)
-            self.table.setColumnCount(0) 
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        QMessageBox.information(self, "Dados Carregados", f"Dados de '{current_sheet_name}' carregados com sucesso.")
+
+    def _on_sheet_load_failed(self, current_sheet_name, error):
+        QMessageBox.critical(self, "Erro de Carregamento", f"Erro ao carregar dados de colaboradores da aba '{current_sheet_name}': {error}")
+        self.table_model.clear()
 
     def _save_data(self):
-        """Salva dados do QTableWidget de volta para a planilha Excel, capturando os cabeçalhos da tabela."""
+        """Salva dados do QTableView de volta para a planilha Excel, capturando os cabeçalhos da tabela."""
         if not self.file_path:
             QMessageBox.critical(self, "Erro", "Nenhum arquivo especificado para salvar.")
             return
@@ -180,60 +174,62 @@ class ColaboradoresTool(QWidget):
             QMessageBox.warning(self, "Nome da Planilha Inválido", "O nome da planilha não pode estar vazio. Por favor, selecione ou adicione uma aba.")
             return
 
-        try:
-            wb = None
-            if not os.path.exists(self.file_path):
-                wb = openpyxl.Workbook()
-                ws = wb.active
-                ws.title = current_sheet_name
-            else:
-                wb = openpyxl.load_workbook(self.file_path)
-                if current_sheet_name not in wb.sheetnames:
-                    ws = wb.create_sheet(current_sheet_name)
-                else:
-                    ws = wb[current_sheet_name]
-            
-            for row_idx in range(ws.max_row, 0, -1):
-                ws.delete_rows(row_idx)
+        if not self.table_model.is_modified() and os.path.exists(self.file_path):
+            QMessageBox.information(self, "Nada a Salvar", "Não há alterações a serem salvas.")
+            return
 
-            current_headers = [self.table.horizontalHeaderItem(col).text() 
-                               for col in range(self.table.columnCount())]
-            
-            if current_headers:
-                ws.append(current_headers)
-            
-            for row_idx in range(self.table.rowCount()):
-                row_data = []
-                for col_idx in range(self.table.columnCount()):
-                    item = self.table.item(row_idx, col_idx)
-                    row_data.append(item.text() if item is not None else "")
-                ws.append(row_data)
-
-            wb.save(self.file_path)
-            QMessageBox.information(self, "Dados Salvos", f"Dados de '{current_sheet_name}' salvos com sucesso em '{os.path.basename(self.file_path)}'.")
-            self._populate_sheet_selector() 
+        # Só as alterações são copiadas da tabela aqui; a gravação é feita pelo IOService, fora da thread da GUI
+        save_plan = self.table_model.build_save_plan()
+        self.io_status.run(write_sheet_data, self.file_path, current_sheet_name, save_plan,
+                           convert_value=to_cell_value,
+                           message=f"Salvando '{current_sheet_name}'...", replaceable=False,
+                           on_finished=lambda row_count, name=current_sheet_name, plan=save_plan: self._on_data_saved(name, plan),
+                           on_failed=self._on_save_failed,
+                           on_cancelled=lambda: QMessageBox.information(self, "Gravação Cancelada", "A gravação foi cancelada. O arquivo não foi alterado."))
+
+    def _on_data_saved(self, current_sheet_name, save_plan):
+        self.table_model.mark_saved(save_plan)
+        QMessageBox.information(self, "Dados Salvos", f"Dados de '{current_sheet_name}' salvos com sucesso em '{os.path.basename(self.file_path)}'.")
+        # A tabela não é relida do disco: edições feitas durante a gravação continuam pendentes (ver mark_saved).
+        # Só a lista de abas é atualizada, caso a gravação tenha criado uma aba nova.
+        self._refresh_sheet_names(current_sheet_name)
+
+    def _refresh_sheet_names(self, current_sheet_name):
+        """Atualiza os nomes das abas no seletor, mantendo a aba atual, sem disparar uma nova leitura."""
+        try:
+            sheet_names = get_sheet_names(self.file_path)
         except Exception as e:
-            QMessageBox.critical(self, "Erro ao Salvar", f"Erro ao salvar dados de colaboradores: {e}")
+            print(f"Aviso: Não foi possível listar as abas de '{os.path.basename(self.file_path)}': {e}")
+            return
+        self.sheet_selector.blockSignals(True)
+        try:
+            self.sheet_selector.clear()
+            self.sheet_selector.addItems(sheet_names)
+            if self.sheet_selector.findText(current_sheet_name) == -1:
+                self.sheet_selector.addItem(current_sheet_name)
+            self.sheet_selector.setCurrentIndex(self.sheet_selector.findText(current_sheet_name))
+        finally:
+            self.sheet_selector.blockSignals(False)
+
+    def _on_save_failed(self, error):
+        self.table_model.mark_save_failed() # As edições continuam na tabela; a próxima gravação será completa
+        QMessageBox.critical(self, "Erro ao Salvar", f"Erro ao salvar dados de colaboradores: {error}")
 
     def _add_empty_row(self):
-        """Adiciona uma linha vazia ao QTableWidget para nova entrada de dados."""
-        row_count = self.table.rowCount()
-        self.table.insertRow(row_count)
+        """Adiciona uma linha vazia ao QTableView para nova entrada de dados."""
+        row_count = self.table_model.rowCount()
         
-        if self.table.columnCount() == 0 and row_count == 0:
+        if self.table_model.columnCount() == 0 and row_count == 0:
             text, ok = QInputDialog.getText(self, "Definir Cabeçalhos", 
                                             "A planilha está vazia. Insira os nomes das colunas separados por vírgula (ex: Matrícula, Nome, Setor):")
             if ok and text:
                 headers = [h.strip() for h in text.split(',')]
-                self.table.setColumnCount(len(headers))
-                self.table.setHorizontalHeaderLabels(headers)
+                self.table_model.set_headers(headers)
             else:
                 QMessageBox.warning(self, "Aviso", "Nenhum cabeçalho fornecido. Nenhuma coluna será adicionada.")
-                self.table.removeRow(row_count) 
                 return 
 
-        for col_idx in range(self.table.columnCount()):
-            self.table.setItem(row_count, col_idx, QTableWidgetItem(""))
+        self.table_model.append_empty_row()
 
 # Exemplo de uso (para testar este módulo individualmente)
 if __name__ == "__main__":
@@ -0,0 +1,94 @@
+import os
+import pickle
+import threading
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+USER_SHEETS_DIR = os.path.join(project_root, "user_sheets")
+
+# Snapshot compilado da configuração da GUI (usuários, ferramentas, permissões, itens do espaço de trabalho).
+# Cada seção guarda o tamanho/mtime da planilha de origem e só é recompilada quando ela muda.
+CONFIG_SNAPSHOT_PATH = os.path.join(USER_SHEETS_DIR, "config_snapshot.pickle")
+# Incrementar quando o formato de alguma seção mudar (ex: novo campo lido das planilhas)
+CONFIG_SNAPSHOT_VERSION = 2
+
+
+def _file_stamp(file_path):
+    """(tamanho, mtime em ns) do arquivo, ou None se ele não existir."""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+class ConfigSnapshot:
+    """
+    Cache binário (pickle) das configurações lidas das planilhas.
+    get() devolve a seção guardada se a planilha de origem não mudou desde a compilação; caso contrário,
+    chama o 'loader' (que lê a planilha com o openpyxl) e guarda o resultado. save() grava o arquivo
+    apenas se alguma seção foi recompilada.
+    """
+    def __init__(self, path=CONFIG_SNAPSHOT_PATH):
+        self.path = path
+        self.sections = {} # Nome -> {"source": caminho, "stamp": (tamanho, mtime), "data": ...}
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    def load(self):
+        """Carrega o snapshot gravado (ignorado se não existir, estiver corrompido ou for de outra versão)."""
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+        except Exception:
+            return
+        if isinstance(data, dict) and data.get("version") == CONFIG_SNAPSHOT_VERSION:
+            with self._lock:
+                self.sections = data.get("sections", {})
+
+    def get(self, name, source_path, loader):
+        """
+        Retorna a seção 'name', recompilando-a com loader() se 'source_path' mudou (tamanho/mtime).
+        Resultados vazios (planilha ausente ou com erro) não são guardados: o loader volta a ser
+        chamado, e a exibir seus avisos, na próxima vez.
+        """
+        stamp = _file_stamp(source_path)
+        with self._lock:
+            section = self.sections.get(name)
+            if stamp is not None and section is not None and section["source"] == source_path and section["stamp"] == stamp:
+                return section["data"]
+        data = loader()
+        with self._lock:
+            if stamp is not None and data and _file_stamp(source_path) == stamp: # Não mudou durante a leitura
+                self.sections[name] = {"source": source_path, "stamp": stamp, "data": data}
+                self._dirty = True
+            elif self.sections.pop(name, None) is not None:
+                self._dirty = True
+        return data
+
+    def save(self):
+        """Grava o snapshot de forma atômica (arquivo temporário + rename), se algo mudou."""
+        with self._lock:
+            if not self._dirty:
+                return
+            temp_path = self.path + ".tmp"
+            try:
+                with open(temp_path, "wb") as f:
+                    pickle.dump({"version": CONFIG_SNAPSHOT_VERSION, "sections": self.sections}, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(temp_path, self.path)
+                self._dirty = False
+            except (OSError, pickle.PicklingError) as e:
+                print(f"Aviso: Não foi possível gravar o snapshot de configuração em {self.path}: {e}")
+
+
+_config_snapshot = None
+_config_snapshot_lock = threading.Lock()
+
+
+def get_config_snapshot():
+    """Retorna o ConfigSnapshot compartilhado no processo (carregado do disco na primeira chamada)."""
+    global _config_snapshot
+    with _config_snapshot_lock:
+        if _config_snapshot is None:
+            _config_snapshot = ConfigSnapshot()
+            _config_snapshot.load()
+        return _config_snapshot
@@ -15,8 +15,16 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(os.path.dirname(current_dir)) # Navega de ui/tools para a raiz do projeto
 user_sheets_dir = os.path.join(project_root, 'user_sheets')
 
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from ui.tools.workbook_cache import get_workbook, get_sheet_names, workbook_lock
+from ui.tools.io_worker import IOStatusBar, write_sheet_data
+
 DEFAULT_DATA_EXCEL_FILENAME = "engenharia.xlsx"
 DEFAULT_SHEET_NAME = "Workflows" # Nome da planilha padrão para salvar/carregar workflows
+# Cabeçalhos fixos do formato de salvamento do workflow: são internos à ferramenta e definem o "schema" salvo
+WORKFLOW_HEADERS = ["Tipo", "ID", "X", "Y", "Largura", "Altura", "Texto", "Cor", "Conexões"]
 
 class EngenhariaWorkflowTool(QWidget):
     """
@@ -77,6 +85,10 @@ class EngenhariaWorkflowTool(QWidget):
         control_layout.addWidget(load_btn)
         self.layout.addLayout(control_layout)
 
+        # Progresso/cancelamento da gravação, feita pelo IOService fora da thread da GUI
+        self.io_status = IOStatusBar(self)
+        self.layout.addWidget(self.io_status)
+
         self.nodes = [] # Para rastrear os nós adicionados (QGraphicsRectItem)
         self.node_properties = {} # Para armazenar propriedades adicionais dos nós (texto, ID, etc.)
         self.links = [] # Para rastrear as ligações (QGraphicsLineItem)
@@ -101,8 +113,7 @@ class EngenhariaWorkflowTool(QWidget):
             return
 
         try:
-            wb = openpyxl.load_workbook(self.file_path, read_only=True)
-            sheet_names = wb.sheetnames
+            sheet_names = get_sheet_names(self.file_path)
             
             if not sheet_names:
                 self.sheet_selector.addItem(self.sheet_name)
@@ -131,80 +142,65 @@ class EngenhariaWorkflowTool(QWidget):
     def _save_workflow_to_excel(self):
         """
         Salva o estado atual do diagrama para a planilha Excel selecionada.
-        Cada nó e link é salvo como uma linha.
+        Cada nó e link é salvo como uma linha; a planilha é reescrita por inteiro pelo IOService.
         """
         current_sheet_name = self.sheet_selector.currentText()
         if not current_sheet_name:
             QMessageBox.warning(self, "Erro", "Selecione uma planilha para salvar.")
             return
 
-        try:
-            wb = None
-            if not os.path.exists(self.file_path):
-                wb = openpyxl.Workbook()
-                ws = wb.active
-                ws.title = current_sheet_name
-            else:
-                wb = openpyxl.load_workbook(self.file_path)
-                if current_sheet_name not in wb.sheetnames:
-                    ws = wb.create_sheet(current_sheet_name)
-                else:
-                    ws = wb[current_sheet_name]
-            
-            # Limpa todas as linhas existentes, exceto a primeira (cabeçalhos)
-            # ou todas as linhas se não houver cabeçalhos ainda.
-            for row_idx in range(ws.max_row, 0, -1): # Começa do fim, apaga tudo
-                ws.delete_rows(row_idx)
-
-            # Cabeçalhos fixos para o formato de salvamento do workflow
-            # Estes são internos à ferramenta e definem o "schema" do workflow salvo.
-            workflow_headers = ["Tipo", "ID", "X", "Y", "Largura", "Altura", "Texto", "Cor", "Conexões"]
-            ws.append(workflow_headers) 
-
-            # Salvar Nós
-            for node_item in self.nodes:
-                node_props = self.node_properties.get(node_item, {})
-                node_id = node_props.get("id")
-                node_text = node_props.get("text", "") # Pega o texto armazenado
-                
-                node_x = node_item.rect().x()
-                node_y = node_item.rect().y()
-                node_width = node_item.rect().width()
-                node_height = node_item.rect().height()
-                node_color = node_item.brush().color().name() 
-                
-                connections = [] # Nós não têm "conexões" diretas armazenadas aqui, mas podemos usar para atributos futuros
-                
-                row_data = [
-                    "Node",
-                    node_id,
-                    node_x,
-                    node_y,
-                    node_width,
-                    node_height,
-                    node_text,
-                    node_color,
-                    json.dumps(connections) # Serializa lista vazia de conexões
-                ]
-                ws.append(row_data)
-
-            # Salvar Links
-            for link_item in self.links:
-                link_connections = {"source": getattr(link_item, 'source_node_id', "N/A"), 
-                                    "target": getattr(link_item, 'target_node_id', "N/A")}
-                
-                row_data = [
-                    "Link",
-                    "", # Links não têm ID próprio neste esquema simplificado
-                    "", "", "", "", "", "", # Campos vazios para links
-                    json.dumps(link_connections) # Serializa as conexões de link
-                ]
-                ws.append(row_data)
-
-            wb.save(self.file_path)
-            QMessageBox.information(self, "Sucesso", f"Workflow salvo em '{current_sheet_name}' em '{os.path.basename(self.file_path)}'.")
-        except Exception as e:
-            QMessageBox.critical(self, "Erro ao Salvar", f"Não foi possível salvar o workflow: {e}")
+        rows = []
+        # Salvar Nós
+        for node_item in self.nodes:
+            node_props = self.node_properties.get(node_item, {})
+            node_id = node_props.get("id")
+            node_text = node_props.get("text", "") # Pega o texto armazenado
+
+            node_x = node_item.rect().x()
+            node_y = node_item.rect().y()
+            node_width = node_item.rect().width()
+            node_height = node_item.rect().height()
+            node_color = node_item.brush().color().name() 
+
+            connections = [] # Nós não têm "conexões" diretas armazenadas aqui, mas podemos usar para atributos futuros
+
+            rows.append([
+                "Node",
+                node_id,
+                node_x,
+                node_y,
+                node_width,
+                node_height,
+                node_text,
+                node_color,
+                json.dumps(connections) # Serializa lista vazia de conexões
+            ])
+
+        # Salvar Links
+        for link_item in self.links:
+            link_connections = {"source": getattr(link_item, 'source_node_id', "N/A"), 
+                                "target": getattr(link_item, 'target_node_id', "N/A")}
+
+            rows.append([
+                "Link",
+                "", # Links não têm ID próprio neste esquema simplificado
+                "", "", "", "", "", "", # Campos vazios para links
+                json.dumps(link_connections) # Serializa as conexões de link
+            ])
+
+        # Só os valores do diagrama são copiados aqui; limpar e reescrever a planilha é feito fora da thread da GUI
+        save_plan = {"mode": "full", "headers": list(WORKFLOW_HEADERS), "rows": rows}
+        self.io_status.run(write_sheet_data, self.file_path, current_sheet_name, save_plan,
+                           message=f"Salvando '{current_sheet_name}'...", replaceable=False,
+                           on_finished=lambda row_count, name=current_sheet_name: self._on_workflow_saved(name),
+                           on_failed=self._on_save_failed,
+                           on_cancelled=lambda: QMessageBox.information(self, "Gravação Cancelada", "A gravação foi cancelada. O arquivo não foi alterado."))
+
+    def _on_workflow_saved(self, current_sheet_name):
+        QMessageBox.information(self, "Sucesso", f"Workflow salvo em '{current_sheet_name}' em '{os.path.basename(self.file_path)}'.")
+
+    def _on_save_failed(self, error):
+        QMessageBox.critical(self, "Erro ao Salvar", f"Não foi possível salvar o workflow: {error}")
 
     def _load_workflow_from_selected_sheet(self):
         """
@@ -218,23 +214,23 @@ class EngenhariaWorkflowTool(QWidget):
             return
 
         try:
-            wb = openpyxl.load_workbook(self.file_path)
-            if current_sheet_name not in wb.sheetnames:
+            # Copia as linhas com o lock do arquivo: o workbook compartilhado pode estar sendo gravado por um job
+            with workbook_lock(self.file_path):
+                wb = get_workbook(self.file_path)
+                sheet_rows = list(wb[current_sheet_name].iter_rows(values_only=True)) if current_sheet_name in wb.sheetnames else None
+            if sheet_rows is None:
                 QMessageBox.warning(self, "Planilha Não Encontrada", f"A planilha '{current_sheet_name}' não foi encontrada em '{os.path.basename(self.file_path)}'.")
                 self._add_sample_diagram_elements_if_empty() # Adiciona exemplos se a sheet não existir
                 return
 
-            sheet = wb[current_sheet_name]
-            
             # Carrega cabeçalhos da primeira linha da planilha
-            headers = [cell.value for cell in sheet[1]] if sheet.max_row > 0 else []
+            headers = list(sheet_rows[0]) if sheet_rows else []
             
             # Mapa para acesso fácil às colunas por nome
             header_col_map = {h: idx for idx, h in enumerate(headers)}
 
             # Verifica se os cabeçalhos esperados para o workflow estão presentes
-            expected_headers = ["Tipo", "ID", "X", "Y", "Largura", "Altura", "Texto", "Cor", "Conexões"]
-            if not all(h in header_col_map for h in expected_headers):
+            if not all(h in header_col_map for h in WORKFLOW_HEADERS):
                 QMessageBox.information(self, "Planilha Vazia ou Incompatível", 
                                         f"A planilha '{current_sheet_name}' está vazia ou não possui o formato esperado de workflow. Adicionando elementos de amostra.")
                 self._add_sample_diagram_elements_if_empty()
@@ -243,8 +239,7 @@ class EngenhariaWorkflowTool(QWidget):
             loaded_nodes = {} # Mapeia IDs de nós para os objetos QGraphicsRectItem
             max_id = 0
 
-            for row_idx in range(2, sheet.max_row + 1): # Começa da segunda linha para pular cabeçalhos
-                row_values = [cell.value for cell in sheet[row_idx]]
+            for row_values in sheet_rows[1:]: # Pula a linha de cabeçalhos
                 
                 # Função auxiliar para obter valor de célula de forma segura
                 def get_val(header_name):
@@ -475,7 +470,7 @@ if __name__ == "__main__":
         
         ws_workflow = wb.create_sheet(DEFAULT_SHEET_NAME) # Cria a sheet 'Workflows'
         # Adiciona os cabeçalhos do workflow na primeira linha para garantir consistência
-        ws_workflow.append(["Tipo", "ID", "X", "Y", "Largura", "Altura", "Texto", "Cor", "Conexões"])
+        ws_workflow.append(WORKFLOW_HEADERS)
         
         wb.save(test_file_path)
         print(f"Arquivo de teste '{DEFAULT_DATA_EXCEL_FILENAME}' criado/atualizado com abas de exemplo.")
@@ -1,12 +1,27 @@
 import sys
 import os
 import openpyxl
-from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QTableWidget, QTableWidgetItem, QHBoxLayout, QMessageBox, QHeaderView, QLabel, QComboBox
-from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QTableView, QHBoxLayout, QMessageBox, QHeaderView, QLabel, QComboBox
+
+# Garante que a raiz do projeto esteja no sys.path para importar os módulos compartilhados de ui.tools
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from ui.tools.workbook_cache import get_sheet_names
+from ui.tools.sheet_table_model import StreamingSheetTableModel
 
 # Nenhuma lista de cabeçalhos default, pois o visualizador lê diretamente do arquivo.
 # Nenhuma necessidade de DEFAULT_SHEET_NAME pois ele apenas mostra o que existe.
 
+
+def _close_stream_workbook(stream):
+    """Fecha o workbook somente leitura da leitura em andamento (libera o arquivo), se houver."""
+    wb, stream["workbook"] = stream["workbook"], None
+    if wb is not None:
+        wb.close()
+
+
 class ExcelViewerTool(QWidget):
     """
     GUI para visualizar qualquer arquivo Excel (.xlsx).
@@ -18,6 +33,9 @@ class ExcelViewerTool(QWidget):
         self.file_path = file_path
         self.setWindowTitle(f"Visualizador Excel: {os.path.basename(self.file_path)}")
         self.layout = QVBoxLayout(self)
+        # Workbook somente leitura cujas linhas estão sendo exibidas; fechado ao trocar de aba ou destruir o widget
+        self._stream = {"workbook": None}
+        self.destroyed.connect(lambda *_, stream=self._stream: _close_stream_workbook(stream))
 
         header_layout = QHBoxLayout()
         self.file_name_label = QLabel(f"<b>Arquivo:</b> {os.path.basename(self.file_path)}")
@@ -35,12 +53,19 @@ class ExcelViewerTool(QWidget):
         header_layout.addWidget(self.refresh_sheets_btn)
         self.layout.addLayout(header_layout)
 
-        self.table = QTableWidget()
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers) # O visualizador NÃO permite edição
+        self.table = QTableView()
+        self.table_model = StreamingSheetTableModel(self, editable=False)
+        self.table_model.rows_loaded.connect(self._update_status_label)
+        self.table.setModel(self.table_model)
+        self.table.setEditTriggers(QTableView.NoEditTriggers) # O visualizador NÃO permite edição
         self.table.setAlternatingRowColors(True)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
         self.table.verticalHeader().setSectionResizeMode(QHeaderView.Interactive)
         self.layout.addWidget(self.table)
+
+        # Indicador de progresso da leitura incremental da planilha
+        self.status_label = QLabel("")
+        self.layout.addWidget(self.status_label)
         
         self._populate_sheet_selector() # Inicia carregando as planilhas
 
@@ -52,19 +77,16 @@ class ExcelViewerTool(QWidget):
         if not os.path.exists(self.file_path):
             QMessageBox.warning(self, "Arquivo Não Encontrado", f"O arquivo '{os.path.basename(self.file_path)}' não foi encontrado.")
             # Limpa a tabela se o arquivo não existe
-            self.table.setRowCount(0)
-            self.table.setColumnCount(0)
+            self.table_model.clear()
             return
 
         try:
-            # Sempre abre em modo de leitura para um visualizador
-            wb = openpyxl.load_workbook(self.file_path, read_only=True)
-            sheet_names = wb.sheetnames
+            # Lista as planilhas pelo cache compartilhado (sem reprocessar o arquivo inteiro)
+            sheet_names = get_sheet_names(self.file_path)
             
             if not sheet_names:
                 QMessageBox.warning(self, "Nenhuma Planilha Encontrada", f"Nenhuma planilha encontrada em '{os.path.basename(self.file_path)}'.")
-                self.table.setRowCount(0)
-                self.table.setColumnCount(0)
+                self.table_model.clear()
             else:
                 for sheet_name in sheet_names:
                     self.sheet_selector.addItem(sheet_name)
@@ -77,59 +99,58 @@ class ExcelViewerTool(QWidget):
 
         except Exception as e:
             QMessageBox.critical(self, "Erro ao Listar Planilhas", f"Erro ao listar planilhas em '{os.path.basename(self.file_path)}': {e}")
-            self.table.setRowCount(0)
-            self.table.setColumnCount(0) # Limpa a tabela em caso de erro
+            self.table_model.clear() # Limpa a tabela em caso de erro
 
     def _load_data_from_selected_sheet(self):
-        """Carrega dados da planilha Excel atualmente selecionada para o QTableWidget."""
+        """Carrega dados da planilha Excel atualmente selecionada para o QTableView, de forma incremental."""
         current_sheet_name = self.sheet_selector.currentText()
+        self.table_model.stop_stream() # Interrompe a leitura da aba anterior e fecha seu workbook
         # Verifica se há uma planilha selecionada e se o arquivo existe
         if not current_sheet_name or not self.file_path or not os.path.exists(self.file_path):
-            self.table.setRowCount(0)
-            self.table.setColumnCount(0)
+            self.table_model.clear()
             return
 
         try:
-            # Abre em modo de leitura
+            # Sempre um workbook próprio, somente leitura: as linhas são lidas do disco sob demanda ao longo de
+            # vários ciclos do event loop, e o workbook do cache compartilhado pode ser alterado por jobs de I/O.
             wb = openpyxl.load_workbook(self.file_path, read_only=True)
             
             if current_sheet_name not in wb.sheetnames:
+                wb.close()
                 QMessageBox.warning(self, "Planilha Não Encontrada", 
                                     f"A planilha '{current_sheet_name}' não foi encontrada em '{os.path.basename(self.file_path)}'.")
-                self.table.setRowCount(0)
-                self.table.setColumnCount(0)
+                self.table_model.clear()
                 return
 
+            self._stream["workbook"] = wb
             sheet = wb[current_sheet_name]
+            rows = sheet.iter_rows(values_only=True)
 
             # Carrega cabeçalhos da primeira linha da planilha. Se não houver, assume 0 colunas.
-            headers = [cell.value for cell in sheet[1]] if sheet.max_row > 0 else []
-            self.table.setColumnCount(len(headers))
-            self.table.setHorizontalHeaderLabels(headers)
-
-            data = []
-            # Itera a partir da segunda linha para os dados
-            for row in sheet.iter_rows(min_row=2): 
-                row_values = [cell.value for cell in row]
-                # Garante que a linha tenha células suficientes para os cabeçalhos
-                while len(row_values) < len(headers):
-                    row_values.append("")
-                data.append(row_values)
-
-            self.table.setRowCount(len(data))
-            for row_idx, row_data in enumerate(data):
-                for col_idx, cell_value in enumerate(row_data):
-                    item = QTableWidgetItem(str(cell_value) if cell_value is not None else "")
-                    self.table.setItem(row_idx, col_idx, item)
+            headers = next(rows, None) or []
+
+            # Exibe o primeiro lote imediatamente; o restante é lido conforme a rolagem e em segundo plano.
+            # O workbook somente leitura (que mantém o arquivo aberto) é fechado ao fim ou na interrupção da leitura.
+            self.table_model.start_stream(headers, rows, on_finished=lambda stream=self._stream: _close_stream_workbook(stream))
 
             self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
             self.table.verticalHeader().setSectionResizeMode(QHeaderView.Interactive)
-            QMessageBox.information(self, "Dados Carregados", f"Dados de '{current_sheet_name}' carregados com sucesso.")
 
         except Exception as e:
             QMessageBox.critical(self, "Erro de Carregamento", f"Erro ao carregar dados da aba '{current_sheet_name}': {e}")
-            self.table.setRowCount(0)
-            self.table.setColumnCount(0) # Limpa a tabela em caso de erro grave
+            self.table_model.clear() # Limpa a tabela em caso de erro grave
+            _close_stream_workbook(self._stream)
+
+    def closeEvent(self, event):
+        self.table_model.stop_stream() # Para o timer de leitura e libera o arquivo
+        super().closeEvent(event)
+
+    def _update_status_label(self, row_count, finished):
+        """Atualiza o indicador com a quantidade de linhas carregadas até o momento."""
+        if finished:
+            self.status_label.setText(f"{row_count} linha(s) carregada(s).")
+        else:
+            self.status_label.setText(f"{row_count} linha(s) carregada(s)... carregando mais")
 
 # Exemplo de uso (para testar este módulo individualmente)
 if __name__ == "__main__":
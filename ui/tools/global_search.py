@@ -0,0 +1,238 @@
+import os
+import bisect
+import threading
+
+import openpyxl
+
+from ui.tools.io_worker import JobCancelled
+from ui.tools.bom_index import normalize_part_id
+from ui.tools.search_index import normalize_text, TOKEN_SPLIT_RE
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+USER_SHEETS_DIR = os.path.join(project_root, "user_sheets")
+APP_SHEETS_DIR = os.path.join(project_root, "app_sheets")
+SEARCH_DIRECTORIES = (USER_SHEETS_DIR, APP_SHEETS_DIR)
+
+MAX_CELL_TEXT_LENGTH = 200 # Textos longos (observações etc.) são indexados só pelas palavras do início
+
+
+def list_directory_entries(directory):
+    """
+    Entradas de um diretório exibidas na árvore de arquivos: (nome, caminho, é_pasta).
+    Ignora arquivos temporários do Excel ('~$'), o db.xlsx de user_sheets e arquivos que não são .xlsx.
+    """
+    entries = []
+    for filename in os.listdir(directory):
+        if filename.startswith('~$'):
+            continue
+        if os.path.basename(directory) == "user_sheets" and filename.lower() == "db.xlsx":
+            continue
+        file_path = os.path.join(directory, filename)
+        if os.path.isdir(file_path):
+            entries.append((filename, file_path, True))
+        elif filename.endswith(".xlsx"):
+            entries.append((filename, file_path, False))
+    return entries
+
+
+def list_searchable_workbooks(directories=SEARCH_DIRECTORIES):
+    """Todos os arquivos .xlsx exibidos na árvore de arquivos (mesma varredura), incluindo subpastas."""
+    paths = []
+    pending = [directory for directory in directories if os.path.isdir(directory)]
+    while pending:
+        directory = pending.pop(0)
+        try:
+            entries = list_directory_entries(directory)
+        except OSError as e:
+            print(f"Aviso: Não foi possível listar {directory}: {e}")
+            continue
+        for _, file_path, is_dir in sorted(entries):
+            if is_dir:
+                pending.append(file_path)
+            else:
+                paths.append(file_path)
+    return paths
+
+
+def _file_stamp(file_path):
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def cell_search_keys(value):
+    """
+    Chaves de busca de uma célula: o valor inteiro normalizado e cada palavra dele.
+    Números inteiros gravados como float (ex: 200001.0) são indexados como '200001'.
+    """
+    text = normalize_text(normalize_part_id(value))
+    if not text:
+        return set()
+    keys = {text[:MAX_CELL_TEXT_LENGTH]}
+    keys.update(token for token in TOKEN_SPLIT_RE.split(text[:MAX_CELL_TEXT_LENGTH]) if token)
+    return keys
+
+
+class WorkbookCellIndex:
+    """Índice das células de um arquivo: chave de busca -> [(planilha, linha, coluna, valor exibido)]."""
+    def __init__(self, file_path, stamp):
+        self.file_path = file_path
+        self.stamp = stamp
+        self.headers = {} # Planilha -> cabeçalhos (primeira linha)
+        self.locations = {}
+        self.cell_count = 0
+        self._sorted_keys = None
+
+    @classmethod
+    def read(cls, file_path, check_cancelled=None):
+        """Lê todas as planilhas do arquivo em modo somente leitura e indexa os valores das células."""
+        stamp = _file_stamp(file_path) # Antes da leitura: uma alteração durante ela será relida na próxima atualização
+        index = cls(file_path, stamp)
+        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            for sheet_name in wb.sheetnames:
+                sheet = wb[sheet_name]
+                if not hasattr(sheet, "iter_rows"):
+                    continue # Planilhas de gráfico
+                for row_number, row in enumerate(sheet.iter_rows(values_only=True), start=1):
+                    if row_number == 1:
+                        index.headers[sheet_name] = ["" if value is None else str(value) for value in row]
+                    if check_cancelled is not None and row_number % 1000 == 0:
+                        check_cancelled()
+                    for column_number, value in enumerate(row, start=1):
+                        if value is None or value == "":
+                            continue
+                        keys = cell_search_keys(value)
+                        if not keys:
+                            continue
+                        location = (sheet_name, row_number, column_number, normalize_part_id(value))
+                        for key in keys:
+                            index.locations.setdefault(key, []).append(location)
+                        index.cell_count += 1
+        finally:
+            wb.close()
+        return index
+
+    def sorted_keys(self):
+        if self._sorted_keys is None:
+            self._sorted_keys = sorted(self.locations)
+        return self._sorted_keys
+
+    def header_for(self, sheet_name, column_number):
+        headers = self.headers.get(sheet_name, [])
+        return headers[column_number - 1] if column_number - 1 < len(headers) else ""
+
+
+class GlobalSearchIndex:
+    """
+    Busca de valores em todas as planilhas de user_sheets e app_sheets (arquivo, planilha, linha e coluna).
+    Cada arquivo tem seu próprio índice de células, refeito apenas quando o arquivo muda (tamanho/mtime);
+    arquivos novos são incluídos e arquivos removidos saem do índice a cada refresh().
+    """
+    def __init__(self, directories=SEARCH_DIRECTORIES):
+        self.directories = directories
+        self.files = {} # Caminho -> WorkbookCellIndex
+        self.errors = {} # Caminho -> mensagem do último erro de leitura
+        self._lock = threading.Lock()
+
+    def refresh(self, check_cancelled=None, report_progress=None):
+        """
+        Atualiza o índice com o conteúdo atual das pastas, relendo somente os arquivos alterados.
+        Retorna a quantidade de arquivos relidos.
+        """
+        paths = list_searchable_workbooks(self.directories)
+        with self._lock:
+            for removed_path in set(self.files) - set(paths):
+                del self.files[removed_path]
+            changed = [path for path in paths
+                       if path not in self.files or self.files[path].stamp != _file_stamp(path)]
+        for position, path in enumerate(changed, start=1):
+            if check_cancelled is not None:
+                check_cancelled()
+            if report_progress is not None:
+                report_progress(int(position * 100 / len(changed)), f"Indexando {os.path.basename(path)}...")
+            try:
+                file_index = WorkbookCellIndex.read(path, check_cancelled)
+            except JobCancelled:
+                raise
+            except Exception as e: # Arquivo corrompido ou aberto por outro programa: os demais continuam pesquisáveis
+                with self._lock:
+                    self.files.pop(path, None)
+                    self.errors[path] = str(e)
+                continue
+            with self._lock:
+                self.files[path] = file_index
+                self.errors.pop(path, None)
+        return len(changed)
+
+    def search(self, query, limit=200):
+        """
+        Procura 'query' nas células indexadas. Retorna (total, [resultados até 'limit']), cada resultado um
+        dicionário com file_path, sheet, row, column, header e value.
+        Ordem: célula com o valor exato, depois célula com uma palavra igual ao termo, depois palavras ou
+        valores que começam pelo termo; em cada grupo, por arquivo, planilha, linha e coluna.
+        """
+        term = normalize_text(query).strip()
+        if not term:
+            return 0, []
+        ranked = []
+        with self._lock:
+            for file_path, file_index in self.files.items():
+                relative_path = os.path.relpath(file_path, project_root)
+                keys = file_index.sorted_keys()
+                start = bisect.bisect_left(keys, term)
+                seen = set()
+                for key in keys[start:]:
+                    if not key.startswith(term):
+                        break
+                    for location in file_index.locations[key]:
+                        if location in seen:
+                            continue
+                        seen.add(location)
+                        value_key = normalize_text(location[3])
+                        score = 0 if value_key == term else 1 if key == term else 2
+                        ranked.append((score, relative_path, location, file_index))
+        ranked.sort(key=lambda entry: (entry[0], entry[1], entry[2][0], entry[2][1], entry[2][2]))
+        results = [{
+            "file_path": file_index.file_path,
+            "relative_path": relative_path,
+            "sheet": location[0],
+            "row": location[1],
+            "column": location[2],
+            "header": file_index.header_for(location[0], location[2]),
+            "value": location[3],
+        } for _, relative_path, location, file_index in ranked[:limit]]
+        return len(ranked), results
+
+    def stats(self):
+        """(arquivos indexados, células indexadas)."""
+        with self._lock:
+            return len(self.files), sum(file_index.cell_count for file_index in self.files.values())
+
+
+_global_index = None
+_global_index_lock = threading.Lock()
+
+
+def get_global_search_index():
+    """Retorna o GlobalSearchIndex compartilhado no processo (barra de busca e mini-console)."""
+    global _global_index
+    with _global_index_lock:
+        if _global_index is None:
+            _global_index = GlobalSearchIndex()
+        return _global_index
+
+
+def refresh_global_search(job):
+    """Job do IOService: atualiza o índice global relendo apenas os arquivos alterados."""
+    return get_global_search_index().refresh(job.check_cancelled, job.report_progress)
+
+
+def run_global_search(job, query, limit=200):
+    """Job do IOService: atualiza o índice (só arquivos alterados) e busca 'query'. Retorna (total, resultados)."""
+    index = get_global_search_index()
+    index.refresh(job.check_cancelled, job.report_progress)
+    job.report_progress(-1, f"Buscando '{query}'...")
+    return index.search(query, limit)
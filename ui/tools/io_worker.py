@@ -0,0 +1,339 @@
+import os
+import threading
+
+import openpyxl
+from PyQt5.QtWidgets import QWidget, QHBoxLayout, QLabel, QProgressBar, QPushButton, QMessageBox
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from ui.tools.workbook_cache import get_workbook, save_workbook, invalidate_workbook, workbook_lock
+
+# A cada quantas linhas os jobs de leitura/gravação reportam progresso e verificam o cancelamento.
+PROGRESS_INTERVAL_ROWS = 1000
+
+
+class JobCancelled(Exception):
+    """Lançada dentro de um job quando o cancelamento foi solicitado."""
+    pass
+
+
+class IOJobSignals(QObject):
+    """
+    Sinais de um IOJob. São emitidos na thread do pool e entregues na thread da GUI
+    (conexão enfileirada), onde o resultado pode ser aplicado com segurança aos widgets.
+    """
+    progress = pyqtSignal(int, str) # (percentual 0-100, ou -1 se indeterminado; mensagem)
+    finished = pyqtSignal(object) # Resultado retornado pela função do job
+    failed = pyqtSignal(str) # Mensagem de erro
+    cancelled = pyqtSignal()
+
+
+class IOJob(QRunnable):
+    """
+    Executa fn(job, *args, **kwargs) em uma thread do QThreadPool.
+    A função recebe o próprio job para reportar progresso (job.report_progress) e
+    verificar cancelamento (job.check_cancelled, que lança JobCancelled).
+    """
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = IOJobSignals()
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        """Solicita o cancelamento; a função do job o percebe na próxima verificação."""
+        self._cancel_event.set()
+
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def report_progress(self, percent, message=""):
+        self.signals.progress.emit(int(percent), message)
+
+    def run(self):
+        try:
+            result = self.fn(self, *self.args, **self.kwargs)
+        except JobCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        else:
+            # Um cancelamento pedido depois da última verificação não desfaz o trabalho já concluído
+            self.signals.finished.emit(result)
+
+
+class IOService:
+    """Serviço de I/O compartilhado: executa os jobs de leitura/gravação de planilhas fora da thread da GUI."""
+    def __init__(self, max_threads=None):
+        self.thread_pool = QThreadPool()
+        if max_threads:
+            self.thread_pool.setMaxThreadCount(max_threads)
+
+    def start(self, job):
+        """Coloca o job na fila do pool. Os sinais de job.signals devem ser conectados antes."""
+        self.thread_pool.start(job)
+        return job
+
+
+_shared_io_service = None
+
+def get_io_service():
+    """Retorna o IOService do processo (criado sob demanda, após a QApplication)."""
+    global _shared_io_service
+    if _shared_io_service is None:
+        _shared_io_service = IOService()
+    return _shared_io_service
+
+
+# --- Funções de job usadas pelas ferramentas de tabela ---
+
+def load_workbook(job, file_path):
+    """Carrega (ou obtém do cache compartilhado) o workbook completo do arquivo."""
+    job.report_progress(-1, f"Lendo '{os.path.basename(file_path)}'...")
+    return get_workbook(file_path)
+
+
+def add_sheet_and_save(job, file_path, sheet_name):
+    """
+    Cria uma planilha vazia no arquivo (criando o arquivo, se ele não existir) e o salva.
+    O workbook é obtido do cache com o lock adquirido, nunca de uma cópia guardada pelo widget,
+    que pode já ter sido substituída por outra gravação. Retorna o workbook salvo.
+    """
+    with workbook_lock(file_path):
+        try:
+            job.report_progress(-1, f"Lendo '{os.path.basename(file_path)}'...")
+            if os.path.exists(file_path):
+                wb = get_workbook(file_path)
+            else:
+                wb = openpyxl.Workbook()
+                del wb[wb.active.title] # Remove a sheet padrão
+            if sheet_name in wb.sheetnames:
+                raise ValueError(f"Uma planilha com o nome '{sheet_name}' já existe neste arquivo.")
+            wb.create_sheet(title=sheet_name)
+            job.report_progress(-1, f"Salvando '{os.path.basename(file_path)}'...")
+            save_workbook(wb, file_path)
+        except BaseException:
+            invalidate_workbook(file_path) # Descarta alterações parciais feitas no workbook compartilhado
+            raise
+    return wb
+
+
+def read_sheet_data(job, file_path, sheet_name, create_missing=True):
+    """
+    Lê cabeçalhos e linhas (valores) de uma planilha pelo cache compartilhado.
+    Se a planilha não existir e 'create_missing' for True, cria-a vazia e salva o arquivo.
+    Retorna {"sheet_created": bool, "headers": [...], "rows": [...]}.
+    """
+    with workbook_lock(file_path):
+        job.report_progress(-1, f"Lendo '{os.path.basename(file_path)}'...")
+        wb = get_workbook(file_path)
+        job.check_cancelled()
+
+        if sheet_name not in wb.sheetnames:
+            if not create_missing:
+                raise KeyError(f"A planilha '{sheet_name}' não foi encontrada em '{os.path.basename(file_path)}'.")
+            wb.create_sheet(sheet_name)
+            save_workbook(wb, file_path) # Salva a nova sheet vazia
+            return {"sheet_created": True, "headers": [], "rows": []}
+
+        sheet = wb[sheet_name]
+        headers = [cell.value for cell in sheet[1]] if sheet.max_row > 0 else []
+        total_rows = max(sheet.max_row - 1, 1)
+        rows = []
+        for row in sheet.iter_rows(min_row=2, values_only=True):
+            rows.append(row)
+            if len(rows) % PROGRESS_INTERVAL_ROWS == 0:
+                job.check_cancelled()
+                job.report_progress(len(rows) * 100 // total_rows, f"{len(rows)} linha(s) lida(s)...")
+        return {"sheet_created": False, "headers": headers, "rows": rows}
+
+
+def _trim_trailing_none(values):
+    values = list(values)
+    while values and values[-1] is None:
+        values.pop()
+    return values
+
+
+def _header_row(ws):
+    """Cabeçalhos (primeira linha) da planilha em disco, sem as células vazias do final."""
+    for row in ws.iter_rows(min_row=1, max_row=1, values_only=True):
+        return _trim_trailing_none(row)
+    return []
+
+
+def write_sheet_data(job, file_path, sheet_name, save_plan, convert_value=None):
+    """
+    Grava na planilha o 'save_plan' montado por SheetTableModel.build_save_plan() e salva o arquivo.
+    No modo "delta", apenas as linhas alteradas/inseridas são escritas e as linhas excedentes do final
+    são removidas de uma só vez; no modo "full" (ou se as linhas ou os cabeçalhos da planilha em disco
+    não corresponderem mais ao que foi carregado), a planilha é limpa com uma única chamada a delete_rows e reescrita.
+    'convert_value' (opcional) converte cada valor escrito (ex: cell_types.to_cell_value).
+    Em caso de falha ou cancelamento, o workbook compartilhado é descartado do cache.
+    Retorna a quantidade de linhas de dados escritas.
+    """
+    headers = save_plan["headers"]
+    rows = save_plan["rows"]
+
+    def converted(row_values):
+        if convert_value is None:
+            return list(row_values)
+        return [convert_value(value) for value in row_values]
+
+    with workbook_lock(file_path):
+        try:
+            job.report_progress(-1, f"Preparando '{os.path.basename(file_path)}'...")
+            if not os.path.exists(file_path):
+                wb = openpyxl.Workbook()
+                ws = wb.active
+                ws.title = sheet_name
+            else:
+                wb = get_workbook(file_path)
+                # Cria a sheet se ela não existe no workbook
+                if sheet_name not in wb.sheetnames:
+                    ws = wb.create_sheet(sheet_name)
+                else:
+                    ws = wb[sheet_name]
+
+            # O modo delta só é seguro se a planilha ainda tiver as linhas e as colunas que foram carregadas
+            # (ex: create_or_update_sheets pode ter reorganizado os cabeçalhos com a ferramenta aberta)
+            use_delta = (save_plan["mode"] == "delta" and ws.max_row == save_plan["loaded_row_count"] + 1
+                         and _header_row(ws) == _trim_trailing_none(headers))
+
+            if use_delta:
+                changed_rows = save_plan["changed_rows"]
+                total = max(len(changed_rows), 1)
+                for count, row_idx in enumerate(changed_rows, start=1):
+                    excel_row = row_idx + 2
+                    row_values = converted(rows[row_idx])
+                    # Atribuição explícita: ws.cell(..., value=None) não altera a célula, e uma célula
+                    # apagada na tabela precisa ser apagada também no arquivo.
+                    for col_idx, value in enumerate(row_values, start=1):
+                        ws.cell(row=excel_row, column=col_idx).value = value
+                    # Colunas além do fim de uma linha que ficou mais curta
+                    for col_idx in range(len(row_values) + 1, ws.max_column + 1):
+                        ws.cell(row=excel_row, column=col_idx).value = None
+                    if count % PROGRESS_INTERVAL_ROWS == 0:
+                        job.check_cancelled()
+                        job.report_progress(count * 100 // total, f"{count} linha(s) alterada(s) gravada(s)...")
+                # Linhas removidas do final da tabela: corta o excedente com uma única chamada
+                last_row = len(rows) + 1
+                if ws.max_row > last_row:
+                    ws.delete_rows(last_row + 1, ws.max_row - last_row)
+                written = len(changed_rows)
+            else:
+                # Limpa todas as linhas existentes na planilha de uma só vez
+                if ws.max_row > 0:
+                    ws.delete_rows(1, ws.max_row)
+
+                # Salva os cabeçalhos se existirem (se o usuário digitou ou eles foram carregados)
+                if headers:
+                    ws.append(list(headers))
+
+                total = max(len(rows), 1)
+                for row_number, row_values in enumerate(rows, start=1):
+                    ws.append(converted(row_values))
+                    if row_number % PROGRESS_INTERVAL_ROWS == 0:
+                        job.check_cancelled()
+                        job.report_progress(row_number * 100 // total, f"{row_number} linha(s) gravada(s)...")
+                written = len(rows)
+
+            job.check_cancelled()
+            job.report_progress(-1, f"Salvando '{os.path.basename(file_path)}'...")
+            save_workbook(wb, file_path)
+        except BaseException:
+            invalidate_workbook(file_path) # Descarta alterações parciais feitas no workbook compartilhado
+            raise
+    return written
+
+
+class IOStatusBar(QWidget):
+    """
+    Barra de status de I/O de uma ferramenta: mostra o progresso do job atual e permite cancelá-lo.
+    Também garante que apenas o resultado do job mais recente seja aplicado ao widget.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._job = None
+        self._replaceable = True
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.message_label = QLabel("")
+        layout.addWidget(self.message_label, 1)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setMaximumWidth(200)
+        layout.addWidget(self.progress_bar)
+        self.cancel_btn = QPushButton("Cancelar")
+        self.cancel_btn.clicked.connect(self.cancel)
+        layout.addWidget(self.cancel_btn)
+        self.setVisible(False)
+
+    def is_busy(self):
+        return self._job is not None
+
+    def run(self, fn, *args, message="", replaceable=True,
+            on_finished=None, on_failed=None, on_cancelled=None, on_progress=None, **kwargs):
+        """
+        Submete fn ao IOService e acompanha o job.
+        Um job 'replaceable' (ex: leitura) é cancelado se outro for iniciado; se o job atual não for
+        substituível (ex: gravação), o novo não é iniciado e None é retornado.
+        'on_progress(percentual, mensagem)' (opcional) recebe também cada progresso do job, na thread da GUI.
+        """
+        if self._job is not None:
+            if not self._replaceable:
+                QMessageBox.warning(self.window(), "Operação em Andamento",
+                                    "Aguarde a conclusão da gravação em andamento ou cancele-a.")
+                return None
+            # Substitui o job atual: ele é cancelado e seu resultado será ignorado
+            self._job.cancel()
+            self._job = None
+
+        job = IOJob(fn, *args, **kwargs)
+        job.signals.progress.connect(lambda percent, text, j=job: self._on_progress(j, percent, text, on_progress))
+        job.signals.finished.connect(lambda result, j=job: self._on_done(j, on_finished, result))
+        job.signals.failed.connect(lambda error, j=job: self._on_done(j, on_failed, error))
+        job.signals.cancelled.connect(lambda j=job: self._on_done(j, on_cancelled))
+        self._job = job
+        self._replaceable = replaceable
+
+        self.message_label.setText(message)
+        self.progress_bar.setRange(0, 0) # Indeterminado até o primeiro progresso
+        self.cancel_btn.setEnabled(True)
+        self.setVisible(True)
+        get_io_service().start(job)
+        return job
+
+    def cancel(self):
+        """Solicita o cancelamento do job atual; 'on_cancelled' é chamado quando o job o confirmar."""
+        if self._job is not None:
+            self._job.cancel()
+            self.cancel_btn.setEnabled(False)
+            self.message_label.setText("Cancelando...")
+
+    def _on_progress(self, job, percent, text, callback=None):
+        if job is not self._job or job.is_cancelled():
+            return
+        if callback is not None:
+            callback(percent, text)
+        if percent < 0:
+            self.progress_bar.setRange(0, 0)
+        else:
+            self.progress_bar.setRange(0, 100)
+            self.progress_bar.setValue(min(percent, 100))
+        if text:
+            self.message_label.setText(text)
+
+    def _on_done(self, job, callback, *args):
+        if job is not self._job:
+            return # Resultado de um job cancelado ou substituído
+        self._job = None
+        self._replaceable = True
+        self.setVisible(False)
+        if callback is not None:
+            callback(*args)
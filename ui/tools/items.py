@@ -1,115 +1,70 @@
 import sys
 import os
 import openpyxl
-from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QTableWidget, QTableWidgetItem, QHBoxLayout, QMessageBox, QHeaderView, QLabel, QComboBox, QInputDialog
-from PyQt5.QtCore import Qt, QVariant # Importar QVariant para tipos de dados (embora pouco usado diretamente agora)
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QTableView, QHBoxLayout, QMessageBox, QHeaderView, QLabel, QComboBox, QInputDialog
+from PyQt5.QtCore import Qt
 import datetime # Para validação de data
 
+# Garante que a raiz do projeto esteja no sys.path para importar os módulos compartilhados de ui.tools
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from ui.tools.workbook_cache import get_sheet_names
+from ui.tools.io_worker import IOStatusBar, read_sheet_data, write_sheet_data
+from ui.tools.sheet_table_model import SheetTableModel
+from ui.tools.cell_types import ITEM_COLUMN_TYPES, coerce_value, to_cell_value
+
 # Define o nome do arquivo Excel padrão para esta ferramenta
 DEFAULT_DATA_EXCEL_FILENAME = "estoque.xlsx" # O nome do arquivo parece ser "estoque.xlsx" para itens/movimentações
 DEFAULT_SHEET_NAME = "Movimentacoes" # Nome da planilha padrão alterado para "Movimentacoes" para clareza
 
 # ITEMS_HEADERS FOI REMOVIDO. Os cabeçalhos serão lidos da primeira linha da planilha.
 
-# Mapeamento para tipos de dados esperados para validação (cabeçalho da coluna: tipo)
-# Este mapeamento define as REGRAS de validação para colunas COM ESTES NOMES.
-# Se um cabeçalho de coluna não estiver nesta lista, o tipo padrão será str.
-ITEM_COLUMN_TYPES = {
-    "quantidade_movimentada": float, 
-    "custo_unitario_movimentacao": float, 
-    "data_movimentacao": datetime.date, 
-    "validade_lote": datetime.date, 
-    "id_movimentacao": int,
-    "id_item": int,
-    "responsavel_movimentacao": int,
-    "saldo_final_deposito": float,
-    "estoque_em_transito": float,
-    "estoque_disponivel_para_venda": float
-}
-
-class ValidatingTableWidgetItem(QTableWidgetItem):
+# O mapeamento de tipos esperados por coluna (ITEM_COLUMN_TYPES) e as regras de conversão
+# ficam em ui/tools/cell_types.py, compartilhados com as demais ferramentas de tabela.
+
+class ValidatingSheetTableModel(SheetTableModel):
     """
-    QTableWidgetItem personalizado que realiza validação básica de tipo
-    quando os dados são definidos, com base no nome da coluna e tipo esperado.
+    SheetTableModel que realiza validação básica de tipo quando os dados são editados,
+    com base no nome da coluna e no tipo esperado (ITEM_COLUMN_TYPES).
+    Os valores brutos (já convertidos) ficam no modelo; a formatação de exibição é feita
+    apenas para as células visíveis.
     """
-    def __init__(self, text="", col_name="", col_type=str):
-        super().__init__(text)
-        self.col_name = col_name
-        self.col_type = col_type
-        # Armazena o valor bruto para evitar problemas de formatação na exibição vs. valor real
-        self._raw_value = text 
-
-    def data(self, role: int):
-        if role == Qt.EditRole:
-            # Retorna o valor bruto quando o editor solicita os dados
-            return self._raw_value
-        return super().data(role)
-
-    def setData(self, role, value):
-        if role == Qt.EditRole:
-            try:
-                # Tenta converter o valor de entrada para o tipo esperado
-                converted_value = None
-                if self.col_type == int:
-                    converted_value = int(value)
-                elif self.col_type == float:
-                    # Substitui vírgula por ponto para conversão de float
-                    converted_value = float(str(value).replace(',', '.'))
-                elif self.col_type == datetime.date:
-                    if isinstance(value, datetime.date): # Se já for um objeto de data
-                        converted_value = value
-                    else:
-                        date_str = str(value).strip()
-                        if not date_str: # Permite datas vazias
-                            converted_value = None # Salva como None ou string vazia no Excel
-                        else:
-                            # Tenta múltiplos formatos de data
-                            formats = ["%Y-%m-%d", "%d/%m/%Y", "%Y/%m/%d", "%d-%m-%Y"]
-                            parsed = False
-                            for fmt in formats:
-                                try:
-                                    converted_value = datetime.datetime.strptime(date_str, fmt).date()
-                                    parsed = True
-                                    break
-                                except ValueError:
-                                    continue
-                            if not parsed:
-                                raise ValueError(f"Formato de data inválido para '{self.col_name}': '{value}'. Esperado um formato como YYYY-MM-DD ou DD/MM/YYYY.")
-                else: # Padrão para string para outros tipos
-                    converted_value = str(value)
-                
-                # Armazena o valor bruto convertido
-                self._raw_value = converted_value
-
-                # Define o texto exibido na célula
-                value_to_display = ""
-                if converted_value is not None:
-                    if self.col_type == float:
-                        # Exibe float com vírgula como separador decimal
-                        value_to_display = str(converted_value).replace('.', ',')
-                    elif self.col_type == datetime.date:
-                        # Exibe data formatada como DD/MM/AAAA
-                        value_to_display = converted_value.strftime("%d/%m/%Y")
-                    else:
-                        value_to_display = str(converted_value)
-                
-                super().setData(role, value_to_display)
-                self.setToolTip("") # Limpa qualquer dica de ferramenta de erro anterior
-            except ValueError as e:
-                # Se a validação falhar, exibe uma mensagem e reverte o valor na célula
-                QMessageBox.warning(self.tableWidget().parentWidget(), "Erro de Validação", 
-                                    f"Valor inválido para a coluna '{self.col_name}': '{value}'. "
-                                    f"Esperado tipo '{self.col_type.__name__}'. Detalhes: {e}")
-                self.setToolTip(f"Erro: Esperado {self.col_type.__name__}. Inserido: '{value}'")
-                # Não chama super().setData(role, self.text()) para não sobrescrever o valor antigo
-                # e manter o valor inválido visualmente para o usuário se preferir
-                # ou pode reverter para o valor anterior (self._raw_value)
-                super().setData(role, str(self._raw_value) if self._raw_value is not None else "") # Reverte para o último valor válido
-            except Exception as e:
-                QMessageBox.critical(self.tableWidget().parentWidget(), "Erro Inesperado", f"Um erro inesperado ocorreu na validação: {e}")
-                super().setData(role, str(self._raw_value) if self._raw_value is not None else "")
-        else:
-            super().setData(role, value)
+    def column_type(self, column):
+        """Retorna o tipo esperado da coluna, padrão para string se não estiver no mapeamento."""
+        return ITEM_COLUMN_TYPES.get(self._headers[column], str)
+
+    def display_text(self, row, column):
+        value = self._columns[column][row]
+        if value is None:
+            return ""
+        col_type = self.column_type(column)
+        if col_type == datetime.date and isinstance(value, datetime.date):
+            # Exibe data formatada como DD/MM/AAAA
+            return value.strftime("%d/%m/%Y")
+        if col_type == float and isinstance(value, (int, float)):
+            # Exibe float com vírgula como separador decimal
+            return str(float(value)).replace('.', ',')
+        return str(value)
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        col_name = self._headers[index.column()]
+        col_type = self.column_type(index.column())
+        try:
+            converted_value = coerce_value(value, col_type, col_name)
+        except ValueError as e:
+            # Se a validação falhar, exibe uma mensagem e mantém o último valor válido
+            QMessageBox.warning(self.parent(), "Erro de Validação", 
+                                f"Valor inválido para a coluna '{col_name}': '{value}'. "
+                                f"Esperado tipo '{col_type.__name__}'. Detalhes: {e}")
+            return False
+        except Exception as e:
+            QMessageBox.critical(self.parent(), "Erro Inesperado", f"Um erro inesperado ocorreu na validação: {e}")
+            return False
+        return super().setData(index, converted_value, role)
 
 class ItemsTool(QWidget):
     """
@@ -118,7 +73,7 @@ class ItemsTool(QWidget):
     Os cabeçalhos da tabela são carregados EXCLUSIVAMENTE da primeira linha do arquivo Excel.
     Se a planilha estiver vazia, os cabeçalhos serão definidos pelo usuário ao adicionar a primeira linha.
     Pode operar em modo somente leitura se o arquivo for 'engenharia.xlsx' ou explicitamente definido.
-    Inclui validação de input para tipos de dados usando ValidatingTableWidgetItem.
+    Inclui validação de input para tipos de dados usando ValidatingSheetTableModel.
     """
     def __init__(self, file_path=None, read_only=False): 
         super().__init__()
@@ -160,18 +115,24 @@ class ItemsTool(QWidget):
         header_layout.addWidget(self.refresh_sheets_btn)
         self.layout.addLayout(header_layout)
 
-        self.table = QTableWidget()
+        self.table = QTableView()
+        self.table_model = ValidatingSheetTableModel(self)
+        self.table.setModel(self.table_model)
         # Define o trigger de edição com base no modo somente leitura
         if self.is_read_only:
-            self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+            self.table.setEditTriggers(QTableView.NoEditTriggers)
         else:
-            self.table.setEditTriggers(QTableWidget.DoubleClicked | QTableWidget.AnyKeyPressed)
+            self.table.setEditTriggers(QTableView.DoubleClicked | QTableView.AnyKeyPressed)
         
         self.table.setAlternatingRowColors(True)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
         self.table.verticalHeader().setSectionResizeMode(QHeaderView.Interactive)
         self.layout.addWidget(self.table)
 
+        # Progresso/cancelamento das leituras e gravações feitas em segundo plano
+        self.io_status = IOStatusBar(self)
+        self.layout.addWidget(self.io_status)
+
         button_layout = QHBoxLayout()
         self.add_row_btn = QPushButton("Adicionar Linha")
         self.add_row_btn.clicked.connect(self._add_empty_row)
@@ -206,14 +167,12 @@ class ItemsTool(QWidget):
                                 f"Ele será criado com a aba padrão '{DEFAULT_SHEET_NAME}' ao salvar. "
                                 "Os cabeçalhos serão definidos ao adicionar e salvar a primeira linha de dados.")
             self.sheet_selector.addItem(DEFAULT_SHEET_NAME)
-            self.table.setRowCount(0)
-            self.table.setColumnCount(0) # Inicia com 0 colunas, aguardando cabeçalhos do arquivo ou do usuário
+            self.table_model.clear() # Inicia com 0 colunas, aguardando cabeçalhos do arquivo ou do usuário
             return
 
         try:
-            # Abre em modo somente leitura para listar planilhas para evitar travar o arquivo
-            wb = openpyxl.load_workbook(self.file_path, read_only=True)
-            sheet_names = wb.sheetnames
+            # Lista as planilhas pelo cache compartilhado (sem reprocessar o arquivo inteiro)
+            sheet_names = get_sheet_names(self.file_path)
             
             if not sheet_names:
                 self.sheet_selector.addItem(DEFAULT_SHEET_NAME)
@@ -236,94 +195,56 @@ class ItemsTool(QWidget):
         except Exception as e:
             QMessageBox.critical(self, "Erro ao Listar Planilhas", f"Erro ao listar planilhas em '{os.path.basename(self.file_path)}': {e}")
             self.sheet_selector.addItem(DEFAULT_SHEET_NAME) # Fallback
-            self.table.setRowCount(0)
-            self.table.setColumnCount(0)
+            self.table_model.clear()
 
     def _load_data_from_selected_sheet(self):
         """
-        Carrega dados da planilha Excel atualmente selecionada para o QTableWidget.
+        Carrega (em segundo plano) os dados da planilha Excel atualmente selecionada para o QTableView.
         Os cabeçalhos são lidos da primeira linha da planilha.
         """
         current_sheet_name = self.sheet_selector.currentText()
         if not current_sheet_name or not self.file_path or not os.path.exists(self.file_path):
-            self.table.setRowCount(0)
-            self.table.setColumnCount(0)
+            self.table_model.clear()
             return
 
-        try:
-            # Sempre carregamos o workbook em modo de escrita/leitura para poder editar e salvar.
-            # O controle de somente leitura é feito a nível de GUI (desabilitando botões e triggers de edição).
-            wb = openpyxl.load_workbook(self.file_path)
-            
-            if current_sheet_name not in wb.sheetnames:
-                QMessageBox.information(self, "Planilha Não Encontrada", 
-                                        f"A planilha '{current_sheet_name}' não foi encontrada em '{os.path.basename(self.file_path)}'. "
-                                        "Criando uma nova. Os cabeçalhos serão definidos ao adicionar e salvar a primeira linha de dados.")
-                ws = wb.create_sheet(current_sheet_name)
-                wb.save(self.file_path) # Salva a nova sheet vazia para que apareça no seletor
-                self._populate_sheet_selector() # Recarrega o seletor para incluir a nova planilha
-                return # Retorna para carregar a sheet recém-criada, que estará vazia
-
-            sheet = wb[current_sheet_name]
-
-            # Carrega cabeçalhos da primeira linha da planilha
-            headers = [cell.value for cell in sheet[1]] if sheet.max_row > 0 else []
-            
-            if not headers: 
-                self.table.setColumnCount(0)
-                self.table.setRowCount(0)
-                QMessageBox.information(self, "Planilha Vazia", 
-                                        f"A planilha '{current_sheet_name}' está vazia ou não possui cabeçalhos. "
-                                        "Adicione uma linha para definir os cabeçalhos.")
-                return
-            
-            self.table.setColumnCount(len(headers))
-            self.table.setHorizontalHeaderLabels(headers)
-
-            data = []
-            for row in sheet.iter_rows(min_row=2): # Começa da segunda linha para os dados
-                row_values = [cell.value for cell in row]
-                # Preenche com vazios se a linha for mais curta que o número de cabeçalhos
-                while len(row_values) < len(headers):
-                    row_values.append("")
-                data.append(row_values)
-
-            self.table.setRowCount(len(data))
-            for row_idx, row_data in enumerate(data):
-                for col_idx, cell_value in enumerate(row_data):
-                    header_name = headers[col_idx]
-                    # Tenta obter o tipo da coluna, padrão para string se não estiver no mapeamento
-                    col_type = ITEM_COLUMN_TYPES.get(header_name, str) 
-                    
-                    # Cria o ValidatingTableWidgetItem para cada célula
-                    item = ValidatingTableWidgetItem(str(cell_value) if cell_value is not None else "", header_name, col_type)
-                    
-                    # Para tipos como datetime.date, certifique-se de que o valor bruto seja o objeto de data
-                    if col_type == datetime.date and isinstance(cell_value, datetime.datetime):
-                        item._raw_value = cell_value.date()
-                        item.setText(cell_value.strftime("%d/%m/%Y")) # Formato de exibição
-                    elif col_type == float and isinstance(cell_value, (int, float)):
-                        item._raw_value = float(cell_value)
-                        item.setText(str(float(cell_value)).replace('.', ',')) # Formato de exibição
-                    else:
-                        item._raw_value = cell_value # Armazena o valor bruto
-                        item.setText(str(cell_value) if cell_value is not None else "") # Exibe como string
-                        
-
-                    self.table.setItem(row_idx, col_idx, item)
-
-            self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
-            self.table.verticalHeader().setSectionResizeMode(QHeaderView.Interactive)
-            QMessageBox.information(self, "Dados Carregados", f"Dados de '{current_sheet_name}' carregados com sucesso.")
+        # A leitura é feita pelo IOService, fora da thread da GUI; o resultado é aplicado em _on_sheet_data_loaded
+        self.io_status.run(read_sheet_data, self.file_path, current_sheet_name,
+                           message=f"Carregando '{current_sheet_name}'...",
+                           on_finished=lambda result, name=current_sheet_name: self._on_sheet_data_loaded(name, result),
+                           on_failed=lambda error, name=current_sheet_name: self._on_sheet_load_failed(name, error))
+
+    def _on_sheet_data_loaded(self, current_sheet_name, result):
+        """Aplica à tabela os dados lidos em segundo plano."""
+        # A planilha não existia no arquivo: foi criada vazia e o seletor é recarregado
+        if result["sheet_created"]:
+            QMessageBox.information(self, "Planilha Não Encontrada", 
+                                    f"A planilha '{current_sheet_name}' não foi encontrada em '{os.path.basename(self.file_path)}'. "
+                                    "Criando uma nova. Os cabeçalhos serão definidos ao adicionar e salvar a primeira linha de dados.")
+            self._populate_sheet_selector()
+            return
 
-        except Exception as e:
-            QMessageBox.critical(self, "Erro de Carregamento", f"Erro ao carregar dados de itens da aba '{current_sheet_name}': {e}")
-            self.table.setRowCount(0)
-            self.table.setColumnCount(0) 
+        headers = result["headers"]
+        if not headers: 
+            self.table_model.clear()
+            QMessageBox.information(self, "Planilha Vazia", 
+                                    f"A planilha '{current_sheet_name}' está vazia ou não possui cabeçalhos. "
+                                    "Adicione uma linha para definir os cabeçalhos.")
+            return
+
+        # O modelo guarda os valores brutos por coluna; a formatação por tipo é feita só nas células visíveis
+        self.table_model.set_sheet_data(headers, result["rows"])
+
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        QMessageBox.information(self, "Dados Carregados", f"Dados de '{current_sheet_name}' carregados com sucesso.")
+
+    def _on_sheet_load_failed(self, current_sheet_name, error):
+        QMessageBox.critical(self, "Erro de Carregamento", f"Erro ao carregar dados de itens da aba '{current_sheet_name}': {error}")
+        self.table_model.clear()
 
     def _save_data(self):
         """
-        Salva dados do QTableWidget de volta para a planilha Excel, capturando os cabeçalhos da tabela.
+        Salva dados do QTableView de volta para a planilha Excel, capturando os cabeçalhos da tabela.
         Respeita o modo somente leitura.
         """
         if self.is_read_only: 
@@ -339,82 +260,69 @@ class ItemsTool(QWidget):
             QMessageBox.warning(self, "Nome da Planilha Inválido", "O nome da planilha não pode estar vazio. Por favor, selecione ou adicione uma aba.")
             return
 
-        try:
-            wb = None
-            if not os.path.exists(self.file_path):
-                wb = openpyxl.Workbook()
-                ws = wb.active
-                ws.title = current_sheet_name
-            else:
-                wb = openpyxl.load_workbook(self.file_path)
-                if current_sheet_name not in wb.sheetnames:
-                    ws = wb.create_sheet(current_sheet_name)
-                else:
-                    ws = wb[current_sheet_name]
-            
-            # Limpa todas as linhas existentes na planilha
-            for row_idx in range(ws.max_row, 0, -1):
-                ws.delete_rows(row_idx)
+        if not self.table_model.is_modified() and os.path.exists(self.file_path):
+            QMessageBox.information(self, "Nada a Salvar", "Não há alterações a serem salvas.")
+            return
 
-            # Obtém os cabeçalhos atuais da QTableWidget.
-            current_headers = [self.table.horizontalHeaderItem(col).text() 
-                               for col in range(self.table.columnCount())]
-            
-            # Salva os cabeçalhos se existirem na tabela
-            if current_headers:
-                ws.append(current_headers)
-            
-            # Percorre o QTableWidget e adiciona as linhas ao Excel
-            for row_idx in range(self.table.rowCount()):
-                row_data = []
-                for col_idx in range(self.table.columnCount()):
-                    item = self.table.item(row_idx, col_idx)
-                    
-                    # Obtém o valor bruto armazenado no ValidatingTableWidgetItem
-                    cell_value_to_save = item._raw_value if item else ""
-                    
-                    # Se o valor é um objeto datetime.date, salva-o como tal para openpyxl
-                    if isinstance(cell_value_to_save, datetime.date):
-                        row_data.append(cell_value_to_save)
-                    else:
-                        row_data.append(str(cell_value_to_save) if cell_value_to_save is not None else "")
-                ws.append(row_data)
-
-            wb.save(self.file_path)
-            QMessageBox.information(self, "Dados Salvos", f"Dados de '{current_sheet_name}' salvos com sucesso em '{os.path.basename(self.file_path)}'.")
-            self._populate_sheet_selector() # Recarrega para garantir que o seletor esteja atualizado
+        # Só as alterações são copiadas da tabela aqui; a gravação é feita pelo IOService, fora da thread da GUI
+        save_plan = self.table_model.build_save_plan()
+        self.io_status.run(write_sheet_data, self.file_path, current_sheet_name, save_plan,
+                           convert_value=to_cell_value,
+                           message=f"Salvando '{current_sheet_name}'...", replaceable=False,
+                           on_finished=lambda row_count, name=current_sheet_name, plan=save_plan: self._on_data_saved(name, plan),
+                           on_failed=self._on_save_failed,
+                           on_cancelled=lambda: QMessageBox.information(self, "Gravação Cancelada", "A gravação foi cancelada. O arquivo não foi alterado."))
+
+    def _on_data_saved(self, current_sheet_name, save_plan):
+        self.table_model.mark_saved(save_plan)
+        QMessageBox.information(self, "Dados Salvos", f"Dados de '{current_sheet_name}' salvos com sucesso em '{os.path.basename(self.file_path)}'.")
+        # A tabela não é relida do disco: edições feitas durante a gravação continuam pendentes (ver mark_saved).
+        # Só a lista de abas é atualizada, caso a gravação tenha criado uma aba nova.
+        self._refresh_sheet_names(current_sheet_name)
+
+    def _refresh_sheet_names(self, current_sheet_name):
+        """Atualiza os nomes das abas no seletor, mantendo a aba atual, sem disparar uma nova leitura."""
+        try:
+            sheet_names = get_sheet_names(self.file_path)
         except Exception as e:
-            QMessageBox.critical(self, "Erro ao Salvar", f"Erro ao salvar dados de itens: {e}")
+            print(f"Aviso: Não foi possível listar as abas de '{os.path.basename(self.file_path)}': {e}")
+            return
+        self.sheet_selector.blockSignals(True)
+        try:
+            self.sheet_selector.clear()
+            self.sheet_selector.addItems(sheet_names)
+            if self.sheet_selector.findText(current_sheet_name) == -1:
+                self.sheet_selector.addItem(current_sheet_name)
+            self.sheet_selector.setCurrentIndex(self.sheet_selector.findText(current_sheet_name))
+        finally:
+            self.sheet_selector.blockSignals(False)
+
+    def _on_save_failed(self, error):
+        self.table_model.mark_save_failed() # As edições continuam na tabela; a próxima gravação será completa
+        QMessageBox.critical(self, "Erro ao Salvar", f"Erro ao salvar dados de itens: {error}")
 
     def _add_empty_row(self):
-        """Adiciona uma linha vazia ao QTableWidget para nova entrada de dados."""
+        """Adiciona uma linha vazia ao QTableView para nova entrada de dados."""
         if self.is_read_only: 
             QMessageBox.warning(self, "Ação Não Permitida", "Esta ferramenta está em modo somente leitura. Não é possível adicionar linhas.")
             return
 
-        row_count = self.table.rowCount()
-        self.table.insertRow(row_count)
+        row_count = self.table_model.rowCount()
         
         # Se a tabela ainda não tem colunas (ex: planilha nova/vazia),
         # esta é a primeira linha, e o usuário precisa definir os cabeçalhos.
-        if self.table.columnCount() == 0 and row_count == 0:
+        if self.table_model.columnCount() == 0 and row_count == 0:
             text, ok = QInputDialog.getText(self, "Definir Cabeçalhos", 
                                             "A planilha está vazia. Insira os nomes das colunas separados por vírgula (ex: part_number, quantidade_movimentada, data_movimentacao):")
             if ok and text:
                 headers = [h.strip() for h in text.split(',')]
-                self.table.setColumnCount(len(headers))
-                self.table.setHorizontalHeaderLabels(headers)
+                self.table_model.set_headers(headers)
             else:
                 QMessageBox.warning(self, "Aviso", "Nenhum cabeçalho fornecido. Nenhuma coluna será adicionada.")
-                self.table.removeRow(row_count) # Remove a linha vazia recém-adicionada
                 return # Sai da função se o usuário cancelar ou não fornecer cabeçalhos
 
-        # Preenche a nova linha com instâncias ValidatingTableWidgetItem
-        for col_idx in range(self.table.columnCount()):
-            header_name = self.table.horizontalHeaderItem(col_idx).text()
-            # Obtém o tipo da coluna, padrão para string se não estiver no mapeamento
-            col_type = ITEM_COLUMN_TYPES.get(header_name, str) 
-            self.table.setItem(row_count, col_idx, ValidatingTableWidgetItem("", header_name, col_type))
+        # Adiciona a nova linha vazia; a validação por tipo é aplicada pelo modelo na edição
+        self.table_model.append_empty_row()
 
 # Exemplo de uso (para testar este módulo individualmente)
 if __name__ == "__main__":
@@ -1,15 +1,86 @@
 import os
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton, QMessageBox, QTreeWidget, QTreeWidgetItem
-from PyQt5.QtCore import Qt, QTimer
+from contextlib import contextmanager
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton, QMessageBox, QTreeWidget, QTreeWidgetItem, QLabel, QDialog, QTableView, QHeaderView
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+from PyQt5.QtGui import QBrush, QColor
+
+from ui.tools.where_used import ENGENHARIA_EXCEL_PATH, STRUCTURE_SHEET_NAME, get_where_used_index
+from ui.tools.search_index import build_search_index
+from ui.tools.io_worker import IOStatusBar
+from ui.tools.global_search import refresh_global_search, run_global_search
+from ui.tools.sheet_table_model import SheetTableModel
+
+# Prefixo de busca que consulta onde um item de engenharia é usado (ex: "usado: 200001")
+WHERE_USED_PREFIX = "usado:"
+# Prefixo de busca que procura um valor em todas as planilhas (ex: "planilhas: PED-0042")
+GLOBAL_SEARCH_PREFIX = "planilhas:"
+
+WORKSPACE_ROOT_TEXT = "Projetos/Espaço de Trabalho"
+# Papel de dados (coluna 0) com a descrição de cada item do espaço de trabalho, também indexada pela busca
+WORKSPACE_DESCRIPTION_ROLE = Qt.UserRole + 1
+
+SEARCH_DEBOUNCE_MS = 150 # Espera após a última tecla antes de buscar
+MAX_HIGHLIGHTED_RESULTS = 500 # Apenas os resultados mais relevantes são destacados na árvore
+HIGHLIGHT_BRUSH = QBrush(QColor(255, 241, 168))
+
+class GlobalSearchDialog(QDialog):
+    """Lista as células encontradas pela busca global; duplo clique abre o arquivo no visualizador."""
+    open_file_requested = pyqtSignal(str)
+
+    def __init__(self, term, total, results, parent=None):
+        super().__init__(parent)
+        self.results = results
+        self.setWindowTitle(f"Busca nas Planilhas: {term}")
+        self.resize(900, 500)
+
+        layout = QVBoxLayout(self)
+        shown = f" (exibindo os {len(results)} primeiros)" if total > len(results) else ""
+        layout.addWidget(QLabel(f"<b>{total}</b> célula(s) encontrada(s) para <b>{term}</b>{shown}. Duplo clique abre o arquivo."))
+
+        self.table = QTableView()
+        self.table_model = SheetTableModel(self, editable=False)
+        self.table.setModel(self.table_model)
+        self.table.setEditTriggers(QTableView.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.table.setAlternatingRowColors(True)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.table.doubleClicked.connect(self._on_double_clicked)
+        layout.addWidget(self.table)
+
+        close_btn = QPushButton("Fechar")
+        close_btn.clicked.connect(self.close)
+        layout.addWidget(close_btn)
+
+        rows = [[found["relative_path"], found["sheet"], found["row"], found["column"], found["header"], found["value"]]
+                for found in results]
+        self.table_model.set_sheet_data(["Arquivo", "Planilha", "Linha", "Coluna", "Cabeçalho", "Valor"], rows)
+
+    def _on_double_clicked(self, index):
+        self.open_file_requested.emit(self.results[index.row()]["file_path"])
 
 class SearchBarWidget(QWidget):
     """
-    Um widget reutilizável que fornece uma barra de pesquisa e lógica
-    para filtrar itens em um QTreeWidget alvo.
+    Um widget reutilizável que fornece uma barra de pesquisa para os itens do espaço de trabalho
+    de um QTreeWidget alvo.
+    A busca usa um SearchIndex montado uma única vez sobre código, descrição e tipo dos itens e roda
+    enquanto o usuário digita (com debounce). Os resultados são destacados na árvore, sem ocultar itens;
+    Enter percorre os resultados em ordem de relevância.
+    Com o prefixo GLOBAL_SEARCH_PREFIX, o valor é procurado nas células de todas as planilhas.
     """
+    # Emitido com o caminho de um arquivo que o usuário quer abrir (resultado da busca global)
+    open_file_requested = pyqtSignal(str)
+
     def __init__(self, target_tree_widget: QTreeWidget, parent=None):
         super().__init__(parent)
         self.target_tree_widget = target_tree_widget
+        self._search_index = None # Montado em segundo plano a partir dos itens da árvore
+        self._indexed_items = [] # QTreeWidgetItem de cada registro do índice
+        self._index_build_scheduled = False # Montagem agendada para quando a GUI ficar ociosa
+        self._index_pending = False # Montagem em andamento no IOService
+        self._highlighted_ids = set() # Registros do índice destacados pela última busca
+        self._result_items = [] # Resultados destacados, em ordem de relevância
+        self._result_position = -1
+        self._last_query = None
         self._init_ui()
 
     def _init_ui(self):
@@ -19,7 +90,15 @@ class SearchBarWidget(QWidget):
 
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("Buscar no Espaço de Trabalho...")
-        # Conecta o Enter para executar a busca
+        self.search_input.setToolTip(f"Busca por código, descrição ou tipo enquanto você digita. Enter vai para o próximo resultado.\n"
+                                     f"Use '{WHERE_USED_PREFIX} <código>' para ver onde um item da estrutura de engenharia é usado.\n"
+                                     f"Use '{GLOBAL_SEARCH_PREFIX} <valor>' para procurar um valor em todas as planilhas.")
+        # A busca roda pouco depois da última tecla; Enter vai para o próximo resultado
+        self._debounce_timer = QTimer(self)
+        self._debounce_timer.setSingleShot(True)
+        self._debounce_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self._debounce_timer.timeout.connect(self._run_incremental_search)
+        self.search_input.textChanged.connect(self._debounce_timer.start)
         self.search_input.returnPressed.connect(self.execute_search) 
         
         self.search_button = QPushButton("Buscar")
@@ -33,66 +112,221 @@ class SearchBarWidget(QWidget):
         search_layout.addWidget(self.clear_button)
         
         main_layout.addLayout(search_layout)
+
+        self.result_label = QLabel("")
+        main_layout.addWidget(self.result_label)
+
+        self.io_status = IOStatusBar(self)
+        main_layout.addWidget(self.io_status)
+        # Jobs da busca global (índice de todas as planilhas), independentes do índice do espaço de trabalho
+        self.global_search_status = IOStatusBar(self)
+        main_layout.addWidget(self.global_search_status)
         self.setLayout(main_layout)
 
-    def execute_search(self):
+    def _workspace_root(self):
+        for i in range(self.target_tree_widget.topLevelItemCount()):
+            item = self.target_tree_widget.topLevelItem(i)
+            if item.text(0) == WORKSPACE_ROOT_TEXT:
+                return item
+        return None
+
+    def invalidate_index(self):
         """
-        Executa a busca com base no texto do input e filtra os itens no QTreeWidget alvo.
-        Os itens que não correspondem são ocultados.
+        Deve ser chamado quando os itens do espaço de trabalho mudam. Os destaques são removidos e o índice
+        é remontado em segundo plano assim que a GUI ficar ociosa (depois de os novos itens serem criados).
         """
-        search_term = self.search_input.text().strip().lower()
-        
-        # Limpa qualquer filtro anterior antes de aplicar o novo
-        self.clear_search(clear_input=False)
+        self._clear_highlights()
+        self._search_index = None
+        self._indexed_items = []
+        self._last_query = None
+        if not self._index_build_scheduled:
+            self._index_build_scheduled = True
+            QTimer.singleShot(0, self._start_index_build)
+
+    def _start_index_build(self):
+        """
+        Lê código, descrição e tipo dos itens (na thread da GUI) e monta o índice em um job do IOService.
+        Uma montagem anterior ainda em andamento é cancelada (seus itens já não são os da árvore).
+        """
+        self._index_build_scheduled = False
+        self._index_pending = True
+        workspace_root = self._workspace_root()
+        items = [workspace_root.child(i) for i in range(workspace_root.childCount())] if workspace_root else []
+        records = [(item.text(0), item.data(0, WORKSPACE_DESCRIPTION_ROLE), item.text(1)) for item in items]
+        self.io_status.run(build_search_index, records,
+                           message="Indexando o espaço de trabalho...",
+                           on_finished=lambda index, indexed_items=items: self._on_index_built(indexed_items, index),
+                           on_failed=self._on_index_failed)
 
-        if not search_term:
-            QMessageBox.information(self, "Busca vazia", "Digite algo para buscar.")
+    def _on_index_built(self, indexed_items, index):
+        self._index_pending = False
+        self._indexed_items = indexed_items
+        self._search_index = index
+        self._last_query = None
+        if self.search_input.text().strip():
+            self._run_incremental_search() # Texto digitado enquanto o índice era montado
+
+    def _on_index_failed(self, error):
+        self._index_pending = False
+        self.result_label.setText(f"Não foi possível indexar o espaço de trabalho: {error}")
+
+    def _run_incremental_search(self):
+        """Busca o texto atual (chamada pelo debounce) e destaca os resultados."""
+        query = self.search_input.text().strip()
+        if query.lower().startswith(WHERE_USED_PREFIX):
+            self.result_label.setText("Pressione Enter para ver onde o item é usado.")
+            return
+        if query.lower().startswith(GLOBAL_SEARCH_PREFIX):
+            self.result_label.setText("Pressione Enter para procurar em todas as planilhas.")
             return
+        if query == self._last_query:
+            return
+        if not query:
+            self._last_query = query
+            self._clear_highlights()
+            self.result_label.setText("")
+            return
+        if self._search_index is None:
+            if not self._index_pending and not self._index_build_scheduled:
+                self.invalidate_index()
+            self.result_label.setText("Indexando o espaço de trabalho...")
+            return # A busca roda quando o índice ficar pronto
+        self._last_query = query
+
+        total, record_ids = self._search_index.search(query, limit=MAX_HIGHLIGHTED_RESULTS)
+        self._apply_highlights(record_ids)
+        result_items = [self._indexed_items[record_id] for record_id in record_ids]
+        self._result_items = result_items
+        self._result_position = -1
 
-        # Assumimos que o primeiro item top-level é a raiz do workspace
-        workspace_root = self.target_tree_widget.topLevelItem(0) 
-        if not workspace_root or workspace_root.text(0) != "Projetos/Espaço de Trabalho":
-            QMessageBox.warning(self, "Erro na Árvore", "Não foi possível encontrar a raiz 'Projetos/Espaço de Trabalho'.")
+        if not total:
+            self.result_label.setText("Nenhum item encontrado.")
             return
+        shown = f" (destacando os {len(result_items)} mais relevantes)" if total > len(result_items) else ""
+        self.result_label.setText(f"{total} item(ns) encontrado(s){shown}.")
+        self._go_to_result(0)
 
-        found_items = []
-        for i in range(workspace_root.childCount()):
-            item = workspace_root.child(i)
-            item_name = item.text(0).lower()
-            item_type = item.text(1).lower() if item.childCount() == 0 else "pasta" 
-
-            if search_term in item_name or search_term in item_type:
-                found_items.append(item)
-                item.setHidden(False) # Garante que o item correspondente é visível
-                item.setSelected(True)
-                item.setExpanded(True)
-            else:
-                item.setHidden(True) # Oculta itens que não correspondem
-
-        if not found_items:
-            QMessageBox.information(self, "Sem resultados", f"Nenhum item encontrado para: '{search_term}' no Espaço de Trabalho.")
+    def _apply_highlights(self, record_ids):
+        """Destaca os registros 'record_ids', alterando apenas os itens cujo destaque mudou desde a última busca."""
+        new_highlighted = set(record_ids)
+        with self._bulk_item_update():
+            for record_id in self._highlighted_ids - new_highlighted:
+                self._indexed_items[record_id].setData(0, Qt.BackgroundRole, None)
+            for record_id in new_highlighted - self._highlighted_ids:
+                self._indexed_items[record_id].setBackground(0, HIGHLIGHT_BRUSH)
+        self._highlighted_ids = new_highlighted
+
+    def _clear_highlights(self):
+        with self._bulk_item_update():
+            for record_id in self._highlighted_ids:
+                self._indexed_items[record_id].setData(0, Qt.BackgroundRole, None)
+        self._highlighted_ids = set()
+        self._result_items = []
+        self._result_position = -1
+
+    @contextmanager
+    def _bulk_item_update(self):
+        """
+        Altera apenas cores de itens sem notificar a árvore item a item (cada notificação recalcula a
+        posição do item na view); a árvore é redesenhada uma única vez no fim.
+        """
+        model = self.target_tree_widget.model()
+        model.blockSignals(True)
+        try:
+            yield
+        finally:
+            model.blockSignals(False)
+            self.target_tree_widget.viewport().update()
+
+    def _go_to_result(self, position):
+        self._result_position = position
+        item = self._result_items[position]
+        parent = item.parent()
+        if parent is not None and not parent.isExpanded():
+            parent.setExpanded(True)
+        self.target_tree_widget.setCurrentItem(item)
+        self.target_tree_widget.scrollToItem(item)
+
+    def execute_search(self):
+        """
+        Executa a busca imediatamente (Enter ou botão Buscar). Se o texto não mudou,
+        vai para o próximo resultado, na ordem de relevância.
+        """
+        search_term = self.search_input.text().strip()
+
+        if search_term.lower().startswith(WHERE_USED_PREFIX):
+            # O código da peça mantém maiúsculas/minúsculas como digitado
+            self.show_where_used(search_term[len(WHERE_USED_PREFIX):].strip())
+            return
+        if search_term.lower().startswith(GLOBAL_SEARCH_PREFIX):
+            term = search_term[len(GLOBAL_SEARCH_PREFIX):].strip()
+            if not term:
+                QMessageBox.information(self, "Busca vazia", f"Digite o valor a procurar após '{GLOBAL_SEARCH_PREFIX}'.")
+                return
+            self.run_global_search(term, on_finished=lambda result, term=term: self._show_global_results(term, result))
+            return
+
+        self._debounce_timer.stop()
+        if search_term != self._last_query:
+            self._run_incremental_search()
+        elif self._result_items:
+            self._go_to_result((self._result_position + 1) % len(self._result_items))
+
+    def show_where_used(self, part_id):
+        """Abre a lista de montagens que usam 'part_id' na estrutura de engenharia.xlsx."""
+        from ui.tools.structure_view_tool import WhereUsedDialog # Importado aqui: a ferramenta importa a GUI completa da estrutura
+
+        if not part_id:
+            QMessageBox.information(self, "Busca vazia", f"Digite o código do item após '{WHERE_USED_PREFIX}'.")
+            return
+        if not os.path.exists(ENGENHARIA_EXCEL_PATH):
+            QMessageBox.warning(self, "Arquivo Não Encontrado", f"O arquivo de engenharia não foi encontrado:\n{ENGENHARIA_EXCEL_PATH}")
+            return
+        try:
+            where_used_index = get_where_used_index(ENGENHARIA_EXCEL_PATH, STRUCTURE_SHEET_NAME)
+        except (OSError, KeyError, ValueError) as e:
+            QMessageBox.critical(self, "Erro no Índice", f"Não foi possível atualizar o índice 'onde é usado':\n{e}")
             return
+        if not where_used_index.contains(part_id):
+            QMessageBox.information(self, "Sem resultados", f"O item '{part_id}' não foi encontrado na estrutura de engenharia.")
+            return
+        self._where_used_dialog = WhereUsedDialog(where_used_index, part_id, parent=self)
+        self._where_used_dialog.show()
 
-        # Foca no primeiro resultado
-        self.target_tree_widget.setCurrentItem(found_items[0])
+    def refresh_global_index(self):
+        """Atualiza em segundo plano o índice da busca global (apenas arquivos novos ou alterados são relidos)."""
+        if not self.global_search_status.is_busy():
+            self.global_search_status.run(refresh_global_search, message="Indexando as planilhas para a busca global...")
+
+    def run_global_search(self, term, on_finished):
+        """
+        Procura 'term' em todas as planilhas em um job do IOService (o índice é atualizado antes, relendo só os
+        arquivos alterados). 'on_finished' recebe (total, resultados). Usado pela barra de busca e pelo mini-console.
+        """
+        self.global_search_status.run(run_global_search, term,
+                                      message=f"Buscando '{term}' nas planilhas...",
+                                      on_finished=on_finished,
+                                      on_failed=lambda error: QMessageBox.critical(self, "Erro na Busca", f"Erro ao buscar nas planilhas:\n{error}"))
+
+    def _show_global_results(self, term, result):
+        total, results = result
+        if not total:
+            QMessageBox.information(self, "Sem resultados", f"Nenhuma célula encontrada para '{term}'.")
+            return
+        self._global_search_dialog = GlobalSearchDialog(term, total, results, self)
+        self._global_search_dialog.open_file_requested.connect(self.open_file_requested)
+        self._global_search_dialog.show()
 
     def clear_search(self, clear_input=True):
         """
-        Limpa a barra de busca e reexibe todos os itens da raiz do workspace.
+        Limpa a barra de busca e os destaques dos resultados.
         """
+        self._debounce_timer.stop()
         if clear_input:
+            self.search_input.blockSignals(True) # Evita uma nova busca pelo textChanged
             self.search_input.clear()
+            self.search_input.blockSignals(False)
+        self._clear_highlights()
+        self._last_query = None
+        self.result_label.setText("")
         self.target_tree_widget.clearSelection()
-
-        # Reexibe todos os itens sob a raiz do workspace
-        workspace_root = self.target_tree_widget.topLevelItem(0)
-        if workspace_root and workspace_root.text(0) == "Projetos/Espaço de Trabalho":
-            for i in range(workspace_root.childCount()):
-                item = workspace_root.child(i)
-                item.setHidden(False) # Reexibe o item
-                item.setExpanded(False) # Colapsa-o para uma visualização limpa após limpar
-        
-        # Opcional: Colapsar a raiz do workspace após limpar (se ela não for um filtro ativo)
-        if workspace_root:
-            workspace_root.setExpanded(False)
-
@@ -0,0 +1,153 @@
+import re
+import bisect
+import unicodedata
+
+# Tamanho dos n-gramas indexados; termos mais curtos são buscados como prefixo de palavra
+NGRAM_SIZE = 3
+
+TOKEN_SPLIT_RE = re.compile(r"[^\w]+")
+
+
+def normalize_text(value):
+    """Texto para busca: minúsculo e sem acentos ('Ação' -> 'acao'). None vira ""."""
+    if value is None:
+        return ""
+    text = str(value).lower()
+    if text.isascii():
+        return text
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def _ngrams(text):
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+
+def _short_prefixes(text):
+    """Inícios de palavra com menos de NGRAM_SIZE letras ('motor diesel' -> m, mo, d, di)."""
+    return {token[:length] for token in TOKEN_SPLIT_RE.split(text) if token for length in range(1, min(len(token), NGRAM_SIZE - 1) + 1)}
+
+
+class SearchIndex:
+    """
+    Índice de busca em memória para listas grandes de registros (ex: itens do espaço de trabalho).
+    Cada registro é uma sequência de campos de texto; o primeiro é o código (ex: part_number),
+    os demais são campos descritivos (ex: descrição e tipo).
+    Montado uma única vez: n-gramas -> registros, inícios curtos de palavras -> registros e os códigos ordenados.
+    Uma busca combina esses conjuntos (operações de conjunto, sem percorrer os registros um a um),
+    então o tempo de resposta não cresce com o tamanho da lista, só com a quantidade de resultados.
+    """
+    def __init__(self, records):
+        normalized = [tuple(normalize_text(value) for value in record) for record in records]
+        # Os registros recebem ids internos na ordem de relevância de desempate (código mais curto, depois alfabética)
+        self._order = sorted(range(len(normalized)), key=lambda position: (len(normalized[position][0]), normalized[position][0]))
+        self.fields = [normalized[position] for position in self._order]
+
+        self._postings = {} # n-grama (de qualquer campo) -> [ids]
+        self._code_postings = {} # n-grama do código -> [ids]
+        self._short_prefix_postings = {} # Início de palavra com menos de NGRAM_SIZE letras -> [ids]
+        field_cache = {} # Campo -> (n-gramas, inícios curtos de palavras); tipos e descrições se repetem muito
+        for record_id, fields in enumerate(self.fields):
+            grams = set()
+            prefixes = set()
+            for field in fields:
+                cached = field_cache.get(field)
+                if cached is None:
+                    cached = field_cache[field] = (_ngrams(field), _short_prefixes(field))
+                grams |= cached[0]
+                prefixes |= cached[1]
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(record_id)
+            for gram in field_cache[fields[0]][0] if fields else ():
+                self._code_postings.setdefault(gram, []).append(record_id)
+            for prefix in prefixes:
+                self._short_prefix_postings.setdefault(prefix, []).append(record_id)
+        # Códigos em ordem alfabética (paralelo a _code_ids), para buscar códigos por prefixo
+        code_order = sorted(range(len(self.fields)), key=lambda record_id: self.fields[record_id][0] if self.fields[record_id] else "")
+        self._sorted_codes = [self.fields[record_id][0] if self.fields[record_id] else "" for record_id in code_order]
+        self._code_ids = code_order
+
+    def __len__(self):
+        return len(self.fields)
+
+    def _gram_matches(self, term, postings):
+        """Registros que contêm todos os n-gramas do termo (intersecção, começando pela menor lista)."""
+        lists = []
+        for gram in _ngrams(term):
+            posting = postings.get(gram)
+            if posting is None:
+                return set()
+            lists.append(posting)
+        lists.sort(key=len)
+        matches = set(lists[0])
+        for posting in lists[1:]:
+            if not matches:
+                break
+            matches.intersection_update(posting)
+        return matches
+
+    def _term_matches(self, term):
+        """Registros em que o termo ocorre: trecho de qualquer campo ou, para termos curtos, início de palavra."""
+        if len(term) >= NGRAM_SIZE:
+            return self._gram_matches(term, self._postings)
+        return set(self._short_prefix_postings.get(term, ()))
+
+    def _code_prefix_matches(self, term):
+        """Registros cujo código começa pelo termo."""
+        start = bisect.bisect_left(self._sorted_codes, term)
+        end = bisect.bisect_left(self._sorted_codes, term + "\U0010ffff")
+        return set(self._code_ids[start:end])
+
+    def _verified(self, record_id, terms):
+        """Confirma que todos os termos ocorrem no registro (n-gramas presentes podem não ser contíguos)."""
+        fields = self.fields[record_id]
+        return all(len(term) < NGRAM_SIZE or any(term in field for field in fields) for term in terms)
+
+    def search(self, query, limit=None):
+        """
+        Busca os registros que contêm todos os termos da consulta (em qualquer campo).
+        Retorna (total de registros encontrados, [posições dos registros mais relevantes, até 'limit']),
+        com as posições na lista de registros original.
+        Ordem: código começando pelo primeiro termo, depois código contendo algum termo, depois os demais
+        (termo na descrição/tipo); em cada grupo, código mais curto primeiro e então ordem alfabética.
+        Os resultados retornados são sempre confirmados; quando 'limit' corta a lista, o total pode incluir,
+        raramente, registros que só contêm os n-gramas de um termo longo fora de ordem.
+        """
+        terms = [term for term in normalize_text(query).split() if term]
+        if not terms:
+            return 0, []
+
+        term_sets = sorted((self._term_matches(term) for term in terms), key=len)
+        matches = term_sets[0]
+        for other in term_sets[1:]:
+            if not matches:
+                break
+            matches = matches & other
+        if not matches:
+            return 0, []
+
+        code_prefix = self._code_prefix_matches(terms[0]) & matches
+        code_contains = set()
+        for term in terms:
+            if len(term) >= NGRAM_SIZE:
+                code_contains |= self._gram_matches(term, self._code_postings)
+        code_contains = (code_contains & matches) - code_prefix
+        others = matches - code_prefix - code_contains
+
+        ranked = []
+        rejected = 0
+        for group in (code_prefix, code_contains, others):
+            for record_id in sorted(group):
+                if not self._verified(record_id, terms):
+                    rejected += 1
+                    continue
+                ranked.append(self._order[record_id])
+                if limit is not None and len(ranked) >= limit:
+                    return len(matches) - rejected, ranked
+        return len(ranked), ranked
+
+
+def build_search_index(job, records):
+    """Job do IOService: monta o SearchIndex fora da thread da GUI."""
+    job.report_progress(-1, "Indexando o espaço de trabalho para a busca...")
+    return SearchIndex(records)
@@ -1,8 +1,17 @@
 import sys
 import os
 import openpyxl
-from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QTableWidget, QTableWidgetItem, QHBoxLayout, QMessageBox, QHeaderView, QLabel, QComboBox, QFileDialog, QInputDialog
-from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QTableView, QHBoxLayout, QMessageBox, QHeaderView, QLabel, QComboBox, QFileDialog, QInputDialog
+
+# Garante que a raiz do projeto esteja no sys.path para importar os módulos compartilhados de ui.tools
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from ui.tools.workbook_cache import get_sheet_names
+from ui.tools.io_worker import IOStatusBar, load_workbook, add_sheet_and_save, read_sheet_data, write_sheet_data
+from ui.tools.cell_types import to_cell_value
+from ui.tools.sheet_table_model import SheetTableModel
 
 # Não há headers hardcoded aqui; a ferramenta lê diretamente da primeira linha da planilha.
 
@@ -44,13 +53,19 @@ class SheetEditorWidget(QWidget):
         self.layout.addWidget(self.load_btn)
 
         # Tabela principal para exibir os dados
-        self.table = QTableWidget()
-        self.table.setEditTriggers(QTableWidget.DoubleClicked | QTableWidget.AnyKeyPressed) # Permite edição
+        self.table = QTableView()
+        self.table_model = SheetTableModel(self)
+        self.table.setModel(self.table_model)
+        self.table.setEditTriggers(QTableView.DoubleClicked | QTableView.AnyKeyPressed) # Permite edição
         self.table.setAlternatingRowColors(True)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
         self.table.verticalHeader().setSectionResizeMode(QHeaderView.Interactive)
         self.layout.addWidget(self.table)
 
+        # Progresso/cancelamento das leituras e gravações feitas em segundo plano
+        self.io_status = IOStatusBar(self)
+        self.layout.addWidget(self.io_status)
+
         # Layout para os botões de ação (Salvar, Adicionar Linha, Deletar Linha, Adicionar Planilha)
         button_layout = QHBoxLayout()
         self.add_row_btn = QPushButton("Adicionar Linha")
@@ -97,21 +112,28 @@ class SheetEditorWidget(QWidget):
 
         self.file_path = file
         self.file_name_label.setText(f"<b>Arquivo:</b> {os.path.basename(self.file_path)}")
-        self._load_workbook() # Carrega o workbook associado ao caminho do arquivo
+        self._load_workbook() # Carrega (em segundo plano) o workbook associado ao caminho do arquivo
+
+    def _load_workbook(self):
+        """Carrega o workbook do arquivo Excel pelo IOService; o seletor é populado ao final."""
+        if not os.path.exists(self.file_path):
+            QMessageBox.critical(self, "Erro", f"O arquivo '{os.path.basename(self.file_path)}' não foi encontrado.")
+            self.current_workbook = None
+            return
+        self.io_status.run(load_workbook, self.file_path,
+                           message=f"Carregando '{os.path.basename(self.file_path)}'...",
+                           on_finished=self._on_workbook_loaded,
+                           on_failed=self._on_workbook_load_failed)
+
+    def _on_workbook_loaded(self, workbook):
+        self.current_workbook = workbook
         self._populate_sheet_selector() # Popula o seletor de planilhas com as sheets do novo arquivo
         self._set_buttons_enabled(True) # Habilita os botões
 
-    def _load_workbook(self):
-        """Carrega o workbook do arquivo Excel."""
-        try:
-            if not os.path.exists(self.file_path):
-                QMessageBox.critical(self, "Erro", f"O arquivo '{os.path.basename(self.file_path)}' não foi encontrado.")
-                self.current_workbook = None
-                return
-            self.current_workbook = openpyxl.load_workbook(self.file_path)
-        except Exception as e:
-            QMessageBox.critical(self, "Erro ao Carregar Arquivo", f"Não foi possível carregar o arquivo '{os.path.basename(self.file_path)}': {e}")
-            self.current_workbook = None # Garante que não há workbook carregado em caso de erro
+    def _on_workbook_load_failed(self, error):
+        QMessageBox.critical(self, "Erro ao Carregar Arquivo", f"Não foi possível carregar o arquivo '{os.path.basename(self.file_path)}': {error}")
+        self.current_workbook = None # Garante que não há workbook carregado em caso de erro
+        self.table_model.clear()
 
     def _populate_sheet_selector(self):
         """Popula o QComboBox com os nomes das planilhas do workbook atual."""
@@ -126,51 +148,36 @@ class SheetEditorWidget(QWidget):
             
             self._load_data_from_selected_sheet() # Carrega dados da aba selecionada (ou vazia)
         else:
-            self.table.setRowCount(0)
-            self.table.setColumnCount(0)
+            self.table_model.clear()
 
     def _load_data_from_selected_sheet(self):
-        """Carrega dados da planilha Excel atualmente selecionada para o QTableWidget."""
+        """Carrega dados da planilha Excel atualmente selecionada para o QTableView."""
         current_sheet_name = self.sheet_selector.currentText()
         if not current_sheet_name or not self.current_workbook:
-            self.table.setRowCount(0)
-            self.table.setColumnCount(0)
+            self.table_model.clear()
             return
 
-        try:
-            sheet = self.current_workbook[current_sheet_name]
-
-            # Carrega cabeçalhos da primeira linha da planilha. Se não houver, assume 0 colunas.
-            headers = [cell.value for cell in sheet[1]] if sheet.max_row > 0 else []
-            self.table.setColumnCount(len(headers))
-            self.table.setHorizontalHeaderLabels(headers)
-
-            data = []
-            # Itera a partir da segunda linha para os dados
-            for row in sheet.iter_rows(min_row=2): 
-                row_values = [cell.value for cell in row]
-                # Garante que a linha tenha células suficientes para os cabeçalhos
-                while len(row_values) < len(headers):
-                    row_values.append("")
-                data.append(row_values)
-
-            self.table.setRowCount(len(data))
-            for row_idx, row_data in enumerate(data):
-                for col_idx, cell_value in enumerate(row_data):
-                    item = QTableWidgetItem(str(cell_value) if cell_value is not None else "")
-                    self.table.setItem(row_idx, col_idx, item)
-
-            self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
-            self.table.verticalHeader().setSectionResizeMode(QHeaderView.Interactive)
-            # QMessageBox.information(self, "Dados Carregados", f"Dados de '{current_sheet_name}' carregados com sucesso.")
+        # A leitura é feita pelo IOService, fora da thread da GUI; o resultado é aplicado em _on_sheet_data_loaded
+        self.io_status.run(read_sheet_data, self.file_path, current_sheet_name, create_missing=False,
+                           message=f"Carregando '{current_sheet_name}'...",
+                           on_finished=self._on_sheet_data_loaded,
+                           on_failed=lambda error, name=current_sheet_name: self._on_sheet_load_failed(name, error))
 
-        except Exception as e:
-            QMessageBox.critical(self, "Erro de Carregamento", f"Erro ao carregar dados da aba '{current_sheet_name}': {e}")
-            self.table.setRowCount(0)
-            self.table.setColumnCount(0) # Limpa a tabela em caso de erro grave
+    def _on_sheet_data_loaded(self, result):
+        """Aplica à tabela os dados lidos em segundo plano."""
+        # Carrega cabeçalhos da primeira linha da planilha. Se não houver, assume 0 colunas.
+        # O modelo guarda os valores por coluna; a view só consulta as células visíveis
+        self.table_model.set_sheet_data(result["headers"], result["rows"])
+
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Interactive)
+
+    def _on_sheet_load_failed(self, current_sheet_name, error):
+        QMessageBox.critical(self, "Erro de Carregamento", f"Erro ao carregar dados da aba '{current_sheet_name}': {error}")
+        self.table_model.clear() # Limpa a tabela em caso de erro grave
 
     def _save_data(self):
-        """Salva dados do QTableWidget de volta para a planilha Excel, capturando os cabeçalhos da tabela."""
+        """Salva dados do QTableView de volta para a planilha Excel, capturando os cabeçalhos da tabela."""
         if not self.current_workbook or not self.file_path:
             QMessageBox.critical(self, "Erro", "Nenhum arquivo Excel está carregado para salvar.")
             return
@@ -180,61 +187,73 @@ class SheetEditorWidget(QWidget):
             QMessageBox.warning(self, "Nome da Planilha Inválido", "O nome da planilha não pode estar vazio. Por favor, selecione ou adicione uma aba.")
             return
 
-        try:
-            # Obtém a planilha atual do workbook
-            ws = self.current_workbook[current_sheet_name]
-            
-            # Limpa todas as linhas existentes na planilha
-            for row_idx in range(ws.max_row, 0, -1):
-                ws.delete_rows(row_idx)
+        if not self.table_model.is_modified() and os.path.exists(self.file_path):
+            QMessageBox.information(self, "Nada a Salvar", "Não há alterações a serem salvas.")
+            return
 
-            # Obtém os cabeçalhos atuais da QTableWidget.
-            current_headers = [self.table.horizontalHeaderItem(col).text() 
-                               for col in range(self.table.columnCount())]
-            
-            # Salva os cabeçalhos se existirem (se o usuário digitou ou eles foram carregados)
-            if current_headers:
-                ws.append(current_headers)
-            
-            # Percorre o QTableWidget e adiciona as linhas ao Excel
-            for row_idx in range(self.table.rowCount()):
-                row_data = []
-                for col_idx in range(self.table.columnCount()):
-                    item = self.table.item(row_idx, col_idx)
-                    row_data.append(item.text() if item is not None else "")
-                ws.append(row_data)
-
-            self.current_workbook.save(self.file_path)
-            QMessageBox.information(self, "Dados Salvos", f"Dados de '{current_sheet_name}' salvos com sucesso em '{os.path.basename(self.file_path)}'.")
-            self._populate_sheet_selector() # Recarrega para garantir que o seletor esteja atualizado se uma nova aba foi criada
+        # Só as alterações são copiadas da tabela aqui; a gravação é feita pelo IOService, fora da thread da GUI
+        save_plan = self.table_model.build_save_plan()
+        self.io_status.run(write_sheet_data, self.file_path, current_sheet_name, save_plan,
+                           convert_value=to_cell_value,
+                           message=f"Salvando '{current_sheet_name}'...", replaceable=False,
+                           on_finished=lambda row_count, name=current_sheet_name, plan=save_plan: self._on_data_saved(name, plan),
+                           on_failed=self._on_save_failed,
+                           on_cancelled=self._on_save_cancelled)
+
+    def _on_data_saved(self, current_sheet_name, save_plan):
+        self.table_model.mark_saved(save_plan)
+        QMessageBox.information(self, "Dados Salvos", f"Dados de '{current_sheet_name}' salvos com sucesso em '{os.path.basename(self.file_path)}'.")
+        # A tabela não é relida do disco: edições feitas durante a gravação continuam pendentes (ver mark_saved).
+        # Só a lista de abas é atualizada, caso a gravação tenha criado uma aba nova.
+        self._refresh_sheet_names(current_sheet_name)
+
+    def _refresh_sheet_names(self, current_sheet_name):
+        """Atualiza os nomes das abas no seletor, mantendo a aba atual, sem disparar uma nova leitura."""
+        try:
+            sheet_names = get_sheet_names(self.file_path)
         except Exception as e:
-            QMessageBox.critical(self, "Erro ao Salvar", f"Erro ao salvar dados: {e}")
+            print(f"Aviso: Não foi possível listar as abas de '{os.path.basename(self.file_path)}': {e}")
+            return
+        self.sheet_selector.blockSignals(True)
+        try:
+            self.sheet_selector.clear()
+            self.sheet_selector.addItems(sheet_names)
+            if self.sheet_selector.findText(current_sheet_name) == -1:
+                self.sheet_selector.addItem(current_sheet_name)
+            self.sheet_selector.setCurrentIndex(self.sheet_selector.findText(current_sheet_name))
+        finally:
+            self.sheet_selector.blockSignals(False)
+
+    def _on_save_failed(self, error):
+        # O job já descartou o workbook do cache; as edições ficam na tabela para uma nova tentativa
+        self.table_model.mark_save_failed()
+        QMessageBox.critical(self, "Erro ao Salvar", f"Erro ao salvar dados: {error}\nAs alterações continuam na tabela e ainda não foram salvas.")
+
+    def _on_save_cancelled(self):
+        self.table_model.mark_save_failed()
+        QMessageBox.information(self, "Gravação Cancelada", "A gravação foi cancelada. As alterações continuam na tabela e ainda não foram salvas.")
 
     def _add_empty_row(self):
-        """Adiciona uma linha vazia ao QTableWidget para nova entrada de dados."""
-        row_count = self.table.rowCount()
-        self.table.insertRow(row_count)
+        """Adiciona uma linha vazia ao QTableView para nova entrada de dados."""
+        row_count = self.table_model.rowCount()
         
         # Se a tabela ainda não tem colunas (ex: planilha nova/vazia),
         # esta é a primeira linha, e os valores aqui servirão como cabeçalhos na próxima gravação.
-        if self.table.columnCount() == 0 and row_count == 0:
+        if self.table_model.columnCount() == 0 and row_count == 0:
             text, ok = QInputDialog.getText(self, "Definir Cabeçalhos", 
                                             "A planilha está vazia. Insira os nomes das colunas separados por vírgula (ex: ID, Nome, Quantidade):")
             if ok and text:
                 headers = [h.strip() for h in text.split(',')]
-                self.table.setColumnCount(len(headers))
-                self.table.setHorizontalHeaderLabels(headers)
+                self.table_model.set_headers(headers)
             else:
                 QMessageBox.warning(self, "Aviso", "Nenhum cabeçalho fornecido. Nenhuma coluna será adicionada.")
-                self.table.removeRow(row_count) # Remove a linha vazia recém-adicionada
                 return # Sai da função se o usuário cancelar ou não fornecer cabeçalhos
 
-        # Preenche a nova linha com itens vazios (ou se já houver colunas definidas)
-        for col_idx in range(self.table.columnCount()):
-            self.table.setItem(row_count, col_idx, QTableWidgetItem(""))
+        # Adiciona a nova linha vazia ao final do modelo
+        self.table_model.append_empty_row()
 
     def _delete_selected_row(self):
-        """Deleta a(s) linha(s) selecionada(s) da QTableWidget."""
+        """Deleta a(s) linha(s) selecionada(s) da QTableView."""
         selected_rows = sorted(set(index.row() for index in self.table.selectedIndexes()))
         if not selected_rows:
             QMessageBox.warning(self, "Nenhuma Linha Selecionada", "Por favor, selecione uma ou mais linhas para deletar.")
@@ -245,7 +264,7 @@ class SheetEditorWidget(QWidget):
                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         if reply == QMessageBox.Yes:
             for row_idx in reversed(selected_rows): # Deleta em ordem reversa para evitar problemas de índice
-                self.table.removeRow(row_idx)
+                self.table_model.removeRows(row_idx, 1)
             QMessageBox.information(self, "Linha(s) Deletada(s)", "Linha(s) selecionada(s) deletada(s) com sucesso. Lembre-se de salvar as alterações.")
 
     def _add_new_sheet(self):
@@ -259,23 +278,23 @@ class SheetEditorWidget(QWidget):
             QMessageBox.warning(self, "Nome Duplicado", f"Uma planilha com o nome '{sheet_name}' já existe neste arquivo.")
             return
 
-        try:
-            if not self.current_workbook: # Se nenhum arquivo foi carregado, cria um novo workbook
-                self.current_workbook = openpyxl.Workbook()
-                if 'Sheet' in self.current_workbook.sheetnames: # Remove a sheet padrão
-                    del self.current_workbook['Sheet']
-                self.file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'user_sheets', 'new_workbook.xlsx')
-                QMessageBox.information(self, "Novo Arquivo Criado", f"Nenhum arquivo estava carregado. Um novo arquivo 'new_workbook.xlsx' foi criado em 'user_sheets'.")
-                self._set_buttons_enabled(True)
-                self.file_name_label.setText(f"<b>Arquivo:</b> {os.path.basename(self.file_path)}")
-
-            self.current_workbook.create_sheet(title=sheet_name)
-            self.current_workbook.save(self.file_path)
-            QMessageBox.information(self, "Planilha Criada", f"Planilha '{sheet_name}' criada com sucesso.")
-            self._populate_sheet_selector() # Recarrega o seletor para incluir a nova planilha
-            self.sheet_selector.setCurrentText(sheet_name) # Seleciona a nova planilha
-        except Exception as e:
-            QMessageBox.critical(self, "Erro ao Criar Planilha", f"Erro ao criar nova planilha: {e}")
+        if not self.current_workbook: # Se nenhum arquivo foi carregado, o job cria um novo arquivo
+            self.file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'user_sheets', 'new_workbook.xlsx')
+            QMessageBox.information(self, "Novo Arquivo Criado", f"Nenhum arquivo estava carregado. Um novo arquivo 'new_workbook.xlsx' foi criado em 'user_sheets'.")
+            self._set_buttons_enabled(True)
+            self.file_name_label.setText(f"<b>Arquivo:</b> {os.path.basename(self.file_path)}")
+
+        # O job obtém o workbook atual do cache (com o lock do arquivo), e não self.current_workbook
+        self.io_status.run(add_sheet_and_save, self.file_path, sheet_name,
+                           message=f"Criando a planilha '{sheet_name}'...", replaceable=False,
+                           on_finished=lambda workbook, name=sheet_name: self._on_sheet_added(name, workbook),
+                           on_failed=lambda error: QMessageBox.critical(self, "Erro ao Criar Planilha", f"Erro ao criar nova planilha: {error}"))
+
+    def _on_sheet_added(self, sheet_name, workbook):
+        self.current_workbook = workbook
+        QMessageBox.information(self, "Planilha Criada", f"Planilha '{sheet_name}' criada com sucesso.")
+        self._populate_sheet_selector() # Recarrega o seletor para incluir a nova planilha
+        self.sheet_selector.setCurrentText(sheet_name) # Seleciona a nova planilha
 
 
 # Exemplo de uso (para testar este módulo individualmente)
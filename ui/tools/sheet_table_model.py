@@ -0,0 +1,311 @@
+from itertools import zip_longest, islice
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer, pyqtSignal
+
+from ui.tools.cell_types import infer_column_type, parse_edited_value
+
+# Quantidade de linhas lidas do iterador a cada fetchMore() no modo streaming.
+FETCH_BATCH_SIZE = 500
+
+
+class SheetTableModel(QAbstractTableModel):
+    """
+    Modelo de tabela (model/view) para os dados de uma planilha Excel.
+    Os valores ficam armazenados por coluna, em listas simples com os valores Python lidos pelo
+    openpyxl (números e datas nativos, não texto), e nenhum objeto Qt é criado por célula:
+    a QTableView só pede os dados das células visíveis.
+    A primeira linha da planilha (cabeçalhos) é mantida separadamente em headers().
+
+    O modelo também registra as alterações feitas desde a última leitura/gravação
+    (linhas editadas, inseridas e removidas), para que build_save_plan() permita
+    gravar apenas as linhas alteradas.
+    """
+    def __init__(self, parent=None, editable=True):
+        super().__init__(parent)
+        self.editable = editable
+        self._headers = []
+        self._columns = [] # Uma lista de valores por coluna
+        self._row_count = 0
+        self._reset_change_tracking()
+
+    def _reset_change_tracking(self):
+        """Marca o conteúdo atual como idêntico ao da planilha (linha i do modelo = linha i + 2 do Excel)."""
+        self._source_rows = list(range(2, self._row_count + 2)) # Linha de origem no Excel (None = inserida)
+        self._dirty_rows = [False] * self._row_count # Linha editada desde a última leitura/gravação
+        self._loaded_row_count = self._row_count # Quantidade de linhas de dados na planilha em disco
+        self._headers_changed = False
+        self._rows_removed = False
+        self._force_full_save = False
+        self._generation = 0 # Incrementado a cada alteração; usado por mark_saved()
+
+    # --- API usada pelas ferramentas ---
+
+    def set_sheet_data(self, headers, rows):
+        """
+        Substitui todo o conteúdo do modelo.
+        'rows' é qualquer iterável de sequências de valores (ex: ws.iter_rows(min_row=2, values_only=True)).
+        Linhas mais curtas que os cabeçalhos são completadas com None; colunas excedentes são ignoradas.
+        """
+        headers = list(headers)
+        column_count = len(headers)
+        rows = [row for row in rows]
+
+        columns = [list(column) for column in zip_longest(*rows)] if rows else []
+        del columns[column_count:]
+        while len(columns) < column_count:
+            columns.append([None] * len(rows))
+
+        self.beginResetModel()
+        self._headers = headers
+        self._columns = columns
+        self._row_count = len(rows)
+        self._reset_change_tracking()
+        self.endResetModel()
+
+    def set_headers(self, headers):
+        """Define os cabeçalhos de uma planilha vazia (descarta as linhas existentes)."""
+        self.set_sheet_data(headers, [])
+        self._headers_changed = True
+
+    def clear(self):
+        """Remove cabeçalhos e linhas."""
+        self.set_sheet_data([], [])
+
+    def headers(self):
+        """Retorna a lista de cabeçalhos (primeira linha da planilha)."""
+        return list(self._headers)
+
+    def append_empty_row(self):
+        """Adiciona uma linha vazia ao final da tabela."""
+        self.insertRows(self._row_count, 1)
+
+    def row_values(self, row):
+        """Retorna os valores de uma linha como lista."""
+        return [column[row] for column in self._columns]
+
+    def iter_rows(self):
+        """Itera pelas linhas de dados, cada uma como tupla de valores."""
+        if not self._columns:
+            for _ in range(self._row_count):
+                yield ()
+            return
+        yield from zip(*self._columns)
+
+    def is_modified(self):
+        """Indica se há alterações ainda não gravadas."""
+        return self._headers_changed or self._rows_removed or self._force_full_save or any(self._dirty_rows)
+
+    def build_save_plan(self):
+        """
+        Monta (na thread da GUI) uma cópia do que precisa ser gravado, para ser aplicada por um job em segundo plano.
+        Modo "delta": as linhas carregadas continuam nas mesmas posições (inserções só no final e remoções
+        só no final), então basta escrever as linhas alteradas/inseridas e cortar as linhas excedentes.
+        Modo "full": a planilha é limpa de uma só vez e reescrita.
+        """
+        in_place = not (self._headers_changed or self._force_full_save)
+        if in_place:
+            seen_inserted = False
+            for row_idx, source_row in enumerate(self._source_rows):
+                if source_row is None:
+                    seen_inserted = True
+                elif seen_inserted or source_row != row_idx + 2:
+                    in_place = False
+                    break
+
+        return {
+            "mode": "delta" if in_place else "full",
+            "headers": list(self._headers),
+            "rows": list(self.iter_rows()),
+            "changed_rows": [row_idx for row_idx, dirty in enumerate(self._dirty_rows) if dirty] if in_place else [],
+            "loaded_row_count": self._loaded_row_count,
+            "generation": self._generation,
+        }
+
+    def mark_saved(self, save_plan):
+        """
+        Chamado após a gravação de 'save_plan'. Se o modelo não foi alterado durante a gravação,
+        passa a considerá-lo idêntico ao arquivo; caso contrário, a próxima gravação será completa.
+        """
+        if save_plan["generation"] == self._generation:
+            self._reset_change_tracking()
+        else:
+            self._force_full_save = True
+
+    def mark_save_failed(self):
+        """
+        Chamado quando uma gravação falha ou é cancelada: as alterações continuam pendentes e, como o
+        arquivo pode ter ficado diferente do que foi carregado, a próxima gravação será completa.
+        """
+        self._force_full_save = True
+
+    def value(self, row, column):
+        """Retorna o valor bruto armazenado em uma célula."""
+        return self._columns[column][row]
+
+    def column_type(self, column):
+        """
+        Tipo esperado dos valores da coluna (ver cell_types). Por padrão é inferido dos valores carregados;
+        pode ser sobrescrito por subclasses com tipos declarados.
+        """
+        return infer_column_type(self._columns[column])
+
+    def display_text(self, row, column):
+        """Texto exibido para uma célula. Pode ser sobrescrito por subclasses."""
+        value = self._columns[column][row]
+        return str(value) if value is not None else ""
+
+    # --- Implementação de QAbstractTableModel ---
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self.display_text(index.row(), index.column())
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        # O texto digitado é convertido para o tipo da coluna, para que números e datas continuem nativos
+        value = parse_edited_value(value, self.column_type(index.column()))
+        self._columns[index.column()][index.row()] = value
+        self._dirty_rows[index.row()] = True
+        self._generation += 1
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if self.editable:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            if 0 <= section < len(self._headers):
+                header = self._headers[section]
+                return str(header) if header is not None else ""
+            return None
+        return str(section + 1)
+
+    def insertRows(self, row, count, parent=QModelIndex()):
+        if count <= 0 or row < 0 or row > self._row_count:
+            return False
+        self.beginInsertRows(parent, row, row + count - 1)
+        for column in self._columns:
+            column[row:row] = [None] * count
+        self._source_rows[row:row] = [None] * count
+        self._dirty_rows[row:row] = [True] * count
+        self._generation += 1
+        self._row_count += count
+        self.endInsertRows()
+        return True
+
+    def removeRows(self, row, count, parent=QModelIndex()):
+        if count <= 0 or row < 0 or row + count > self._row_count:
+            return False
+        self.beginRemoveRows(parent, row, row + count - 1)
+        for column in self._columns:
+            del column[row:row + count]
+        if any(source_row is not None for source_row in self._source_rows[row:row + count]):
+            self._rows_removed = True
+        del self._source_rows[row:row + count]
+        del self._dirty_rows[row:row + count]
+        self._generation += 1
+        self._row_count -= count
+        self.endRemoveRows()
+        return True
+
+
+class StreamingSheetTableModel(SheetTableModel):
+    """
+    SheetTableModel que consome as linhas de um iterador aos poucos (ex: ws.iter_rows de um
+    workbook aberto com read_only=True), em vez de materializar a planilha inteira antes de exibi-la.
+    O primeiro lote aparece imediatamente; os demais são buscados quando a view rola até o fim
+    (canFetchMore/fetchMore) e, se 'background' for True, também em segundo plano, um lote por
+    volta do loop de eventos, sem travar a interface.
+    """
+    rows_loaded = pyqtSignal(int, bool) # (linhas carregadas até agora, leitura concluída)
+
+    def __init__(self, parent=None, editable=False, batch_size=FETCH_BATCH_SIZE):
+        super().__init__(parent, editable=editable)
+        self.batch_size = batch_size
+        self._row_iterator = None
+        self._on_finished = None
+        self._background_timer = QTimer(self)
+        self._background_timer.setInterval(0)
+        self._background_timer.timeout.connect(self._fetch_in_background)
+
+    def start_stream(self, headers, row_iterator, on_finished=None, background=True):
+        """
+        Inicia a leitura incremental de 'row_iterator' (linhas de dados, sem o cabeçalho).
+        'on_finished' é chamado uma única vez quando o iterador se esgota ou a leitura é interrompida
+        (ex: para fechar o workbook somente leitura).
+        """
+        self.stop_stream()
+        self.set_sheet_data(headers, [])
+        self._row_iterator = iter(row_iterator)
+        self._on_finished = on_finished
+        self.fetchMore()
+        if background and self._row_iterator is not None:
+            self._background_timer.start()
+
+    def stop_stream(self):
+        """Interrompe a leitura incremental (se houver) e libera o iterador."""
+        self._background_timer.stop()
+        self._row_iterator = None
+        on_finished, self._on_finished = self._on_finished, None
+        if on_finished is not None:
+            on_finished()
+
+    def is_streaming(self):
+        """Indica se ainda há linhas a serem lidas do iterador."""
+        return self._row_iterator is not None
+
+    def clear(self):
+        self.stop_stream()
+        super().clear()
+        self.rows_loaded.emit(0, True)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return self._row_iterator is not None
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._row_iterator is None:
+            return
+        batch = list(islice(self._row_iterator, self.batch_size))
+        if batch:
+            first_row = self._row_count
+            self.beginInsertRows(QModelIndex(), first_row, first_row + len(batch) - 1)
+            for col_idx, column in enumerate(self._columns):
+                column.extend([row[col_idx] if col_idx < len(row) else None for row in batch])
+            self._source_rows.extend(range(first_row + 2, first_row + len(batch) + 2))
+            self._dirty_rows.extend([False] * len(batch))
+            self._loaded_row_count += len(batch)
+            self._row_count += len(batch)
+            self.endInsertRows()
+        if len(batch) < self.batch_size:
+            self.stop_stream()
+        self.rows_loaded.emit(self._row_count, not self.is_streaming())
+
+    def _fetch_in_background(self):
+        if self.canFetchMore():
+            self.fetchMore()
+        else:
+            self._background_timer.stop()
@@ -2,9 +2,151 @@ import os
 import openpyxl
 import sys
 import PyQt5
-from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QTreeWidget, QTreeWidgetItem, QLabel, QMessageBox, QHeaderView, QComboBox
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTreeWidget, QTreeWidgetItem, QLabel, QMessageBox, QHeaderView, QComboBox, QDialog, QTableView, QCheckBox, QInputDialog, QAbstractItemView
 from PyQt5.QtCore import Qt
 
+# Garante que a raiz do projeto esteja no sys.path para importar os módulos compartilhados de ui.tools
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from ui.tools.workbook_cache import get_sheet_names
+from ui.tools.io_worker import IOStatusBar
+from ui.tools.where_used import load_bom_index_with_where_used, get_where_used_index
+from ui.tools.bom_explosion import BomExplosion, BomCycleError
+from ui.tools.sheet_table_model import SheetTableModel
+
+# Papéis de dados guardados na coluna 0 de cada item da árvore
+PART_ID_ROLE = Qt.UserRole # Código do componente representado pelo item
+CHILDREN_LOADED_ROLE = Qt.UserRole + 1 # True quando os filhos do item já foram criados
+
+# Colunas usadas para descrever os itens no resultado da explosão (a primeira encontrada é usada)
+DESCRIPTION_HEADERS = ("part_description", "ComponentName", "descrição_extra")
+TYPE_HEADERS = ("part_type", "Type")
+
+
+def _format_quantity(quantity):
+    """Quantidade para exibição: inteiros sem casas decimais, demais arredondados."""
+    quantity = round(quantity, 6)
+    return int(quantity) if float(quantity).is_integer() else quantity
+
+
+class BomExplosionDialog(QDialog):
+    """Exibe o resultado de BomExplosion.explode_batch(): quantidades totais de cada item da estrutura."""
+    def __init__(self, bom_index, requests, result, parent=None):
+        super().__init__(parent)
+        self.bom_index = bom_index
+        self.result = result
+        requested = ", ".join(f"{_format_quantity(qty)} x {part_id}" for part_id, qty in requests[:10])
+        if len(requests) > 10:
+            requested += ", ..."
+        self.setWindowTitle("Explosão da Estrutura")
+        self.resize(800, 500)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel(f"<b>Explosão de:</b> {requested}"))
+
+        self.leaves_only_checkbox = QCheckBox("Mostrar apenas itens sem filhos (folhas e matérias-primas)")
+        self.leaves_only_checkbox.setChecked(True)
+        self.leaves_only_checkbox.toggled.connect(self._fill_table)
+        layout.addWidget(self.leaves_only_checkbox)
+
+        self.table = QTableView()
+        self.table_model = SheetTableModel(self, editable=False)
+        self.table.setModel(self.table_model)
+        self.table.setEditTriggers(QTableView.NoEditTriggers)
+        self.table.setAlternatingRowColors(True)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        layout.addWidget(self.table)
+
+        close_btn = QPushButton("Fechar")
+        close_btn.clicked.connect(self.close)
+        layout.addWidget(close_btn)
+
+        self._fill_table()
+
+    def _column_value(self, row, candidates):
+        for name in candidates:
+            if name in self.bom_index.headers:
+                col = self.bom_index.headers.index(name)
+                if row is not None and col < len(row) and row[col] is not None:
+                    return str(row[col])
+                return ""
+        return ""
+
+    def _fill_table(self):
+        parts = self.result["leaves"] if self.leaves_only_checkbox.isChecked() else self.result["demand"]
+        raw_materials = self.result["raw_materials"]
+        rows = []
+        for part_id in sorted(parts):
+            row = self.bom_index.row_values(part_id)
+            raw_quantity, raw_unit = raw_materials.get(part_id, (None, ""))
+            rows.append([
+                part_id,
+                self._column_value(row, DESCRIPTION_HEADERS),
+                self._column_value(row, TYPE_HEADERS),
+                _format_quantity(parts[part_id]),
+                "Sim" if part_id in self.result["leaves"] else "Não",
+                _format_quantity(raw_quantity) if raw_quantity is not None else None,
+                raw_unit,
+            ])
+        headers = ["Código", "Descrição", "Tipo", "Quantidade Total", "Sem Filhos", "Matéria-Prima (Qtd)", "Matéria-Prima (Unid)"]
+        self.table_model.set_sheet_data(headers, rows)
+
+class WhereUsedDialog(QDialog):
+    """Exibe o resultado de WhereUsedIndex.where_used(): todas as montagens que usam um item, com o nível."""
+    def __init__(self, where_used_index, part_id, bom_index=None, parent=None):
+        super().__init__(parent)
+        self.where_used_index = where_used_index
+        self.bom_index = bom_index # Opcional: usado apenas para mostrar a descrição dos itens
+        self.part_id = part_id
+        self.usages = where_used_index.where_used(part_id)
+        self.setWindowTitle(f"Onde é Usado: {part_id}")
+        self.resize(700, 450)
+
+        layout = QVBoxLayout(self)
+        top_count = sum(1 for usage_id, _ in self.usages if where_used_index.is_top_level(usage_id))
+        layout.addWidget(QLabel(f"<b>Item:</b> {part_id} — usado em {len(self.usages)} item(ns), "
+                                f"{top_count} de topo. <b>Pais diretos:</b> {len(where_used_index.direct_parents(part_id))}"))
+
+        self.top_only_checkbox = QCheckBox("Mostrar apenas itens de topo (produtos afetados)")
+        self.top_only_checkbox.toggled.connect(self._fill_table)
+        layout.addWidget(self.top_only_checkbox)
+
+        self.table = QTableView()
+        self.table_model = SheetTableModel(self, editable=False)
+        self.table.setModel(self.table_model)
+        self.table.setEditTriggers(QTableView.NoEditTriggers)
+        self.table.setAlternatingRowColors(True)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        layout.addWidget(self.table)
+
+        close_btn = QPushButton("Fechar")
+        close_btn.clicked.connect(self.close)
+        layout.addWidget(close_btn)
+
+        self._fill_table()
+
+    def _description(self, part_id):
+        if self.bom_index is None:
+            return ""
+        row = self.bom_index.row_values(part_id)
+        for name in DESCRIPTION_HEADERS:
+            if name in self.bom_index.headers:
+                col = self.bom_index.headers.index(name)
+                return str(row[col]) if row is not None and col < len(row) and row[col] is not None else ""
+        return ""
+
+    def _fill_table(self):
+        top_only = self.top_only_checkbox.isChecked()
+        rows = []
+        for usage_id, level in self.usages:
+            is_top = self.where_used_index.is_top_level(usage_id)
+            if top_only and not is_top:
+                continue
+            rows.append([usage_id, self._description(usage_id), level, "Sim" if is_top else "Não"])
+        self.table_model.set_sheet_data(["Código", "Descrição", "Nível", "Item de Topo"], rows)
+
 class StructureViewTool(QWidget):
     """
     GUI para visualizar a estrutura hierárquica (e.g., BOM ou estrutura de arquivo)
@@ -51,13 +193,36 @@ class StructureViewTool(QWidget):
         self.refresh_sheets_btn = QPushButton("Atualizar Abas")
         self.refresh_sheets_btn.clicked.connect(self._populate_sheet_selector)
         header_layout.addWidget(self.refresh_sheets_btn)
+
+        self.explode_btn = QPushButton("Explodir Estrutura")
+        self.explode_btn.setToolTip("Calcula as quantidades totais de todos os itens abaixo dos itens selecionados.")
+        self.explode_btn.clicked.connect(self._explode_selected_items)
+        header_layout.addWidget(self.explode_btn)
+
+        self.where_used_btn = QPushButton("Onde é Usado")
+        self.where_used_btn.setToolTip("Lista todas as montagens que usam o item selecionado, direta ou indiretamente.")
+        self.where_used_btn.clicked.connect(self._show_where_used)
+        header_layout.addWidget(self.where_used_btn)
         self.layout.addLayout(header_layout)
 
         self.structure_tree = QTreeWidget()
+        self.structure_tree.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.structure_tree.header().setSectionResizeMode(QHeaderView.Interactive)
+        # Os filhos de cada item só são criados quando ele é expandido
+        self.structure_tree.itemExpanded.connect(self._populate_children)
         # self.structure_tree.verticalHeader().setSectionResizeMode(QHeaderView.Interactive) # Vertical header not typically interactive
         self.layout.addWidget(self.structure_tree)
 
+        # Leitura da planilha e montagem do índice da estrutura em segundo plano
+        self.io_status = IOStatusBar(self)
+        self.layout.addWidget(self.io_status)
+
+        self.bom_index = None # BomIndex da planilha exibida
+        self._child_values_cache = {} # Código -> [(código do filho, valores exibidos)], compartilhado por todas as ocorrências
+        self._bom_explosion = None # BomExplosion do índice atual, criado na primeira explosão
+        self._explosion_dialog = None
+        self._where_used_dialog = None
+
         self._populate_sheet_selector() # Initial population and data load
 
     def _populate_sheet_selector(self):
@@ -72,8 +237,7 @@ class StructureViewTool(QWidget):
             return
 
         try:
-            wb = openpyxl.load_workbook(self.file_path, read_only=True)
-            sheet_names = wb.sheetnames
+            sheet_names = get_sheet_names(self.file_path)
             
             if not sheet_names:
                 QMessageBox.warning(self, "Nenhuma Planilha Encontrada", f"Nenhuma planilha encontrada em '{os.path.basename(self.file_path)}'.")
@@ -110,159 +274,193 @@ class StructureViewTool(QWidget):
             self.structure_tree.addTopLevelItem(QTreeWidgetItem(["N/A", "Arquivo ou planilha não selecionados/encontrados."]))
             return
 
-        try:
-            wb = openpyxl.load_workbook(self.file_path)
-            if current_sheet_name not in wb.sheetnames:
-                QMessageBox.warning(self, "Planilha Não Encontrada", f"A planilha '{current_sheet_name}' não foi encontrada em '{os.path.basename(self.file_path)}'.")
-                self.structure_tree.addTopLevelItem(QTreeWidgetItem(["N/A", "Planilha não encontrada."]))
-                return
+        # A planilha é lida e indexada (código -> linha, pai -> filhos, raízes) em uma única passada, fora da thread da GUI;
+        # as mesmas ligações atualizam o índice "onde é usado" persistido
+        self.io_status.run(load_bom_index_with_where_used, self.file_path, current_sheet_name,
+                           message=f"Carregando a estrutura de '{current_sheet_name}'...",
+                           on_finished=lambda index, name=current_sheet_name: self._on_structure_loaded(name, index),
+                           on_failed=lambda error, name=current_sheet_name: self._on_structure_load_failed(name, error))
+
+    def _on_structure_loaded(self, current_sheet_name, index):
+        """
+        Monta a árvore a partir do BomIndex lido em segundo plano.
+        Apenas as raízes (e o primeiro nível abaixo delas) são criadas agora; os demais níveis são
+        criados ao expandir cada item, então o tempo de exibição não depende da profundidade da estrutura.
+        """
+        self.structure_tree.clear()
+        self.bom_index = index
+        self._child_values_cache = {}
+        self._bom_explosion = None
+
+        if not index.headers:
+            QMessageBox.information(self, "Planilha Vazia", 
+                                    f"A planilha '{current_sheet_name}' está vazia ou não possui cabeçalhos. Nenhuma estrutura para exibir.")
+            self.structure_tree.addTopLevelItem(QTreeWidgetItem(["N/A", "Nenhum dado de estrutura."]))
+            return
 
-            sheet = wb[current_sheet_name]
-            
-            # Carrega cabeçalhos da primeira linha da planilha
-            headers = [cell.value for cell in sheet[1]] if sheet.max_row > 0 else []
-            
-            if not headers:
-                QMessageBox.information(self, "Planilha Vazia", 
-                                        f"A planilha '{current_sheet_name}' está vazia ou não possui cabeçalhos. Nenhuma estrutura para exibir.")
-                self.structure_tree.addTopLevelItem(QTreeWidgetItem(["N/A", "Nenhum dado de estrutura."]))
-                return
-            
-            self.structure_tree.setHeaderLabels(headers)
-            
-            parent_id_col = -1
-            component_id_col = -1
-            
-            # Tenta encontrar colunas de ID e ParentID com base nos nomes esperados
-            # priorizando nomes de engenharia.xlsx, depois nomes genéricos
-            try:
-                parent_id_col = headers.index("parent_part_number")
-            except ValueError:
-                if "ParentID" in headers:
-                    parent_id_col = headers.index("ParentID")
-
-            try:
-                component_id_col = headers.index("part_number")
-            except ValueError:
-                if "ComponentID" in headers:
-                    component_id_col = headers.index("ComponentID")
-
-            if parent_id_col == -1 or component_id_col == -1:
-                QMessageBox.critical(self, "Erro de Cabeçalho", 
-                                     "Não foi possível identificar as colunas de ID do Componente (ex: 'part_number' ou 'ComponentID') "
-                                     "e ID do Pai (ex: 'parent_part_number' ou 'ParentID'). "
-                                     "Verifique os cabeçalhos da planilha selecionada.")
-                self.structure_tree.addTopLevelItem(QTreeWidgetItem(["Erro", "Cabeçalhos de estrutura não encontrados."]))
-                return
+        self.structure_tree.setHeaderLabels(index.headers)
 
-            children_map = {}
-            all_component_ids = set()
-            all_parent_ids_in_data = set()
+        if not index.has_structure_columns():
+            QMessageBox.critical(self, "Erro de Cabeçalho", 
+                                 "Não foi possível identificar as colunas de ID do Componente (ex: 'part_number' ou 'ComponentID') "
+                                 "e ID do Pai (ex: 'parent_part_number' ou 'ParentID'). "
+                                 "Verifique os cabeçalhos da planilha selecionada.")
+            self.structure_tree.addTopLevelItem(QTreeWidgetItem(["Erro", "Cabeçalhos de estrutura não encontrados."]))
+            return
 
-            for row_idx in range(2, sheet.max_row + 1): # Começa da segunda linha (após os cabeçalhos)
-                row_values = [str(cell.value) if cell.value is not None else "" for cell in sheet[row_idx]]
-                
-                # Garante que a linha tem dados suficientes para as colunas de ID
-                if len(row_values) > max(parent_id_col, component_id_col):
-                    parent_id = row_values[parent_id_col].strip()
-                    component_id = row_values[component_id_col].strip()
-
-                    if component_id: 
-                        all_component_ids.add(component_id)
-                        if parent_id:
-                            all_parent_ids_in_data.add(parent_id)
-                            if parent_id not in children_map:
-                                children_map[parent_id] = []
-                            children_map[parent_id].append({"ID": component_id, "Data": row_values})
-            
-            # Identifica os itens raiz (aqueles que são componentes mas não são filhos de ninguém listado)
-            # ou que explicitamente têm parent_id vazio
-            root_items_ids = []
-            for component_id in all_component_ids:
-                if component_id not in all_parent_ids_in_data:
-                    # Verifica também se há explicitamente uma linha onde o parent_id está vazio para este component_id
-                    found_empty_parent = False
-                    for row_idx in range(2, sheet.max_row + 1):
-                        row_values = [str(cell.value) if cell.value is not None else "" for cell in sheet[row_idx]]
-                        if len(row_values) > max(parent_id_col, component_id_col) and \
-                           row_values[component_id_col].strip() == component_id and \
-                           row_values[parent_id_col].strip() == "":
-                           found_empty_parent = True
-                           break
-                    if found_empty_parent:
-                        root_items_ids.append(component_id)
-
-            # Fallback para caso não haja raízes claras (e.g., uma lista simples sem hierarquia clara)
-            if not root_items_ids and all_component_ids:
-                # Se houver apenas um componente, ele é a raiz
-                if len(all_component_ids) == 1:
-                    root_items_ids = list(all_component_ids)
-                else:
-                    # Se múltiplos, e não há parent_id vazio, escolha o primeiro como raiz
-                    # Isso pode não ser ideal para todas as estruturas, mas fornece um ponto de partida
-                    QMessageBox.information(self, "Aviso de Estrutura", 
-                                            "Não foi possível identificar raízes claras na estrutura. Exibindo o primeiro componente encontrado como raiz.")
-                    root_items_ids = [list(all_component_ids)[0]]
-
-            if not root_items_ids:
-                QMessageBox.information(self, "Nenhuma Estrutura Encontrada", 
-                                        f"Nenhum dado de estrutura hierárquica válido encontrado na planilha '{current_sheet_name}' do arquivo '{os.path.basename(self.file_path)}'. "
-                                        "Verifique se as colunas de ID do Componente e ID do Pai estão presentes e corretas.")
-                self.structure_tree.addTopLevelItem(QTreeWidgetItem(["N/A", "Nenhum dado de estrutura."]))
-                return
+        if not index.root_ids:
+            QMessageBox.information(self, "Nenhuma Estrutura Encontrada", 
+                                    f"Nenhum dado de estrutura hierárquica válido encontrado na planilha '{current_sheet_name}' do arquivo '{os.path.basename(self.file_path)}'. "
+                                    "Verifique se as colunas de ID do Componente e ID do Pai estão presentes e corretas.")
+            self.structure_tree.addTopLevelItem(QTreeWidgetItem(["N/A", "Nenhum dado de estrutura."]))
+            return
 
-            for root_id in root_items_ids:
-                root_data = None
-                # Busca a linha completa do item raiz para popular o QTreeWidgetItem
-                for row_idx in range(2, sheet.max_row + 1):
-                    row_values = [str(cell.value) if cell.value is not None else "" for cell in sheet[row_idx]]
-                    if len(row_values) > component_id_col and row_values[component_id_col].strip() == root_id:
-                        root_data = row_values
-                        break
-                
-                if root_data:
-                    root_q_item = QTreeWidgetItem(root_data)
-                    self.structure_tree.addTopLevelItem(root_q_item)
-                    self._add_items_to_tree(root_q_item, children_map, root_id, headers, parent_id_col, component_id_col)
-                else: 
-                    # Cria um item raiz "dummy" se a linha de dados completa para o ID raiz não for encontrada
-                    # (isso pode acontecer se um ID for uma raiz mas só aparecer como pai de outros)
-                    dummy_root_item = QTreeWidgetItem([root_id] + [""] * (len(headers) - 1)) # Preenche com vazios
-                    self.structure_tree.addTopLevelItem(dummy_root_item)
-                    self._add_items_to_tree(dummy_root_item, children_map, root_id, headers, parent_id_col, component_id_col)
-                    QMessageBox.warning(self, "Aviso de Estrutura", 
-                                        f"O item raiz '{root_id}' foi identificado, mas sua linha de dados completa não foi encontrada para exibição. "
-                                        "Exibindo apenas a subestrutura (se houver).")
-
-            self.structure_tree.expandAll() # Expande todos os nós por padrão para visualização completa
+        if index.roots_inferred:
+            QMessageBox.information(self, "Aviso de Estrutura", 
+                                    "Nenhum item com o pai vazio foi encontrado. Exibindo como raízes os itens que não são filhos de nenhum outro.")
 
-        except Exception as e:
-            QMessageBox.critical(self, "Erro ao Carregar Estrutura", f"Erro ao carregar dados da estrutura de '{os.path.basename(self.file_path)}' ({current_sheet_name}): {e}")
-            self.structure_tree.clear()
-            self.structure_tree.addTopLevelItem(QTreeWidgetItem(["Erro", "Erro ao carregar dados. Detalhes: " + str(e)]))
-
-    def _add_items_to_tree(self, parent_qtree_item, children_map, current_item_id, headers, parent_id_col, component_id_col):
-        """Adiciona recursivamente itens ao QTreeWidget com base nas relações pai-filho."""
-        if current_item_id in children_map:
-            for child_entry in children_map[current_item_id]:
-                child_id = child_entry["ID"]
-                child_row_values = child_entry["Data"]
-                
-                item_values = [""] * len(headers) # Inicializa com strings vazias para o tamanho correto
-                for h_idx, header_name in enumerate(headers):
-                    if h_idx < len(child_row_values):
-                        item_values[h_idx] = child_row_values[h_idx]
-                
-                # Garante que o item pai não exiba seu próprio ID de componente como o ID do pai de seus filhos
-                # A coluna parent_id_col deve ser vazia para os filhos diretos na exibição hierárquica
-                # ou exibir o valor real se preferir, mas geralmente a hierarquia já é mostrada pela árvore.
-                # Se desejar ocultar o parent_id na exibição dos filhos, descomente a linha abaixo
-                # if parent_id_col != -1 and parent_id_col < len(item_values):
-                #     item_values[parent_id_col] = "" 
-
-                q_item = QTreeWidgetItem([str(v) if v is not None else "" for v in item_values])
-                parent_qtree_item.addChild(q_item)
-                self._add_items_to_tree(q_item, children_map, child_id, headers, parent_id_col, component_id_col)
+        missing_root_ids = []
+        for root_id in index.root_ids:
+            root_data = index.row_values(root_id)
+            if root_data is not None:
+                root_q_item = self._create_tree_item(root_id, index.display_values(root_data))
+            else:
+                # Cria um item raiz "dummy" se a linha de dados completa para o ID raiz não for encontrada
+                # (isso pode acontecer se um ID for uma raiz mas só aparecer como pai de outros)
+                root_q_item = self._create_tree_item(root_id, self._id_only_values(index, root_id))
+                missing_root_ids.append(root_id)
+            self.structure_tree.addTopLevelItem(root_q_item)
+
+        if missing_root_ids:
+            QMessageBox.warning(self, "Aviso de Estrutura", 
+                                f"Os itens raiz {', '.join(missing_root_ids)} foram identificados, mas suas linhas de dados não foram encontradas para exibição. "
+                                "Exibindo apenas a subestrutura (se houver).")
+        if index.cycles:
+            cycle_texts = [" -> ".join(cycle) for cycle in index.cycles[:10]]
+            QMessageBox.warning(self, "Ciclos na Estrutura", 
+                                f"A estrutura contém {len(index.cycles)} ciclo(s); eles foram interrompidos na exibição:\n" + "\n".join(cycle_texts))
+
+        # Expande só o primeiro nível (expandAll criaria a estrutura inteira de uma vez)
+        for i in range(self.structure_tree.topLevelItemCount()):
+            self.structure_tree.topLevelItem(i).setExpanded(True)
+
+    def _on_structure_load_failed(self, current_sheet_name, error):
+        QMessageBox.critical(self, "Erro ao Carregar Estrutura", f"Erro ao carregar dados da estrutura de '{os.path.basename(self.file_path)}' ({current_sheet_name}): {error}")
+        self.structure_tree.clear()
+        self.structure_tree.addTopLevelItem(QTreeWidgetItem(["Erro", "Erro ao carregar dados. Detalhes: " + str(error)]))
+
+    def _id_only_values(self, index, part_id):
+        """Valores de um item sem linha própria: apenas o código, na coluna do componente."""
+        values = [""] * len(index.headers)
+        values[index.component_id_col] = part_id
+        return values
+
+    def _create_tree_item(self, part_id, values):
+        """Cria o item da árvore de um componente; os filhos são criados só quando ele for expandido."""
+        q_item = QTreeWidgetItem(values)
+        q_item.setData(0, PART_ID_ROLE, part_id)
+        if self.bom_index.child_entries(part_id):
+            q_item.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
+        return q_item
+
+    def _child_values(self, part_id):
+        """
+        Filhos de um componente com os valores já formatados para exibição.
+        Calculado uma única vez por código: uma submontagem repetida em vários pontos da estrutura reaproveita a mesma lista.
+        """
+        child_values = self._child_values_cache.get(part_id)
+        if child_values is None:
+            child_values = [(child_id, self.bom_index.display_values(row)) for child_id, row in self.bom_index.child_entries(part_id)]
+            self._child_values_cache[part_id] = child_values
+        return child_values
+
+    def _populate_children(self, q_item):
+        """
+        Cria os filhos diretos de um item na primeira vez em que ele é expandido.
+        Um filho que já aparece no caminho desde a raiz é marcado como ciclo e não pode ser expandido.
+        """
+        if self.bom_index is None or q_item.data(0, CHILDREN_LOADED_ROLE):
+            return
+        part_id = q_item.data(0, PART_ID_ROLE)
+        if part_id is None:
+            return
+        q_item.setData(0, CHILDREN_LOADED_ROLE, True)
+
+        ancestors = set()
+        ancestor_item = q_item
+        while ancestor_item is not None:
+            ancestors.add(ancestor_item.data(0, PART_ID_ROLE))
+            ancestor_item = ancestor_item.parent()
+
+        child_items = []
+        for child_id, values in self._child_values(part_id):
+            if child_id in ancestors:
+                child_item = QTreeWidgetItem(values)
+                child_item.setText(0, f"{child_item.text(0)} (ciclo)")
+                child_item.setToolTip(0, f"'{child_id}' já aparece acima nesta estrutura; a expansão foi interrompida.")
+            else:
+                child_item = self._create_tree_item(child_id, values)
+            child_items.append(child_item)
+        q_item.addChildren(child_items)
+        q_item.setChildIndicatorPolicy(QTreeWidgetItem.DontShowIndicatorWhenChildless)
+
+    def _explode_selected_items(self):
+        """Explode N unidades de cada item selecionado na árvore (ou das raízes, se nada estiver selecionado)."""
+        if self.bom_index is None or not self.bom_index.has_structure_columns():
+            QMessageBox.warning(self, "Nenhuma Estrutura", "Carregue uma planilha de estrutura antes de explodi-la.")
+            return
+
+        part_ids = []
+        for q_item in self.structure_tree.selectedItems():
+            part_id = q_item.data(0, PART_ID_ROLE)
+            if part_id is not None and part_id not in part_ids:
+                part_ids.append(part_id)
+        if not part_ids:
+            part_ids = list(self.bom_index.root_ids)
+        if not part_ids:
+            QMessageBox.information(self, "Nenhum Item", "Nenhum item para explodir.")
+            return
+
+        items_text = ", ".join(part_ids[:5]) + (", ..." if len(part_ids) > 5 else "")
+        quantity, ok = QInputDialog.getDouble(self, "Explodir Estrutura",
+                                              f"Quantidade de cada item ({items_text}):", 1.0, 0.0001, 1e12, 4)
+        if not ok:
+            return
+
+        # O grafo e a ordem topológica são montados uma única vez por estrutura carregada
+        if self._bom_explosion is None:
+            self._bom_explosion = BomExplosion(self.bom_index)
+            if self._bom_explosion.warnings:
+                QMessageBox.warning(self, "Quantidades Inválidas", "\n".join(self._bom_explosion.warnings[:10]))
+        requests = [(part_id, quantity) for part_id in part_ids]
+        try:
+            result = self._bom_explosion.explode_batch(requests)
+        except (BomCycleError, KeyError) as e:
+            QMessageBox.warning(self, "Erro na Explosão", str(e))
+            return
+
+        self._explosion_dialog = BomExplosionDialog(self.bom_index, requests, result, self)
+        self._explosion_dialog.show()
+
+    def _show_where_used(self):
+        """Mostra onde o item selecionado é usado (análise de impacto de uma alteração de engenharia)."""
+        if self.bom_index is None or not self.bom_index.has_structure_columns():
+            QMessageBox.warning(self, "Nenhuma Estrutura", "Carregue uma planilha de estrutura antes de consultar onde um item é usado.")
+            return
+        selected_items = self.structure_tree.selectedItems()
+        part_id = selected_items[0].data(0, PART_ID_ROLE) if selected_items else None
+        if not part_id:
+            QMessageBox.information(self, "Nenhum Item", "Selecione um item na árvore.")
+            return
+
+        # O índice já foi atualizado ao carregar a estrutura; refresh() só relê se o arquivo mudou desde então
+        try:
+            where_used_index = get_where_used_index(self.file_path, self.sheet_selector.currentText())
+        except (OSError, KeyError, ValueError) as e:
+            QMessageBox.critical(self, "Erro no Índice", f"Não foi possível atualizar o índice 'onde é usado':\n{e}")
+            return
+        self._where_used_dialog = WhereUsedDialog(where_used_index, part_id, self.bom_index, self)
+        self._where_used_dialog.show()
 
 # Exemplo de uso (para testar este módulo individualmente)
 if __name__ == "__main__":
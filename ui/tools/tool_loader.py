@@ -0,0 +1,43 @@
+import importlib
+import threading
+
+_tool_classes = {} # (module_path, class_name) -> classe já carregada
+_tool_classes_lock = threading.Lock()
+
+
+def load_tool_class(module_path, class_name):
+    """
+    Importa o módulo de uma ferramenta (registrado em tools.xlsx) e retorna sua classe.
+    O módulo só é importado na primeira vez; as chamadas seguintes usam a classe já carregada.
+    Lança ImportError (módulo inexistente) ou AttributeError (classe inexistente), como importlib/getattr.
+    """
+    key = (module_path, class_name)
+    with _tool_classes_lock:
+        tool_class = _tool_classes.get(key)
+    if tool_class is None:
+        # O import em si não fica sob o lock: o importlib já impede que o mesmo módulo seja executado duas vezes
+        tool_class = getattr(importlib.import_module(module_path), class_name)
+        with _tool_classes_lock:
+            _tool_classes[key] = tool_class
+    return tool_class
+
+
+def prewarm_tool_modules(modules):
+    """
+    Importa em uma thread de segundo plano os módulos das ferramentas ('modules': lista de
+    (module_path, class_name)), para que a primeira abertura de cada ferramenta não espere pelo import.
+    Só importa (não cria widgets); falhas são ignoradas aqui e reaparecem ao abrir a ferramenta.
+    Retorna a thread iniciada.
+    """
+    modules = list(modules)
+
+    def run():
+        for module_path, class_name in modules:
+            try:
+                load_tool_class(module_path, class_name)
+            except Exception as e:
+                print(f"Aviso: Pré-carregamento de '{module_path}' falhou: {e}")
+
+    thread = threading.Thread(target=run, name="prewarm-tool-modules", daemon=True)
+    thread.start()
+    return thread
@@ -1,19 +1,22 @@
 import os
-import openpyxl
+import sys
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QMessageBox
 from PyQt5.QtCore import Qt
 
 # Definindo caminhos de forma dinâmica a partir da localização do script
 current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(os.path.dirname(current_dir)) # Navega de ui/tools para a raiz do projeto
-user_sheets_dir = os.path.join(project_root, 'user_sheets')
-DB_EXCEL_PATH = os.path.join(user_sheets_dir, "db.xlsx")
+
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from backend.auth_store import get_auth_store
 
 class UserSettingsTool(QWidget):
     """
     Ferramenta para gerenciar as configurações do perfil do usuário.
     Permite visualizar e editar informações como nome completo, email, telefone e departamento.
-    As alterações são salvas na planilha 'users' dentro de 'db.xlsx'.
+    As alterações são salvas no banco de autenticação (auth.sqlite3), o mesmo usado no login.
     """
     def __init__(self, user_data):
         super().__init__()
@@ -90,106 +93,37 @@ class UserSettingsTool(QWidget):
         return line_edit
 
     def _load_user_profile_data(self):
-        """Carrega os dados do perfil do usuário da planilha 'users' para os campos da GUI."""
+        """Carrega os dados do perfil do usuário do banco de autenticação para os campos da GUI."""
         try:
-            if not os.path.exists(DB_EXCEL_PATH):
-                QMessageBox.warning(self, "Erro de Carregamento", "O arquivo de banco de dados 'db.xlsx' não foi encontrado.")
-                return
-
-            wb = openpyxl.load_workbook(DB_EXCEL_PATH)
-            if "users" not in wb.sheetnames:
-                QMessageBox.warning(self, "Erro de Carregamento", "A planilha 'users' não foi encontrada em 'db.xlsx'.")
-                return
-
-            sheet = wb["users"]
-            headers = [cell.value for cell in sheet[1]] if sheet.max_row > 0 else []
-            header_map = {h: idx for idx, h in enumerate(headers)}
-
-            # Encontra a linha do usuário logado
-            user_row_idx = -1
-            username_col_idx = header_map.get("username")
-            if username_col_idx is None:
-                QMessageBox.warning(self, "Erro de Configuração", "A coluna 'username' não foi encontrada na planilha 'users'.")
-                return
-
-            for row_idx in range(2, sheet.max_row + 1):
-                cell_value = sheet.cell(row=row_idx, column=username_col_idx + 1).value
-                if cell_value == self.user_data.get("username"):
-                    user_row_idx = row_idx
-                    break
-            
-            if user_row_idx == -1:
-                QMessageBox.warning(self, "Usuário Não Encontrado", f"O usuário '{self.user_data.get('username')}' não foi encontrado na planilha 'users'.")
+            user = get_auth_store().get_user(self.user_data.get("username"))
+            if user is None:
+                QMessageBox.warning(self, "Usuário Não Encontrado", f"O usuário '{self.user_data.get('username')}' não foi encontrado no banco de autenticação.")
                 return
 
             # Preenche os campos da GUI com os dados do usuário
-            row_values = [sheet.cell(row=user_row_idx, column=col_idx + 1).value for col_idx in range(len(headers))]
-            
-            self.full_name_input.setText(str(row_values[header_map.get("full_name", -1)]) if header_map.get("full_name", -1) != -1 and header_map["full_name"] < len(row_values) else "")
-            self.email_input.setText(str(row_values[header_map.get("email", -1)]) if header_map.get("email", -1) != -1 and header_map["email"] < len(row_values) else "")
-            self.phone_input.setText(str(row_values[header_map.get("phone", -1)]) if header_map.get("phone", -1) != -1 and header_map["phone"] < len(row_values) else "")
-            self.department_input.setText(str(row_values[header_map.get("department", -1)]) if header_map.get("department", -1) != -1 and header_map["department"] < len(row_values) else "")
+            self.full_name_input.setText(user.get("full_name") or "")
+            self.email_input.setText(user.get("email") or "")
+            self.phone_input.setText(user.get("phone") or "")
+            self.department_input.setText(user.get("department") or "")
 
         except Exception as e:
             QMessageBox.critical(self, "Erro de Carregamento", f"Ocorreu um erro ao carregar os dados do perfil: {e}")
 
     def _save_user_profile_data(self):
-        """Salva as alterações do perfil do usuário de volta para a planilha 'users'."""
+        """Salva as alterações do perfil do usuário no banco de autenticação (uma transação)."""
+        profile = {
+            "full_name": self.full_name_input.text(),
+            "email": self.email_input.text(),
+            "phone": self.phone_input.text(),
+            "department": self.department_input.text(),
+        }
         try:
-            if not os.path.exists(DB_EXCEL_PATH):
-                QMessageBox.critical(self, "Erro de Salvamento", "O arquivo de banco de dados 'db.xlsx' não foi encontrado.")
-                return
-
-            wb = openpyxl.load_workbook(DB_EXCEL_PATH)
-            if "users" not in wb.sheetnames:
-                QMessageBox.critical(self, "Erro de Salvamento", "A planilha 'users' não foi encontrada em 'db.xlsx'.")
-                return
-
-            sheet = wb["users"]
-            headers = [cell.value for cell in sheet[1]] if sheet.max_row > 0 else []
-            header_map = {h: idx for idx, h in enumerate(headers)}
-
-            # Garante que as colunas essenciais existem ou as adiciona se necessário (para nova instalação ou arquivo corrompido)
-            required_profile_headers = ["full_name", "email", "phone", "department"]
-            missing_headers = [h for h in required_profile_headers if h not in header_map]
-
-            if missing_headers:
-                # Adiciona os cabeçalhos que faltam na primeira linha
-                for header in missing_headers:
-                    headers.append(header)
-                sheet.cell(row=1, column=len(headers)).value = missing_headers[-1] # Adiciona o último missing_header
-                header_map = {h: idx for idx, h in enumerate(headers)} # Recria o mapa
-
-            # Encontra a linha do usuário logado
-            user_row_idx = -1
-            username_col_idx = header_map.get("username")
-            if username_col_idx is None:
-                QMessageBox.critical(self, "Erro de Configuração", "A coluna 'username' é essencial e não foi encontrada na planilha 'users'. Não é possível salvar.")
-                return
-
-            for row_idx in range(2, sheet.max_row + 1):
-                cell_value = sheet.cell(row=row_idx, column=username_col_idx + 1).value
-                if cell_value == self.user_data.get("username"):
-                    user_row_idx = row_idx
-                    break
-            
-            if user_row_idx == -1:
+            if not get_auth_store().update_profile(self.user_data.get("username"), **profile):
                 QMessageBox.critical(self, "Erro de Salvamento", f"O usuário '{self.user_data.get('username')}' não foi encontrado para atualização. As alterações não foram salvas.")
                 return
 
-            # Atualiza os valores das células
-            sheet.cell(row=user_row_idx, column=header_map.get("full_name", len(headers)) + 1).value = self.full_name_input.text()
-            sheet.cell(row=user_row_idx, column=header_map.get("email", len(headers)) + 1).value = self.email_input.text()
-            sheet.cell(row=user_row_idx, column=header_map.get("phone", len(headers)) + 1).value = self.phone_input.text()
-            sheet.cell(row=user_row_idx, column=header_map.get("department", len(headers)) + 1).value = self.department_input.text()
-            
-            wb.save(DB_EXCEL_PATH)
-            
             # Atualiza os dados na memória (self.user_data) para refletir as mudanças
-            self.user_data["full_name"] = self.full_name_input.text()
-            self.user_data["email"] = self.email_input.text()
-            self.user_data["phone"] = self.phone_input.text()
-            self.user_data["department"] = self.department_input.text()
+            self.user_data.update(profile)
 
             QMessageBox.information(self, "Sucesso", "Dados do perfil atualizados com sucesso!")
 
@@ -204,37 +138,16 @@ if __name__ == "__main__":
 
     app = QApplication(sys.argv)
 
-    # Configura um caminho de teste para db.xlsx para o ambiente de teste da tool
-    project_root_test = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    user_sheets_dir_test = os.path.join(project_root_test, 'user_sheets')
-    os.makedirs(user_sheets_dir_test, exist_ok=True)
-    db_test_path = os.path.join(user_sheets_dir_test, "db.xlsx")
-
-    # Cria um db.xlsx de teste com a planilha users se não existir
-    if not os.path.exists(db_test_path):
-        db_wb = openpyxl.Workbook()
-        db_ws_users = db_wb.active 
-        db_ws_users.title = "users"
-        # Adiciona cabeçalhos completos para o teste de perfil
-        db_ws_users.append(["id", "username", "password_hash", "role", "full_name", "email", "phone", "department"])
-        # Use hashes reais para produção
-        db_ws_users.append([1, "admin", bcrypt.hashpw("admin_pass".encode(), bcrypt.gensalt()).decode(), "admin", "Admin Teste", "admin@teste.com", "123456789", "TI"]) 
-        db_ws_users.append([2, "user", bcrypt.hashpw("user_pass".encode(), bcrypt.gensalt()).decode(), "user", "Usuario Teste", "user@teste.com", "987654321", "Vendas"])
-        db_wb.save(db_test_path)
-        print(f"Arquivo de teste db.xlsx criado/atualizado em: {db_test_path}")
+    # Cria um usuário de teste no banco de autenticação, se ainda não existir
+    store = get_auth_store()
+    if store.get_user("admin") is None:
+        store.add_user("admin", bcrypt.hashpw("admin_pass".encode(), bcrypt.gensalt()).decode(), "admin")
+        store.update_profile("admin", full_name="Admin Teste", email="admin@teste.com", phone="123456789", department="TI")
+        print(f"Usuário de teste 'admin' criado em: {store.path}")
 
     # Dados do usuário logado para simular o uso
     # Este dicionário seria passado pelo LoginWindow para o TeamcenterStyleGUI, e então para a ferramenta
-    test_user_data = {
-        "id": 1,
-        "username": "admin",
-        "password_hash": bcrypt.hashpw("admin_pass".encode(), bcrypt.gensalt()).decode(),
-        "role": "admin",
-        "full_name": "Admin Teste",
-        "email": "admin@teste.com",
-        "phone": "123456789",
-        "department": "TI"
-    }
+    test_user_data = store.get_user("admin")
 
     window = UserSettingsTool(test_user_data)
     window.show()
@@ -0,0 +1,245 @@
+import os
+import json
+import threading
+from collections import deque
+
+import openpyxl
+
+from ui.tools.bom_index import normalize_part_id, find_structure_columns, load_bom_index
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+USER_SHEETS_DIR = os.path.join(project_root, "user_sheets")
+ENGENHARIA_EXCEL_PATH = os.path.join(USER_SHEETS_DIR, "engenharia.xlsx")
+STRUCTURE_SHEET_NAME = "Estrutura"
+
+# Índices persistidos (um por arquivo/planilha de estrutura), com o tamanho/mtime do arquivo de origem.
+WHERE_USED_INDEX_PATH = os.path.join(USER_SHEETS_DIR, "where_used_index.json")
+WHERE_USED_INDEX_VERSION = 1
+
+
+def _file_stamp(file_path):
+    """[tamanho, mtime em ns] do arquivo, ou None se ele não existir."""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _source_key(file_path, sheet_name):
+    """Chave do índice no arquivo persistido: caminho relativo à raiz do projeto + planilha."""
+    relative_path = os.path.relpath(os.path.abspath(file_path), project_root).replace('\\', '/')
+    return f"{relative_path}|{sheet_name}"
+
+
+def read_structure_edges(file_path, sheet_name):
+    """Lê, em modo somente leitura, as ligações (filho, pai) de uma planilha de estrutura."""
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        if sheet_name not in wb.sheetnames:
+            raise KeyError(f"A planilha '{sheet_name}' não foi encontrada em '{os.path.basename(file_path)}'.")
+        rows = wb[sheet_name].iter_rows(values_only=True)
+        headers = ["" if h is None else str(h) for h in (next(rows, None) or [])]
+        parent_col, component_col = find_structure_columns(headers)
+        if parent_col == -1 or component_col == -1:
+            raise ValueError(f"A planilha '{sheet_name}' não possui as colunas de estrutura (ex: 'part_number' e 'parent_part_number').")
+        return edges_from_rows(rows, parent_col, component_col)
+    finally:
+        wb.close()
+
+
+def edges_from_rows(rows, parent_col, component_col):
+    """Conjunto de ligações (filho, pai) das linhas de dados de uma planilha de estrutura."""
+    edges = set()
+    for row in rows:
+        if len(row) <= max(parent_col, component_col):
+            continue
+        child_id = normalize_part_id(row[component_col])
+        parent_id = normalize_part_id(row[parent_col])
+        if child_id and parent_id:
+            edges.add((child_id, parent_id))
+    return edges
+
+
+class WhereUsedIndex:
+    """
+    Índice reverso "onde é usado" de uma planilha de estrutura: filho -> pais diretos, com consulta
+    transitiva (todas as montagens que usam um item, em qualquer nível).
+    O índice é persistido em WHERE_USED_INDEX_PATH junto com o tamanho/mtime do arquivo de origem;
+    quando o arquivo muda, as ligações são relidas e apenas a diferença (ligações adicionadas e removidas)
+    é aplicada ao índice.
+    """
+    def __init__(self, file_path, sheet_name):
+        self.file_path = file_path
+        self.sheet_name = sheet_name
+        self.stamp = None # [tamanho, mtime] do arquivo quando as ligações foram lidas
+        self.edges = set() # Ligações (filho, pai)
+        self.parents_of = {} # Filho -> conjunto de pais diretos
+        self._parent_use_count = {} # Pai -> quantidade de ligações em que aparece
+        self._where_used_cache = {} # Resultados transitivos já calculados
+        self._lock = threading.RLock()
+
+    def update_edges(self, edges, stamp):
+        """
+        Aplica ao índice somente as diferenças entre as ligações atuais e 'edges'.
+        Retorna (quantidade de ligações adicionadas, quantidade removida).
+        """
+        with self._lock:
+            added = edges - self.edges
+            removed = self.edges - edges
+            for child_id, parent_id in removed:
+                parents = self.parents_of.get(child_id)
+                if parents is not None:
+                    parents.discard(parent_id)
+                    if not parents:
+                        del self.parents_of[child_id]
+                count = self._parent_use_count.get(parent_id, 0) - 1
+                if count > 0:
+                    self._parent_use_count[parent_id] = count
+                else:
+                    self._parent_use_count.pop(parent_id, None)
+            for child_id, parent_id in added:
+                self.parents_of.setdefault(child_id, set()).add(parent_id)
+                self._parent_use_count[parent_id] = self._parent_use_count.get(parent_id, 0) + 1
+            self.edges = set(edges)
+            self.stamp = stamp
+            if added or removed:
+                # Uma ligação alterada pode afetar o resultado transitivo de qualquer descendente
+                self._where_used_cache.clear()
+            return len(added), len(removed)
+
+    def update_from_bom_index(self, bom_index, stamp):
+        """Atualiza o índice a partir de um BomIndex já montado (sem reler o arquivo) e o persiste se mudou."""
+        edges = {(child_id, parent_id) for parent_id, entries in bom_index.children.items() for child_id, _ in entries}
+        added, removed = self.update_edges(edges, stamp)
+        if added or removed or not self._is_persisted():
+            self.save()
+
+    def refresh(self):
+        """
+        Relê as ligações se o arquivo de origem mudou desde a última atualização (tamanho/mtime).
+        Retorna True se o índice foi atualizado.
+        """
+        with self._lock:
+            stamp = _file_stamp(self.file_path)
+            if stamp is None or stamp == self.stamp:
+                return False
+            edges = read_structure_edges(self.file_path, self.sheet_name)
+            self.update_edges(edges, stamp)
+            self.save()
+            return True
+
+    def direct_parents(self, part_id):
+        """Pais diretos do item, em ordem alfabética."""
+        with self._lock:
+            return sorted(self.parents_of.get(normalize_part_id(part_id), ()))
+
+    def where_used(self, part_id):
+        """
+        Todos os itens que usam 'part_id', direta ou indiretamente, como lista de (código, nível),
+        em que o nível 1 é um pai direto. Busca em largura: cada montagem aparece uma vez, no menor nível,
+        e ciclos na estrutura não causam laço infinito.
+        """
+        part_id = normalize_part_id(part_id)
+        with self._lock:
+            cached = self._where_used_cache.get(part_id)
+            if cached is not None:
+                return list(cached)
+            result = []
+            seen = {part_id}
+            queue = deque([(part_id, 0)])
+            while queue:
+                current_id, level = queue.popleft()
+                for parent_id in sorted(self.parents_of.get(current_id, ())):
+                    if parent_id not in seen:
+                        seen.add(parent_id)
+                        result.append((parent_id, level + 1))
+                        queue.append((parent_id, level + 1))
+            self._where_used_cache[part_id] = result
+            return list(result)
+
+    def is_top_level(self, part_id):
+        """True se o item não é usado por nenhum outro (montagem de topo)."""
+        with self._lock:
+            return not self.parents_of.get(normalize_part_id(part_id))
+
+    def contains(self, part_id):
+        """True se o item aparece em alguma ligação (como filho ou como pai)."""
+        part_id = normalize_part_id(part_id)
+        with self._lock:
+            return part_id in self.parents_of or part_id in self._parent_use_count
+
+    # --- Persistência ---
+
+    def _is_persisted(self):
+        entry = _load_index_file().get("sources", {}).get(_source_key(self.file_path, self.sheet_name))
+        return entry is not None and entry.get("stamp") == self.stamp
+
+    def load(self):
+        """Carrega as ligações persistidas (se houver); o índice ainda deve ser conferido com refresh()."""
+        entry = _load_index_file().get("sources", {}).get(_source_key(self.file_path, self.sheet_name))
+        if entry:
+            self.update_edges({(child_id, parent_id) for child_id, parent_id in entry.get("edges", [])}, entry.get("stamp"))
+
+    def save(self):
+        """Grava as ligações deste índice no arquivo persistido (demais índices do arquivo são preservados)."""
+        with _index_file_lock:
+            data = _load_index_file()
+            with self._lock:
+                data.setdefault("sources", {})[_source_key(self.file_path, self.sheet_name)] = {
+                    "stamp": self.stamp,
+                    "edges": sorted(self.edges),
+                }
+            temp_path = WHERE_USED_INDEX_PATH + ".tmp"
+            try:
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(temp_path, WHERE_USED_INDEX_PATH)
+            except OSError as e:
+                print(f"Aviso: Não foi possível gravar o índice 'onde é usado' em {WHERE_USED_INDEX_PATH}: {e}")
+
+
+_index_file_lock = threading.Lock()
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _load_index_file():
+    try:
+        with open(WHERE_USED_INDEX_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {"version": WHERE_USED_INDEX_VERSION, "sources": {}}
+    if not isinstance(data, dict) or data.get("version") != WHERE_USED_INDEX_VERSION:
+        return {"version": WHERE_USED_INDEX_VERSION, "sources": {}}
+    return data
+
+
+def get_where_used_index(file_path=ENGENHARIA_EXCEL_PATH, sheet_name=STRUCTURE_SHEET_NAME, refresh=True):
+    """
+    Retorna o WhereUsedIndex (compartilhado no processo) de uma planilha de estrutura.
+    Na primeira chamada, o índice persistido é carregado; com 'refresh', ele é conferido com o arquivo
+    de origem e atualizado se o arquivo mudou.
+    """
+    key = _source_key(file_path, sheet_name)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = WhereUsedIndex(file_path, sheet_name)
+            index.load()
+            _indexes[key] = index
+    if refresh:
+        index.refresh()
+    return index
+
+
+def load_bom_index_with_where_used(job, file_path, sheet_name):
+    """
+    Job do IOService: como load_bom_index(), e aproveita as ligações já lidas para atualizar
+    (por diferença) o índice "onde é usado" da mesma planilha.
+    """
+    stamp = _file_stamp(file_path) # Antes da leitura: se o arquivo mudar durante ela, o próximo refresh() relê
+    index = load_bom_index(job, file_path, sheet_name)
+    if index.has_structure_columns():
+        get_where_used_index(file_path, sheet_name, refresh=False).update_from_bom_index(index, stamp)
+    return index
@@ -0,0 +1,219 @@
+import os
+import threading
+from collections import OrderedDict
+
+import openpyxl
+
+# Orçamento padrão de memória para os workbooks mantidos em cache (estimado).
+DEFAULT_MAX_CACHE_BYTES = 512 * 1024 * 1024
+
+# Um .xlsx é um zip de XML; o openpyxl em modo completo ocupa, em média,
+# dezenas de vezes o tamanho do arquivo em disco. Usado apenas para estimar o custo.
+ESTIMATED_MEMORY_FACTOR = 30
+
+
+def _normalize_path(file_path):
+    """Normaliza o caminho para ser usado como chave do cache."""
+    return os.path.normcase(os.path.abspath(file_path))
+
+
+def _file_stamp(file_path):
+    """Retorna (mtime_ns, tamanho) do arquivo, usados para invalidar o cache."""
+    stat = os.stat(file_path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class WorkbookCache:
+    """
+    Cache em processo de workbooks openpyxl, compartilhado por todas as ferramentas.
+    Cada entrada é identificada pelo caminho do arquivo (e pelo modo data_only) e
+    validada pelo mtime/tamanho do arquivo: se o arquivo mudar em disco, ele é relido.
+    As entradas menos usadas são descartadas (LRU) quando o orçamento de memória estimado é excedido.
+    """
+    def __init__(self, max_bytes=DEFAULT_MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict() # chave -> {"workbook", "stamp", "size"}
+        self._sheet_names = {} # caminho normalizado -> (stamp, [nomes])
+        self._total_bytes = 0
+        self._lock = threading.RLock() # Protege apenas as estruturas do cache
+        self._path_locks = {} # caminho normalizado -> RLock do arquivo
+
+    def path_lock(self, file_path):
+        """
+        Retorna o RLock do arquivo. Leituras e gravações do mesmo workbook (que é compartilhado)
+        devem ser feitas com ele adquirido, inclusive na thread da GUI, pois os jobs de I/O usam o
+        mesmo objeto em outras threads; operações em arquivos diferentes não se bloqueiam.
+        """
+        path_key = _normalize_path(file_path)
+        with self._lock:
+            lock = self._path_locks.get(path_key)
+            if lock is None:
+                lock = self._path_locks[path_key] = threading.RLock()
+            return lock
+
+    def get_workbook(self, file_path, data_only=False):
+        """
+        Retorna o workbook (modo completo) do arquivo, relendo-o apenas se ele mudou em disco.
+        O objeto retornado é compartilhado: alterações devem ser persistidas com save_workbook().
+        """
+        key = (_normalize_path(file_path), data_only)
+        with self.path_lock(file_path):
+            stamp = _file_stamp(file_path)
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry["stamp"] == stamp:
+                    self._entries.move_to_end(key)
+                    return entry["workbook"]
+                if entry is not None:
+                    self._remove_entry(key)
+
+            # A leitura (lenta) é feita fora do lock global, para não bloquear outros arquivos
+            workbook = openpyxl.load_workbook(file_path, data_only=data_only)
+            size = stamp[1] * ESTIMATED_MEMORY_FACTOR
+            with self._lock:
+                self._entries[key] = {"workbook": workbook, "stamp": stamp, "size": size}
+                self._total_bytes += size
+                self._evict_if_needed(keep=key)
+            return workbook
+
+    def peek_workbook(self, file_path, data_only=False):
+        """Retorna o workbook do cache se ele já estiver carregado e atualizado; caso contrário, None (sem ler o arquivo)."""
+        key = (_normalize_path(file_path), data_only)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry["stamp"] != _file_stamp(file_path):
+                return None
+            self._entries.move_to_end(key)
+            return entry["workbook"]
+
+    def get_sheet_names(self, file_path):
+        """
+        Retorna os nomes das planilhas do arquivo sem carregar o workbook completo.
+        Se o workbook já estiver no cache, reutiliza-o; caso contrário, lê apenas o índice em modo somente leitura.
+        Não espera pelo lock do arquivo (chamada na thread da GUI): se um job estiver carregando ou gravando
+        o workbook, o índice é lido direto do disco. Só espera se o arquivo estiver no meio de uma gravação.
+        """
+        path_key = _normalize_path(file_path)
+        stamp = _file_stamp(file_path)
+        with self._lock:
+            cached = self._sheet_names.get(path_key)
+            if cached is not None and cached[0] == stamp:
+                return list(cached[1])
+
+        lock = self.path_lock(file_path)
+        if not lock.acquire(blocking=False):
+            try:
+                return self._read_sheet_names(file_path, path_key, stamp)
+            except Exception:
+                lock.acquire() # Arquivo incompleto: aguarda a gravação em andamento terminar
+        try:
+            stamp = _file_stamp(file_path)
+            with self._lock:
+                for data_only in (False, True):
+                    entry = self._entries.get((path_key, data_only))
+                    if entry is not None and entry["stamp"] == stamp:
+                        return list(entry["workbook"].sheetnames)
+            return self._read_sheet_names(file_path, path_key, stamp)
+        finally:
+            lock.release()
+
+    def _read_sheet_names(self, file_path, path_key, stamp):
+        """Lê só o índice de planilhas do arquivo (modo somente leitura) e o guarda com o carimbo informado."""
+        wb = openpyxl.load_workbook(file_path, read_only=True)
+        try:
+            sheet_names = list(wb.sheetnames)
+        finally:
+            wb.close()
+        if _file_stamp(file_path) == stamp: # Não mudou durante a leitura
+            with self._lock:
+                self._sheet_names[path_key] = (stamp, sheet_names)
+        return list(sheet_names)
+
+    def save_workbook(self, workbook, file_path):
+        """
+        Salva o workbook em disco e atualiza o cache com o novo mtime/tamanho,
+        para que a próxima leitura não precise reprocessar o arquivo.
+        """
+        path_key = _normalize_path(file_path)
+        with self.path_lock(file_path):
+            try:
+                workbook.save(file_path)
+            except Exception:
+                self.invalidate(file_path)
+                raise
+
+            stamp = _file_stamp(file_path)
+            with self._lock:
+                self._sheet_names[path_key] = (stamp, list(workbook.sheetnames))
+                key = (path_key, False)
+                if key in self._entries:
+                    self._remove_entry(key)
+                # Um workbook salvo com data_only=True perderia as fórmulas; não o mantemos no modo completo.
+                self._remove_entry((path_key, True))
+                size = stamp[1] * ESTIMATED_MEMORY_FACTOR
+                self._entries[key] = {"workbook": workbook, "stamp": stamp, "size": size}
+                self._total_bytes += size
+                self._evict_if_needed(keep=key)
+
+    def invalidate(self, file_path):
+        """Descarta todas as entradas do arquivo (ex: após uma falha no meio de uma alteração)."""
+        path_key = _normalize_path(file_path)
+        with self._lock:
+            for data_only in (False, True):
+                self._remove_entry((path_key, data_only))
+            self._sheet_names.pop(path_key, None)
+
+    def clear(self):
+        """Esvazia o cache."""
+        with self._lock:
+            self._entries.clear()
+            self._sheet_names.clear()
+            self._total_bytes = 0
+
+    def _remove_entry(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry["size"]
+
+    def _evict_if_needed(self, keep=None):
+        """Remove as entradas menos usadas até respeitar o orçamento (nunca remove 'keep')."""
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            oldest_key = next(iter(self._entries))
+            if oldest_key == keep:
+                self._entries.move_to_end(oldest_key)
+                continue
+            self._remove_entry(oldest_key)
+
+
+# Instância única usada por todas as ferramentas do processo.
+shared_workbook_cache = WorkbookCache()
+
+
+def get_workbook(file_path, data_only=False):
+    """Atalho para shared_workbook_cache.get_workbook()."""
+    return shared_workbook_cache.get_workbook(file_path, data_only=data_only)
+
+
+def peek_workbook(file_path, data_only=False):
+    """Atalho para shared_workbook_cache.peek_workbook()."""
+    return shared_workbook_cache.peek_workbook(file_path, data_only=data_only)
+
+
+def get_sheet_names(file_path):
+    """Atalho para shared_workbook_cache.get_sheet_names()."""
+    return shared_workbook_cache.get_sheet_names(file_path)
+
+
+def save_workbook(workbook, file_path):
+    """Atalho para shared_workbook_cache.save_workbook()."""
+    shared_workbook_cache.save_workbook(workbook, file_path)
+
+
+def workbook_lock(file_path):
+    """Atalho para shared_workbook_cache.path_lock()."""
+    return shared_workbook_cache.path_lock(file_path)
+
+
+def invalidate_workbook(file_path):
+    """Atalho para shared_workbook_cache.invalidate()."""
+    shared_workbook_cache.invalidate(file_path)
@@ -1,7 +1,16 @@
 import os
-from flask import Flask, send_from_directory, request, jsonify
+import json
+import hashlib
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, send_from_directory, request, jsonify
 import bcrypt
 import openpyxl
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+from backend.sheet_query import SheetQueryCache, parse_filter, parse_sort
+from backend.auth_store import get_auth_store, AUTH_DB_PATH
 
 # --- Flask App Setup ---
 # Corrected static_folder: This assumes web_server.py is in the root of 5REV-SHEETS
@@ -10,79 +19,266 @@ app = Flask(__name__, static_folder='js')
 
 # --- File Paths Configuration (Duplicate from gui.py for backend context) ---
 USER_SHEETS_DIR = "user_sheets"
-DB_EXCEL_PATH = os.path.join(USER_SHEETS_DIR, "db.xlsx")
+APP_SHEETS_DIR = "app_sheets"
+TOOLS_EXCEL_PATH = os.path.join(APP_SHEETS_DIR, "tools.xlsx")
+
+# Default role permissions for a fresh auth store with no roles imported from access.xlsx
+DEFAULT_ROLE_PERMISSIONS = {"user": "mod1,mod2,mes_pcp", "admin": "all"}
+
+# Browsers must revalidate on every load, but an unchanged snapshot is answered with 304 from memory
+CONFIG_CACHE_CONTROL = "private, no-cache"
+
+# --- Login Tokens ---
+# Signed tokens carrying the username; the role is read from the auth store on every request, so role
+# changes apply immediately. Without WEB_SECRET_KEY a random key is generated and tokens stop being
+# valid when the server restarts.
+app.secret_key = os.environ.get("WEB_SECRET_KEY") or secrets.token_hex(32)
+TOKEN_MAX_AGE_SECONDS = 8 * 60 * 60
+token_serializer = URLSafeTimedSerializer(app.secret_key, salt="login-token")
+
+# --- Sheet Query API ---
+# Only workbooks in user_sheets that are the work table of a tool (tools.xlsx MOD_WORK_TABLE) are exposed,
+# and only to roles allowed to open that tool; anything else (e.g. db.xlsx) is never served.
+QUERYABLE_SHEETS_DIR = USER_SHEETS_DIR
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+sheet_query_cache = SheetQueryCache()
 
 # Ensure user_sheets directory exists
 os.makedirs(USER_SHEETS_DIR, exist_ok=True)
 
+# --- Password Hashing Pool ---
+# bcrypt is CPU-bound by design (and releases the GIL), so it runs on a small dedicated pool instead of
+# the request threads. At most BCRYPT_MAX_PENDING requests may wait for it; beyond that the server
+# answers 503 instead of letting a login burst pile up unbounded work.
+BCRYPT_MAX_WORKERS = max(1, min(4, os.cpu_count() or 1))
+BCRYPT_MAX_PENDING = BCRYPT_MAX_WORKERS * 8
+BCRYPT_QUEUE_TIMEOUT_SECONDS = 10
+
+bcrypt_executor = ThreadPoolExecutor(max_workers=BCRYPT_MAX_WORKERS, thread_name_prefix="bcrypt")
+_bcrypt_slots = threading.BoundedSemaphore(BCRYPT_MAX_PENDING)
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when too many password checks are already queued."""
+    pass
+
+
+def run_password_job(fn, *args):
+    """Runs fn(*args) on the bcrypt pool and waits for the result (raises PasswordPoolBusy when saturated)."""
+    if not _bcrypt_slots.acquire(timeout=BCRYPT_QUEUE_TIMEOUT_SECONDS):
+        raise PasswordPoolBusy()
+    try:
+        return bcrypt_executor.submit(fn, *args).result()
+    finally:
+        _bcrypt_slots.release()
+
+
+def check_password(password, password_hash):
+    """bcrypt.checkpw on the pool. Malformed hashes count as a failed check."""
+    def check():
+        try:
+            return bcrypt.checkpw(password.encode('utf-8'), str(password_hash).encode('utf-8'))
+        except ValueError:
+            return False
+    return run_password_job(check)
+
+
+def hash_password(password):
+    """bcrypt.hashpw on the pool."""
+    return run_password_job(lambda: bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8'))
+
+# --- User Store ---
+# Users and roles live in the SQLite auth store shared with the desktop GUI and the FastAPI client
+# (app_sheets/auth.sqlite3). Lookups go through the unique index on username, and inserts are
+# transactional, so concurrent registrations cannot duplicate a user or lose each other's writes.
+# The store is opened on the first request (not at import time); get_auth_store() also re-imports
+# users.xlsx/access.xlsx whenever they change on disk.
+
+def register_user_backend(username, password, role="user"):
+    """Registers a new user in the auth store. Raises ValueError if the username is already taken."""
+    password_hash = hash_password(password)
+    try:
+        get_auth_store().add_user(username, password_hash, role)
+    except ValueError:
+        raise
+    except Exception as e:
+        print(f"Error registering user in backend: {e}")
+        return False
+    return True
+
 # --- Sheet Helpers (Adapted from gui.py) ---
 # Note: For a production web application, direct Excel file manipulation
 # is highly discouraged due to concurrency issues. A proper database (e.g., PostgreSQL, SQLite)
 # and an ORM (e.g., SQLAlchemy) would be much more robust.
 # This implementation is for demonstration purposes to integrate with your existing Excel data.
 
-def load_users_from_excel_backend():
-    """Loads user data from the database Excel file for backend use."""
-    users = {}
+def read_sheet_records(file_path, sheet_name):
+    """Reads a sheet in read-only mode as a list of {header: value} dicts (blank rows skipped)."""
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
     try:
-        if not os.path.exists(DB_EXCEL_PATH):
-            return {} # Return empty if file doesn't exist yet
-
-        wb = openpyxl.load_workbook(DB_EXCEL_PATH)
-        # Check if 'users' sheet exists, create if not (for first run setup)
-        if 'users' not in wb.sheetnames:
-            return {}
-
-        users_sheet = wb["users"]
-        for row in users_sheet.iter_rows(min_row=2): # Skip header row
-            if len(row) >= 4 and all(cell.value is not None for cell in row[:4]):
-                users[row[1].value] = { # username as key
-                    "id": row[0].value,
-                    "username": row[1].value,
-                    "password_hash": row[2].value,
-                    "role": row[3].value
-                }
+        rows = wb[sheet_name].iter_rows(values_only=True)
+        headers = [h for h in (next(rows, None) or [])]
+        records = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            records.append({header: value for header, value in zip(headers, row) if header is not None})
+        return records
+    finally:
+        wb.close()
+
+
+def load_tools_from_excel_backend():
+    """Tool registry from tools.xlsx, keyed by mod_id (same fields the desktop GUI reads)."""
+    tools = {}
+    for record in read_sheet_records(TOOLS_EXCEL_PATH, "tools"):
+        mod_id, mod_name = record.get("mod_id"), record.get("mod_name")
+        if mod_id is None or mod_name is None:
+            continue
+        tools[str(mod_id)] = {
+            "id": str(mod_id),
+            "name": str(mod_name),
+            "description": str(record.get("mod_description") or ""),
+            "module_path": str(record.get("module_path") or ""),
+            "class_name": str(record.get("class_name") or ""),
+            "work_table": str(record.get("MOD_WORK_TABLE") or ""),
+        }
+    return tools
+
+
+class WorkbookSnapshot:
+    """
+    JSON snapshot of a workbook, shared by all requests.
+    The workbook is parsed (and the JSON body and its strong ETag computed) only when the file changes
+    on disk (size/mtime); every other hit is served from memory, or answered with 304 when the
+    browser already has the same ETag.
+    'stamp' (optional) replaces the size/mtime check with another value that changes with the data.
+    """
+    def __init__(self, path, loader, stamp=None):
+        self.path = path
+        self.loader = loader
+        self.stamp = stamp or self._file_stamp
+        self._stamp = None
+        self._data = None
+        self._body = None
+        self._etag = None
+        self._lock = threading.Lock()
+
+    def _file_stamp(self):
+        stat = os.stat(self.path)
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def _refresh(self):
+        stamp = self.stamp()
+        with self._lock:
+            if stamp != self._stamp:
+                data = self.loader()
+                body = json.dumps(data, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8')
+                self._data = data
+                self._body = body
+                self._etag = hashlib.sha1(body).hexdigest()
+                self._stamp = stamp
+            return self._data, self._body, self._etag
+
+    def get(self):
+        """Returns (JSON body as bytes, ETag). Raises FileNotFoundError if the workbook is missing."""
+        _, body, etag = self._refresh()
+        return body, etag
+
+    def get_data(self):
+        """Returns the loaded data itself (shared between requests: do not modify it)."""
+        return self._refresh()[0]
+
+
+tools_snapshot = WorkbookSnapshot(TOOLS_EXCEL_PATH, load_tools_from_excel_backend)
+# Role permissions come from the auth store, which bumps a revision counter in the same transaction
+# as every role change; the file's size/mtime is not a reliable signal for a SQLite database.
+permissions_snapshot = WorkbookSnapshot(AUTH_DB_PATH, lambda: get_auth_store().get_role_permissions(),
+                                        stamp=lambda: get_auth_store().roles_revision())
+
+
+@app.before_request
+def open_auth_store():
+    """Creates the auth store on first use and picks up edits to users.xlsx/access.xlsx before each request."""
+    get_auth_store()
+
+
+def snapshot_response(snapshot):
+    """JSON response for a WorkbookSnapshot with ETag/Cache-Control, or 304 if If-None-Match matches."""
+    try:
+        body, etag = snapshot.get()
+    except FileNotFoundError:
+        return jsonify({"message": f"Configuration file not found: {snapshot.path}"}), 404
     except Exception as e:
-        print(f"Error loading users in backend: {e}")
-    return users
+        print(f"Error loading {snapshot.path}: {e}")
+        return jsonify({"message": "Could not load configuration."}), 500
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = CONFIG_CACHE_CONTROL
+    return response.make_conditional(request)
 
-def register_user_backend(username, password, role="user"):
-    """Registers a new user into the database Excel file for backend use."""
+def issue_token(username):
+    """Signed login token for the user (checked by current_user)."""
+    return token_serializer.dumps({"username": username})
+
+
+def current_user():
+    """
+    User of the request's 'Authorization: Bearer <token>' header, read from the auth store.
+    Returns None if the header is missing, the token is invalid or expired, or the user no longer exists.
+    """
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        return None
     try:
-        # Check if DB_EXCEL_PATH exists. If not, create a new workbook.
-        if not os.path.exists(DB_EXCEL_PATH):
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "users"
-            ws.append(["id", "username", "password_hash", "role"]) # Add headers
-            # Also create an 'access' sheet if it doesn't exist
-            access_ws = wb.create_sheet("access")
-            access_ws.append(["role", "allowed_tools"])
-            access_ws.append(["user", "mod1,mod2,mes_pcp"]) # Default user permissions
-            access_ws.append(["admin", "all"]) # Default admin permissions
-        else:
-            wb = openpyxl.load_workbook(DB_EXCEL_PATH)
+        payload = token_serializer.loads(token.strip(), max_age=TOKEN_MAX_AGE_SECONDS)
+    except BadSignature: # Also covers SignatureExpired
+        return None
+    if not isinstance(payload, dict) or not payload.get("username"):
+        return None
+    return get_auth_store().get_user(payload["username"])
 
-        if 'users' not in wb.sheetnames:
-            ws = wb.create_sheet("users")
-            ws.append(["id", "username", "password_hash", "role"]) # Add headers
-        else:
-            ws = wb["users"]
-
-        # Check for existing username
-        for row in ws.iter_rows(min_row=2):
-            if row[1].value == username:
-                raise ValueError("Username already exists.")
-
-        # Determine next ID based on current max row
-        next_id = ws.max_row if ws.max_row > 1 else 1 # If only headers, start at 1
-        password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        ws.append([next_id, username, password_hash, role])
-        wb.save(DB_EXCEL_PATH)
-        return True
-    except Exception as e:
-        print(f"Error registering user in backend: {e}")
-        return False
+
+def sheet_tool_ids(file_path):
+    """Ids of the tools whose work table (tools.xlsx MOD_WORK_TABLE) is this workbook."""
+    file_name = os.path.basename(file_path).lower()
+    return {tool_id for tool_id, tool in tools_snapshot.get_data().items()
+            if tool["work_table"] and os.path.basename(tool["work_table"]).lower() == file_name}
+
+
+def role_can_open(role, tool_ids):
+    """True if the role's allowed tools (auth store) are 'all' or include one of tool_ids."""
+    allowed = permissions_snapshot.get_data().get(role or "", [])
+    return allowed == "all" or bool(set(allowed) & set(tool_ids))
+
+
+def resolve_queryable_sheet(file_name):
+    """
+    Maps the <file> URL segment (e.g. 'estoque' or 'estoque.xlsx') to a workbook directly inside
+    QUERYABLE_SHEETS_DIR. Returns None for anything else (subdirectories, '..', hidden/lock files).
+    """
+    if not file_name.lower().endswith(".xlsx"):
+        file_name += ".xlsx"
+    if file_name != os.path.basename(file_name) or file_name.startswith(("~$", ".")):
+        return None
+    base_dir = os.path.realpath(QUERYABLE_SHEETS_DIR)
+    file_path = os.path.realpath(os.path.join(base_dir, file_name))
+    if os.path.dirname(file_path) != base_dir or not os.path.isfile(file_path):
+        return None
+    return file_path
+
+
+def _int_arg(name, default, minimum, maximum=None):
+    value = request.args.get(name, default)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be an integer.")
+    if value < minimum or (maximum is not None and value > maximum):
+        raise ValueError(f"'{name}' must be between {minimum} and {maximum}." if maximum is not None else f"'{name}' must be >= {minimum}.")
+    return value
 
 # --- Routes for serving HTML files ---
 @app.route('/')
@@ -107,15 +303,106 @@ def api_login():
     if not username or not password:
         return jsonify({"message": "Username and password are required."}), 400
 
-    users = load_users_from_excel_backend()
-    user = users.get(username)
+    user = get_auth_store().get_user(username)
+
+    try:
+        password_ok = bool(user) and check_password(password, user["password_hash"])
+    except PasswordPoolBusy:
+        return jsonify({"message": "Server busy, please try again."}), 503
 
-    if user and bcrypt.checkpw(password.encode('utf-8'), user["password_hash"].encode('utf-8')):
-        # In a real app, generate and return a JWT or session token here
-        return jsonify({"message": "Login successful!", "token": "fake-jwt-token-123"}), 200
+    if password_ok:
+        return jsonify({
+            "message": "Login successful!",
+            "token": issue_token(user["username"]),
+            "user": {"username": user["username"], "role": user["role"]},
+        }), 200
     else:
         return jsonify({"message": "Invalid username or password."}), 401
 
+@app.route('/api/tools', methods=['GET'])
+def api_tools():
+    """Tool registry (tools.xlsx) for the dashboard menu."""
+    return snapshot_response(tools_snapshot)
+
+@app.route('/api/permissions', methods=['GET'])
+def api_permissions():
+    """Allowed tools per role (access.xlsx)."""
+    return snapshot_response(permissions_snapshot)
+
+@app.route('/api/sheets/<file_name>/<sheet_name>', methods=['GET'])
+def api_sheet_query(file_name, sheet_name):
+    """
+    Paged query over a sheet of user_sheets, served from an in-memory columnar copy that is
+    rebuilt only when the workbook changes. Query parameters:
+      columns=a,b        projection (default: all columns)
+      filter=col<op>val  repeatable, ANDed; ops: == != >= <= > < ~ (contains)
+      sort=col,-col2     sort keys ('-' for descending)
+      offset, limit      paging (limit up to MAX_PAGE_SIZE)
+      format=ndjson      streams one JSON object per line; without 'limit' it streams every match
+    Requires a login token; the workbook must be the work table of a tool the user's role may open.
+    """
+    user = current_user()
+    if user is None:
+        return jsonify({"message": "Authentication required."}), 401
+    file_path = resolve_queryable_sheet(file_name)
+    try:
+        tool_ids = sheet_tool_ids(file_path) if file_path is not None else set()
+        allowed = bool(tool_ids) and role_can_open(user["role"], tool_ids)
+    except Exception as e:
+        print(f"Error loading tool permissions: {e}")
+        return jsonify({"message": "Could not load configuration."}), 500
+    if not tool_ids:
+        return jsonify({"message": f"Sheet file not found: {file_name}"}), 404
+    if not allowed:
+        return jsonify({"message": "Your role does not have access to this sheet."}), 403
+    try:
+        sheet = sheet_query_cache.get(file_path, sheet_name)
+    except KeyError as e:
+        return jsonify({"message": str(e).strip("'\"")}), 404
+    except Exception as e:
+        print(f"Error loading {file_path}: {e}")
+        return jsonify({"message": "Could not load the sheet."}), 500
+
+    output_format = request.args.get("format", "json").lower()
+    try:
+        requested_columns = [c.strip() for c in request.args.get("columns", "").split(",") if c.strip()]
+        unknown = [c for c in requested_columns if c not in sheet.headers]
+        if unknown:
+            raise ValueError(f"Unknown column(s): {', '.join(unknown)}")
+        column_indexes = [sheet.headers.index(c) for c in requested_columns] or list(range(len(sheet.headers)))
+        filters = [parse_filter(expression, sheet.headers) for expression in request.args.getlist("filter")]
+        sort = parse_sort(request.args.get("sort", ""), sheet.headers)
+        offset = _int_arg("offset", 0, 0)
+        if output_format == "ndjson" and "limit" not in request.args:
+            limit = None
+        else:
+            limit = _int_arg("limit", DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+        if output_format not in ("json", "ndjson"):
+            raise ValueError("'format' must be 'json' or 'ndjson'.")
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    row_ids = sheet.select(filters, sort)
+    page = row_ids[offset:] if limit is None else row_ids[offset:offset + limit]
+    headers = {"X-Total-Count": str(len(row_ids)), "Cache-Control": "private, no-cache"}
+
+    if output_format == "ndjson":
+        def generate():
+            for record in sheet.records(page, column_indexes):
+                yield json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        return Response(generate(), mimetype="application/x-ndjson", headers=headers)
+
+    body = json.dumps({
+        "file": os.path.basename(file_path),
+        "sheet": sheet_name,
+        "columns": [sheet.headers[index] for index in column_indexes],
+        "total": len(row_ids),
+        "offset": offset,
+        "limit": limit,
+        "rows": list(sheet.records(page, column_indexes)),
+    }, ensure_ascii=False, default=str)
+    return Response(body, mimetype="application/json", headers=headers)
+
 @app.route('/api/register', methods=['POST'])
 def api_register():
     """Handles user registration requests from the web frontend."""
@@ -126,11 +413,16 @@ def api_register():
     if not username or not password:
         return jsonify({"message": "Username and password are required."}), 400
 
-    users = load_users_from_excel_backend()
-    if username in users:
+    if get_auth_store().get_user(username) is not None:
         return jsonify({"message": "Username already exists."}), 409 # Conflict
 
-    if register_user_backend(username, password):
+    try:
+        registered = register_user_backend(username, password)
+    except ValueError: # Registered concurrently by another request
+        return jsonify({"message": "Username already exists."}), 409
+    except PasswordPoolBusy:
+        return jsonify({"message": "Server busy, please try again."}), 503
+    if registered:
         return jsonify({"message": f"User '{username}' registered successfully."}), 201 # Created
     else:
         return jsonify({"message": "An error occurred during registration."}), 500
@@ -140,24 +432,12 @@ if __name__ == '__main__':
     # Print the path Flask is serving static files from for debugging
     print(f"Flask app is serving static files from: {app.static_folder}")
 
-    # Initialize the users database if it doesn't exist for the first run
-    if not os.path.exists(DB_EXCEL_PATH):
-        print(f"Creating initial database at {DB_EXCEL_PATH}...")
-        try:
-            wb = openpyxl.Workbook()
-            ws_users = wb.active
-            ws_users.title = "users"
-            ws_users.append(["id", "username", "password_hash", "role"])
-
-            ws_access = wb.create_sheet("access")
-            ws_access.append(["role", "allowed_tools"])
-            ws_access.append(["user", "mod1,mod2,mes_pcp"])
-            ws_access.append(["admin", "all"])
-
-            wb.save(DB_EXCEL_PATH)
-            print("Database created successfully with default users and access rules.")
-        except Exception as e:
-            print(f"Failed to create initial database: {e}")
+    # Seed default access rules if the auth store has no roles yet (e.g. no access.xlsx to import)
+    auth_store = get_auth_store()
+    if not auth_store.get_role_permissions():
+        for role, allowed_tools in DEFAULT_ROLE_PERMISSIONS.items():
+            auth_store.set_role_permissions(role, allowed_tools)
+        print(f"Default access rules created in {AUTH_DB_PATH}.")
 
     # Run the Flask app
     # host='0.0.0.0' makes the server accessible from other devices on the network.